@@ -2,10 +2,36 @@
 """
 communication/mqtt_client.py - MQTT 客戶端管理 (Debug Version)
 增加 set_callback 方法，並在收到訊息時強制列印 Log
+
+收到的訊息只放進固定長度的佇列 (MQTT_RX_QUEUE_LEN) 就返回，
+由 MQTT_RX_WORKERS 個 worker 協程取出後交給 Router；
+處理函式再慢也不會卡住 mqtt_as 的接收迴圈 (keepalive)
+
+訊息以 MqttMessage 保存原始 bytes，不在這裡解碼；
+自己發布的 topic (response、self_test...) 透過 # 訂閱回來時，以 bytes 比對直接略過
+
+publish() 也只排入發送佇列 (MQTT_TX_QUEUE_LEN) 就返回，由發送協程在連線時送出：
+  - 斷線期間訊息留在佇列；佇列滿且設定了 MQTT_TX_SPILL_FILE 時，改附加到 flash 檔案
+  - 重新連線後以 MQTT_TX_MIN_INTERVAL_MS 的間隔依序送出，不會一次灌爆 broker
+  - retain (或 coalesce=True) 的訊息以 topic 合併：佇列中只保留同 topic 的最新狀態
+  - QoS 1 訊息發送失敗時放入重試緩衝區，最多重試 MQTT_TX_MAX_ATTEMPTS 次
 """
 
 import uasyncio
+import ujson
+import os
+import time
+import config
 from mqtt_as import MQTTClient, config as mqtt_config
+from utils.ring_queue import RingQueue
+from communication.mqtt_message import MqttMessage
+from utils.log import get_logger
+import utils.metrics as metrics
+
+# 本機發布過的 topic 最多記錄幾個 (用於過濾經由 # 訂閱回到自己的訊息)
+_MAX_OWN_TOPICS = 16
+
+log = get_logger("MQTT")
 
 class MqttManager:
     def __init__(self, ssid, password, broker='broker.emqx.io'):
@@ -19,97 +45,279 @@ class MqttManager:
         mqtt_config['server'] = broker
         mqtt_config['subs_cb'] = self.on_message       # 預設回調指向自己的 on_message
         mqtt_config['connect_coro'] = self.on_connected
+        mqtt_config['wifi_coro'] = self.on_wifi
         
         self._connected = False
         self._connected_event = uasyncio.Event()
         
         # 外部注入的處理函式 (Router)
         self._external_handler = None
-        
+
+        # 接收佇列與 worker
+        self.rx_queue = RingQueue(config.MQTT_RX_QUEUE_LEN, config.MQTT_RX_OVERFLOW)
+        self._workers = []
+        self._own_topics = set()  # 本機發布過的 topic (bytes)
+        self.rx_stats = {
+            "received": 0,
+            "filtered": 0,
+            "handled": 0,
+            "errors": 0,
+            "handler_last_ms": 0,
+            "handler_max_ms": 0,
+            "handler_total_ms": 0,
+        }
+
+        # 發送佇列、重試緩衝區與 flash 溢出檔
+        self.tx_queue = RingQueue(config.MQTT_TX_QUEUE_LEN, config.MQTT_TX_OVERFLOW)
+        self._retry = []      # [(item, 已嘗試次數), ...]
+        self._spill_count = 0  # 溢出檔中尚未送出的筆數
+        self._spill_pos = 0    # 溢出檔讀取位置
+        self._sender = None
+        self._last_tx = time.ticks_ms()
+        self.tx_stats = {
+            "queued": 0,
+            "sent": 0,
+            "coalesced": 0,
+            "spilled": 0,
+            "retries": 0,
+            "failed": 0,
+        }
+
         self.client = MQTTClient(mqtt_config)
-        print("[MQTT] 客戶端已初始化")
+        log.info("客戶端已初始化")
     
     def set_callback(self, handler):
-        """設定外部訊息處理函式 (例如 Router.dispatch)"""
+        """
+        設定外部訊息處理函式 (例如 Router.dispatch)，並啟動 worker
+        handler(message): message 為 MqttMessage
+        """
         self._external_handler = handler
+        while len(self._workers) < config.MQTT_RX_WORKERS:
+            self._workers.append(uasyncio.create_task(self._worker()))
+
+    async def _worker(self):
+        """從接收佇列取出訊息並交給處理函式，記錄處理時間"""
+        stats = self.rx_stats
+        while True:
+            message = await self.rx_queue.get()
+            t0 = time.ticks_us()
+            try:
+                await self._external_handler(message)
+            except Exception as e:
+                stats["errors"] += 1
+                log.error("訊息處理失敗: %s", e)
+            elapsed_us = time.ticks_diff(time.ticks_us(), t0)
+            metrics.observe("mqtt.handler", elapsed_us)
+            elapsed = elapsed_us // 1000
+            stats["handled"] += 1
+            stats["handler_last_ms"] = elapsed
+            stats["handler_total_ms"] += elapsed
+            if elapsed > stats["handler_max_ms"]:
+                stats["handler_max_ms"] = elapsed
+
+    def queue_stats(self):
+        """接收佇列與處理時間統計"""
+        q = self.rx_queue
+        stats = dict(self.rx_stats)
+        stats["depth"] = len(q)
+        stats["peak_depth"] = q.peak
+        stats["dropped"] = q.dropped
+        stats["coalesced"] = q.coalesced
+        stats["handler_avg_ms"] = stats["handler_total_ms"] // stats["handled"] if stats["handled"] else 0
+        return stats
 
     async def connect(self):
+        if self._sender is None:
+            self._sender = uasyncio.create_task(self._send_loop())
         try:
-            print(f"[MQTT] 嘗試連線到 {self.broker}...")
+            log.info("嘗試連線到 %s...", self.broker)
             await self.client.connect()
             # 等待連線狀態確認
             await uasyncio.sleep(1)
             return True
         except Exception as e:
-            print(f"[MQTT] 連線失敗: {e}")
+            log.error("連線失敗: %s", e)
             return False
 
     async def wait_connected(self):
         await self._connected_event.wait()
         return True
 
-    async def publish(self, topic, message, qos=0):
-        try:
-            if isinstance(topic, str): topic = topic.encode()
-            if isinstance(message, str): message = message.encode()
-            await self.client.publish(topic, message, qos=qos)
-            print(f"[MQTT Pub] 已發送 -> {topic.decode()}: {message.decode()}")
+    async def publish(self, topic, message, qos=0, retain=False, coalesce=None):
+        """
+        排入發送佇列 (不等待實際送出)
+        coalesce: 是否以 topic 合併尚未送出的舊訊息，預設與 retain 相同 (狀態類訊息只需最新一筆)
+        返回: True 表示已排入 (或寫入溢出檔)，False 表示被丟棄
+        """
+        if isinstance(topic, str): topic = topic.encode()
+        if isinstance(message, str): message = message.encode()
+        if topic not in self._own_topics and len(self._own_topics) < _MAX_OWN_TOPICS:
+            self._own_topics.add(topic)
+        if coalesce is None:
+            coalesce = retain
+
+        item = (topic, message, qos, retain)
+        stats = self.tx_stats
+        if coalesce and self.tx_queue.replace(topic, item):
+            stats["coalesced"] += 1
             return True
-        except Exception as e:
-            print(f"[MQTT Pub] 發送失敗: {e}")
+        stats["queued"] += 1
+        # 溢出檔有資料時，新訊息也接在檔案後面，維持發送順序
+        if self._spill_count or len(self.tx_queue) == config.MQTT_TX_QUEUE_LEN:
+            if self._spill(item):
+                return True
+        if self.tx_queue.put(item, topic):
+            return True
+        log.warning("發送佇列已滿，丟棄 -> %s", topic)
+        return False
+
+    def publish_stats(self):
+        """發送佇列統計"""
+        q = self.tx_queue
+        stats = dict(self.tx_stats)
+        stats["depth"] = len(q)
+        stats["peak_depth"] = q.peak
+        stats["dropped"] = q.dropped
+        stats["retry_pending"] = len(self._retry)
+        stats["spill_pending"] = self._spill_count
+        return stats
+
+    async def _send_loop(self):
+        """發送協程：連線中才送出，兩筆之間至少間隔 MQTT_TX_MIN_INTERVAL_MS"""
+        stats = self.tx_stats
+        while True:
+            if not self._connected:
+                await self._connected_event.wait()
+            item, attempts = await self._next_item()
+
+            wait = config.MQTT_TX_MIN_INTERVAL_MS - time.ticks_diff(time.ticks_ms(), self._last_tx)
+            if wait > 0:
+                await uasyncio.sleep_ms(wait)
+
+            topic, message, qos, retain = item
+            try:
+                await self.client.publish(topic, message, retain=retain, qos=qos)
+                stats["sent"] += 1
+                log.debug("已發送 -> %s: %s", topic, message)
+            except Exception as e:
+                log.error("發送失敗: %s", e)
+                self._on_send_failed(item, attempts + 1)
+                await uasyncio.sleep(attempts + 1)  # 依失敗次數退避
+            self._last_tx = time.ticks_ms()
+
+    async def _next_item(self):
+        """依序取出：重試緩衝區 -> 記憶體佇列 -> 溢出檔"""
+        if self._retry:
+            return self._retry.pop(0)
+        item = self.tx_queue.get_nowait()
+        if item is None and self._spill_count:
+            item = self._unspill()
+        if item is None:
+            item = await self.tx_queue.get()
+        return item, 0
+
+    def _on_send_failed(self, item, attempts):
+        """QoS 1 放入重試緩衝區；QoS 0 或超過重試次數則放棄"""
+        if item[2] < 1 or attempts >= config.MQTT_TX_MAX_ATTEMPTS:
+            self.tx_stats["failed"] += 1
+            return
+        if len(self._retry) >= config.MQTT_TX_RETRY_LEN:
+            self._retry.pop(0)
+            self.tx_stats["failed"] += 1
+        self._retry.append((item, attempts))
+        self.tx_stats["retries"] += 1
+
+    def _spill(self, item):
+        """
+        附加到 flash 溢出檔 (一行一筆 JSON)
+        未設定 MQTT_TX_SPILL_FILE 或檔案已達 MQTT_TX_SPILL_MAX_BYTES 時返回 False
+        """
+        path = config.MQTT_TX_SPILL_FILE
+        if not path:
+            return False
+        topic, message, qos, retain = item
+        line = ujson.dumps({"t": topic.decode(), "m": message.decode(), "q": qos, "r": retain}) + "\n"
+        try:
+            size = os.stat(path)[6] if self._spill_count else 0
+            if size + len(line) > config.MQTT_TX_SPILL_MAX_BYTES:
+                return False
+            with open(path, "a" if self._spill_count else "w") as f:
+                f.write(line)
+        except OSError as e:
+            log.error("寫入溢出檔失敗: %s", e)
             return False
+        self._spill_count += 1
+        self.tx_stats["spilled"] += 1
+        return True
+
+    def _unspill(self):
+        """從溢出檔讀出下一筆；全部讀完後刪除檔案"""
+        path = config.MQTT_TX_SPILL_FILE
+        item = None
+        try:
+            with open(path, "rb") as f:
+                f.seek(self._spill_pos)
+                line = f.readline()
+                self._spill_pos = f.tell()
+            d = ujson.loads(line)
+            item = (d["t"].encode(), d["m"].encode(), d["q"], d["r"])
+            self._spill_count -= 1
+        except Exception as e:
+            log.error("讀取溢出檔失敗: %s", e)
+            self._spill_count = 0
+        if self._spill_count <= 0:
+            self._spill_count = 0
+            self._spill_pos = 0
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return item
 
     async def subscribe(self, topic, qos=0):
         try:
             if isinstance(topic, str): topic = topic.encode()
             await self.client.subscribe(topic, qos=qos)
-            print(f"[MQTT] 已訂閱: {topic.decode()}")
+            log.info("已訂閱: %s", topic.decode())
             return True
         except Exception as e:
-            print(f"[MQTT] 訂閱失敗: {e}")
+            log.error("訂閱失敗: %s", e)
             return False
 
     async def on_connected(self, client):
         self._connected = True
         self._connected_event.set()
-        print("[MQTT] 已連線成功 (on_connected)")
+        log.info("已連線成功 (on_connected)")
+
+    async def on_wifi(self, state):
+        """mqtt_as 的網路狀態回調：斷線時暫停發送，訊息留在佇列中"""
+        if not state:
+            self._connected = False
+            self._connected_event.clear()
+            log.warning("連線中斷，暫停發送")
 
-    async def on_message(self, *args):
+    def on_message(self, *args):
         """
-        絕對防禦版的訊息接收函數
+        mqtt_as 的接收回調：只把訊息排入佇列，不在這裡執行處理函式
+        mqtt_as 以同步方式呼叫 subs_cb 並丟棄返回值，因此必須是一般函式 (協程函式不會被執行)
+        (不同版本的 mqtt_as 傳入 2 或 3 個參數)
         """
         try:
-            print(f"\n[Debug RAW] 收到原始參數: {args}")
-            
-            # 1. 動態解析參數 (解決參數數量不一致問題)
             topic = args[0]
             msg = args[1]
             # 如果有第3個參數就用，沒有就預設 False
             retained = args[2] if len(args) > 2 else False
-            
-            # 2. 安全解碼 (解決 Encoding 崩潰問題)
-            topic_str = "Decode_Error"
-            msg_str = "Decode_Error"
-            
-            try:
-                # 嘗試解碼，如果失敗則保留原始 Bytes 的字串表示
-                topic_str = topic.decode('utf-8') if isinstance(topic, bytes) else str(topic)
-                msg_str = msg.decode('utf-8') if isinstance(msg, bytes) else str(msg)
-            except Exception as e:
-                print(f"[Encoding Error] 解碼失敗: {e}")
-                topic_str = str(topic) # 強制轉成 byte string 顯示 b'...'
-                msg_str = str(msg)
-
-            print(f"[MQTT Safe] Topic: {topic_str}")
-            print(f"[MQTT Safe] Msg: {msg_str}")
-            
-            # 3. 轉交給 Router
-            if self._external_handler:
-                # 注意：這裡我們傳遞處理過的參數，或者根據 Router 的定義傳遞
-                # 為了保險，這裡我們傳遞原始 args 的前三個 (模擬標準行為)
-                await self._external_handler(topic, msg, retained)
-                
+
+            self.rx_stats["received"] += 1
+            # 自己發布的訊息經由 # 訂閱回來：不解碼、不排入佇列
+            if topic in self._own_topics:
+                self.rx_stats["filtered"] += 1
+                return
+            log.debug("收到 %s (%d bytes)", topic, len(msg))
+
+            # coalesce 策略以 topic 合併同一主題的訊息
+            if not self.rx_queue.put(MqttMessage(topic, msg, retained), topic):
+                log.warning("接收佇列已滿，丟棄訊息: %s", topic)
+
         except Exception as e:
-            print(f"[Critical] on_message 內部發生嚴重錯誤: {e}")
-            import sys
-            sys.print_exception(e)
+            log.exception(e, "on_message 內部發生嚴重錯誤")
@@ -0,0 +1,68 @@
+"""
+communication/mqtt_message.py - 延遲解碼的 MQTT 訊息
+保存 mqtt_as 傳入的原始 bytes (或 memoryview)，
+topic / 文字 / JSON 都在第一次存取時才解碼並快取，
+沒有路由處理的訊息完全不需要解碼 payload
+"""
+
+import ujson
+import time
+
+# 全域解碼統計 (量測用)
+parse_stats = {
+    "topic_decodes": 0,
+    "text_decodes": 0,
+    "json_parses": 0,
+    "parse_us": 0,
+}
+
+_UNSET = object()
+
+
+class MqttMessage:
+    __slots__ = ("raw_topic", "raw", "retained", "_topic", "_text", "_payload")
+
+    def __init__(self, topic, msg, retained=False):
+        self.raw_topic = topic
+        self.raw = msg
+        self.retained = retained
+        self._topic = None
+        self._text = None
+        self._payload = _UNSET
+
+    @property
+    def topic(self):
+        if self._topic is None:
+            t = self.raw_topic
+            self._topic = t if isinstance(t, str) else str(t, "utf-8")
+            parse_stats["topic_decodes"] += 1
+        return self._topic
+
+    @property
+    def text(self):
+        """payload 解碼成字串 (無法以 UTF-8 解碼時返回 repr)"""
+        if self._text is None:
+            m = self.raw
+            if isinstance(m, str):
+                self._text = m
+            else:
+                try:
+                    self._text = str(m, "utf-8")
+                except Exception:
+                    self._text = str(m)
+                parse_stats["text_decodes"] += 1
+        return self._text
+
+    @property
+    def payload(self):
+        """JSON 解析後的物件；不是合法 JSON 時返回字串本身"""
+        if self._payload is _UNSET:
+            t0 = time.ticks_us()
+            text = self.text
+            try:
+                self._payload = ujson.loads(text)
+            except Exception:
+                self._payload = text
+            parse_stats["json_parses"] += 1
+            parse_stats["parse_us"] += time.ticks_diff(time.ticks_us(), t0)
+        return self._payload
@@ -1,70 +1,141 @@
-
 """
-communication/mqtt_router.py - MQTT 訊息路由 (Debug Version)
+communication/mqtt_router.py - MQTT 訊息路由
+
+@router.route() 的 topic 編譯成以 "/" 分段的 trie，比對成本只與 topic 層數有關，與路由數量無關
+支援 MQTT 萬用字元與具名參數：
+  +       : 任一段 (不擷取)
+  #       : 其後所有段 (只能放在最後)
+  <name>  : 任一段，並以 name=值 傳給處理函式，例如 f"{TOPIC_PREFIX}/alarm/<alarm_id>/enable"
+優先順序：固定字串 > 單段萬用字元 > #
+
+訂閱前綴 (TOPIC_PREFIX) 在註冊與收到訊息時各去除一次，trie 內只保存之後的部分；
+不在前綴之下的 topic 另存於一棵以完整 topic 比對的 trie
+
+dispatch() 接收 MqttMessage，payload 在路由命中後才解碼與解析
 """
 
-import ujson
-import uasyncio
+import config
+from utils.log import get_logger
+
+log = get_logger("Router")
+
+
+class _Node:
+    __slots__ = ("children", "wild", "multi", "leaf")
+
+    def __init__(self):
+        self.children = {}  # 固定字串段 -> _Node
+        self.wild = None    # + 或 <name> 的子節點
+        self.multi = None   # # 的 (handler, names)
+        self.leaf = None    # 到此結束的 (handler, names)
+
 
 class MqttRouter:
-    def __init__(self, mqtt_manager):
+    def __init__(self, mqtt_manager, prefix=config.TOPIC_PREFIX):
         self.mqtt = mqtt_manager
-        self.routes = {} 
+        self.prefix = prefix + "/" if prefix else ""
+        self.routes = {}  # 原始 pattern -> handler (僅供查看)
+        self._root = _Node()   # 前綴之下的路由
+        self._other = _Node()  # 其他完整 topic
+        self.stats = {"dispatched": 0, "misses": 0, "errors": 0}
+
+    def _split(self, topic):
+        """去除訂閱前綴，返回 (trie 根節點, 分段列表)"""
+        if topic.startswith(self.prefix):
+            return self._root, topic[len(self.prefix):].split("/")
+        return self._other, topic.split("/")
 
     def route(self, topic):
         if isinstance(topic, bytes):
             topic = topic.decode()
         def decorator(func):
-            self.routes[topic] = func
+            self.add(topic, func)
             return func
         return decorator
 
-    async def dispatch(self, topic, msg, retained):
+    def add(self, pattern, handler):
         """
-        處理訊息分發
+        註冊路由
+        萬用字元段依序對應 names 中的名稱 (+ 為 None，不傳給處理函式)
         """
-        # 注意：這裡的 topic/msg 可能已經被 MqttManager decode 過，也可能還是 bytes
-        # 為了保險，我們再檢查一次
-        
-        topic_str = ""
-        try:
-            if hasattr(topic, 'decode'):
-                topic_str = topic.decode()
+        node, segs = self._split(pattern)
+        names = []
+        for i, seg in enumerate(segs):
+            if seg == "#":
+                if i != len(segs) - 1:
+                    raise ValueError(f"'#' must be the last segment: {pattern}")
+                node.multi = (handler, tuple(names))
+                self.routes[pattern] = handler
+                return
+            if seg == "+" or (seg.startswith("<") and seg.endswith(">")):
+                names.append(seg[1:-1] if seg != "+" else None)
+                if node.wild is None:
+                    node.wild = _Node()
+                node = node.wild
             else:
-                topic_str = str(topic)
-        except:
-            topic_str = str(topic)
+                child = node.children.get(seg)
+                if child is None:
+                    child = node.children[seg] = _Node()
+                node = child
+        node.leaf = (handler, tuple(names))
+        self.routes[pattern] = handler
+
+    def match(self, topic):
+        """
+        返回: (handler, params dict) 或 None
+        topic 可含前綴 (會先去除)
+        """
+        root, segs = self._split(topic)
+        values = []
+        found = self._match(root, segs, 0, values)
+        if found is None:
+            return None
+        handler, names = found
+        params = {}
+        for name, value in zip(names, values):
+            if name is not None:
+                params[name] = value
+        return handler, params
+
+    def _match(self, node, segs, i, values):
+        """深度優先比對；values 依序收集萬用字元段的值 (回溯時還原)"""
+        if i == len(segs):
+            if node.leaf is not None:
+                return node.leaf
+            return node.multi  # "a/#" 也匹配 "a"
+        child = node.children.get(segs[i])
+        if child is not None:
+            found = self._match(child, segs, i + 1, values)
+            if found is not None:
+                return found
+        if node.wild is not None:
+            values.append(segs[i])
+            found = self._match(node.wild, segs, i + 1, values)
+            if found is not None:
+                return found
+            values.pop()
+        return node.multi
 
-        msg_str = ""
+    async def dispatch(self, message):
+        """
+        處理訊息分發
+        message: MqttMessage；只有在路由命中後才解碼並解析 payload
+        """
+        topic_str = message.topic
+
+        found = self.match(topic_str)
+        if found is None:
+            self.stats["misses"] += 1
+            log.debug("沒有對應的路由: %s", topic_str)
+            return
+        handler, params = found
+
+        self.stats["dispatched"] += 1
         try:
-            if hasattr(msg, 'decode'):
-                msg_str = msg.decode()
+            if params:
+                await handler(message.payload, **params)
             else:
-                msg_str = str(msg)
-        except:
-            msg_str = str(msg)
-        
-#         topic_str = topic.decode() if isinstance(topic, bytes) else topic
-#         msg_str = msg.decode() if isinstance(msg, bytes) else msg
-        
-        print(f"[Router] 開始匹配路由: {topic_str}")
-
-        payload = None
-        try:
-            payload = ujson.loads(msg_str)
-        except:
-            payload = msg_str 
-
-        if topic_str in self.routes:
-            try:
-                print(f"[Router] 命中規則! 執行對應函式...")
-                handler = self.routes[topic_str]
-                await handler(payload)
-            except Exception as e:
-                print(f"[Router] 執行函式失敗: {e}")
-                import sys
-                sys.print_exception(e)
-        else:
-            print(f"[Router] 沒找到對應規則，現有規則如下:")
-            for r in self.routes:
-                print(f" - {r}")
+                await handler(message.payload)
+        except Exception as e:
+            self.stats["errors"] += 1
+            log.exception(e, "執行函式失敗 (%s)", topic_str)
@@ -1,101 +1,758 @@
 
 """
 communication/web_server.py - 鬧鐘 Web 介面與 REST API
+
+網頁介面優先使用 www/ 下預先 gzip 的靜態頁 (由 tools/build_web.py 產生)，
+頁面只透過 JSON API 操作鬧鐘；找不到靜態檔或瀏覽器不支援 gzip 時，改用伺服器端產生的頁面
 """
 
 import uasyncio
 import ujson
+import gc
+import os
+import time
+import config
+from utils.event_bus import bus
+import utils.log as logging
+from utils.log import get_logger
+import utils.metrics as metrics
+from utils.songs import library as songs
+
+log = get_logger("Web")
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    202: "Accepted",
+    304: "Not Modified",
+    303: "See Other",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def _unquote(s):
+    """URL 解碼 (application/x-www-form-urlencoded)"""
+    s = s.replace("+", " ")
+    if "%" not in s:
+        return s
+    parts = s.split("%")
+    out = bytearray(parts[0].encode())
+    for p in parts[1:]:
+        try:
+            out.append(int(p[:2], 16))
+            out.extend(p[2:].encode())
+        except ValueError:
+            out.extend(("%" + p).encode())
+    try:
+        return out.decode("utf-8")
+    except UnicodeError:
+        raise HttpError(400)  # %XX 解出的不是合法的 UTF-8
+
+
+def parse_qs(s):
+    """"a=1&b=2" -> {"a": "1", "b": "2"}"""
+    kv = {}
+    for pair in s.split("&"):
+        if not pair:
+            continue
+        k, _, v = pair.partition("=")
+        kv[_unquote(k)] = _unquote(v)
+    return kv
+
+
+def fill_chunks(pieces, buf):
+    """
+    把任意長度的字串 / bytes 片段依序裝進固定大小的 buf，裝滿就 yield 一次
+    yield 的是 buf 的 memoryview，呼叫端必須在取下一塊之前寫出 (buf 會被覆寫)
+    """
+    mv = memoryview(buf)
+    size = len(buf)
+    n = 0
+    for p in pieces:
+        if isinstance(p, str):
+            p = p.encode("utf-8")
+        pm = memoryview(p)
+        pos = 0
+        total = len(p)
+        while pos < total:
+            k = min(size - n, total - pos)
+            mv[n:n + k] = pm[pos:pos + k]
+            n += k
+            pos += k
+            if n == size:
+                yield mv
+                n = 0
+    if n:
+        yield mv[:n]
+
+
+_CONTENT_TYPES = {
+    "html": "text/html; charset=utf-8",
+    "css": "text/css",
+    "js": "application/javascript",
+    "json": "application/json",
+    "svg": "image/svg+xml",
+}
+
+
+def _encode_all(pieces):
+    for p in pieces:
+        yield p.encode("utf-8") if isinstance(p, str) else p
+
+
+def _mem_alloc():
+    """目前已配置的 heap (MicroPython)；CPython 沒有 gc.mem_alloc 時返回 0"""
+    try:
+        return gc.mem_alloc()
+    except AttributeError:
+        return 0
+
+
+class HttpRequest:
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        self.version = version
+        self.headers = headers  # key 皆為小寫
+        self.body = body
+        self.path, _, qs = target.partition("?")
+        self.query = parse_qs(qs)
+
+    @property
+    def keep_alive(self):
+        conn = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return conn == "keep-alive"
+        return conn != "close"
+
+    def params(self):
+        """合併 query string 與表單 body 的參數"""
+        kv = dict(self.query)
+        ctype = self.headers.get("content-type", "")
+        if self.body and ctype.startswith("application/x-www-form-urlencoded"):
+            try:
+                body = self.body.decode("utf-8")
+            except UnicodeError:
+                raise HttpError(400)
+            kv.update(parse_qs(body))
+        return kv
+
+    def json(self):
+        return ujson.loads(self.body) if self.body else None
+
+
+class LineReader:
+    """
+    StreamReader 外加一層有上限的讀取緩衝 (每條連線一個，keep-alive 的多個請求共用)
+    readline() 最多只向 socket 讀取 limit 個 byte，超過仍沒有換行就拋出 HttpError(431)，
+    不會先把整行讀進記憶體再檢查長度；多讀的部分留給下一次 readline() / readexactly()
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._buf = b""
+
+    async def readline(self, limit):
+        """返回以換行結尾、不超過 limit bytes 的一行；連線關閉時返回剩下的資料 (可能為 b"")"""
+        while True:
+            buf = self._buf
+            i = buf.find(b"\n")
+            if 0 <= i < limit:
+                self._buf = buf[i + 1:]
+                return buf[:i + 1]
+            if len(buf) >= limit:
+                raise HttpError(431)
+            chunk = await self.reader.read(limit - len(buf))
+            if not chunk:
+                self._buf = b""
+                return buf
+            self._buf = buf + chunk
+
+    async def readexactly(self, n):
+        data = self._buf[:n]
+        self._buf = self._buf[n:]
+        if len(data) < n:
+            data += await self.reader.readexactly(n - len(data))
+        return data
+
+
+async def read_request(reader, idle_sec):
+    """
+    逐行讀取一個 HTTP 請求 (可跨多個 TCP segment)
+    reader: LineReader
+    idle_sec: 等待請求第一行的時間，逾時拋出 uasyncio.TimeoutError (由呼叫端決定是否計為逾時)
+    收到第一行後，header 須在 HTTP_HEADER_TIMEOUT_SEC、body 須在 HTTP_BODY_TIMEOUT_SEC 內讀完，否則回 408
+    請求行 + header 超過 HTTP_MAX_HEADER_BYTES 回 431 (讀取時即限制長度)，body 超過 HTTP_MAX_BODY_BYTES 回 413
+
+    返回: HttpRequest，連線已關閉時返回 None
+    """
+    line = await uasyncio.wait_for(_read_request_line(reader), idle_sec)
+    if not line:
+        return None
+
+    size = len(line)
+    try:
+        method, target, version = line.decode("utf-8").strip().split(" ")
+    except (ValueError, UnicodeError):
+        raise HttpError(400)
+
+    try:
+        headers = await uasyncio.wait_for(_read_headers(reader, size), config.HTTP_HEADER_TIMEOUT_SEC)
+    except uasyncio.TimeoutError:
+        raise HttpError(408)
+    if headers is None:
+        return None
+
+    body = b""
+    length = headers.get("content-length")
+    if length:
+        try:
+            length = int(length)
+        except ValueError:
+            raise HttpError(400)
+        if length > config.HTTP_MAX_BODY_BYTES:
+            raise HttpError(413)
+        if length > 0:
+            try:
+                body = await uasyncio.wait_for(reader.readexactly(length), config.HTTP_BODY_TIMEOUT_SEC)
+            except uasyncio.TimeoutError:
+                raise HttpError(408)
+    return HttpRequest(method, target, version, headers, body)
+
+
+async def _read_request_line(reader):
+    line = await reader.readline(config.HTTP_MAX_HEADER_BYTES)
+    # 容忍 keep-alive 請求之間多出的空行
+    while line in (b"\r\n", b"\n"):
+        line = await reader.readline(config.HTTP_MAX_HEADER_BYTES)
+    return line
+
+
+async def _read_headers(reader, size):
+    """讀到空行為止；size 為已讀取的請求行長度 (一起計入 header 上限)，連線中斷時返回 None"""
+    headers = {}
+    while True:
+        line = await reader.readline(config.HTTP_MAX_HEADER_BYTES - size)
+        if not line:
+            return None
+        size += len(line)
+        if line in (b"\r\n", b"\n"):
+            return headers
+        try:
+            k, sep, v = line.decode("utf-8").partition(":")
+        except UnicodeError:
+            raise HttpError(400)
+        if sep:
+            headers[k.strip().lower()] = v.strip()
+
+
+class WriteTimeout(Exception):
+    """用戶端接收太慢，drain() 超過 HTTP_WRITE_TIMEOUT_SEC 仍未完成"""
+    pass
+
+
+async def drain(writer):
+    """
+    等待輸出緩衝區送出 (TCP 背壓)；對方長時間不收資料時拋出 WriteTimeout，
+    避免一個慢速用戶端把整份回應卡在記憶體裡
+    """
+    try:
+        await uasyncio.wait_for(writer.drain(), config.HTTP_WRITE_TIMEOUT_SEC)
+    except uasyncio.TimeoutError:
+        raise WriteTimeout()
+
+
+class ConnLimiter:
+    """
+    非阻塞的計數信號量 (uasyncio 沒有 Semaphore)
+    額滿時不排隊等待，由呼叫端立即回 503，避免排隊中的連線繼續佔用 socket 與記憶體
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.peak = 0
+
+    def acquire(self):
+        """取得名額成功返回 True，額滿返回 False"""
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        if self.active > self.peak:
+            self.peak = self.active
+        return True
+
+    def release(self):
+        if self.active > 0:
+            self.active -= 1
+
+
+# 額滿時的固定回應，預先編碼，拒絕連線時不需要任何配置
+_RESP_503 = (b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n"
+             b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+
 
 class WebServer:
-    def __init__(self, alarm_manager):
+    def __init__(self, alarm_manager, ring_ctl=None):
         self.alarm_mgr = alarm_manager
+        self.ring_ctl = ring_ctl
         self.weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+        self.cache = alarm_manager.cache
+        self._build_static()
+        self.limiter = ConnLimiter(config.HTTP_MAX_CONNECTIONS)
+        self._sse_active = 0
+        self.stats = {
+            "streamed": 0,
+            "render_last_peak_bytes": 0,
+            "render_max_peak_bytes": 0,
+            "accepted": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "too_large": 0,
+            "requests": 0,
+        }
 
     async def handle_request(self, reader, writer):
+        """
+        處理一條 TCP 連線 (HTTP/1.1 keep-alive)
+        同時服務的連線數超過 HTTP_MAX_CONNECTIONS 時直接回 503；
+        同一條連線最多服務 HTTP_MAX_REQUESTS_PER_CONN 個請求，閒置超過 HTTP_KEEPALIVE_SEC 即關閉
+        """
+        if not self.limiter.acquire():
+            self.stats["rejected"] += 1
+            try:
+                writer.write(_RESP_503)
+                await drain(writer)
+            except Exception:
+                pass
+            await self._close(writer)
+            return
+
+        self.stats["accepted"] += 1
+        served = 0
         try:
-            request = await reader.read(1024)
-            request = request.decode("utf-8")
-            
-            # 簡單解析 (只取第一行 GET /path HTTP/1.1)
-            first_line = request.split("\r\n")[0]
-            if not first_line:
-                writer.close()
-                return
-                
-            method, path, _ = first_line.split(" ")
-            
-            response_body = ""
-            status = "200 OK"
-            content_type = "text/html; charset=utf-8"
-
-            # === API 路由 ===
-            if path.startswith("/add?"):
-                # 簡易 GET based API: /add?hour=8&minute=30&Mon=on...
-                self._handle_add(path)
-                response_body = "<meta http-equiv='refresh' content='0; url=/'/>"
-            
-            elif path.startswith("/delete?"):
-                self._handle_delete(path)
-                response_body = "<meta http-equiv='refresh' content='0; url=/'/>"
-
-            elif path == "/api/alarms":
-                # 真 JSON API
-                content_type = "application/json"
-                response_body = ujson.dumps(self.alarm_mgr.get_all())
-
-            # === 網頁 UI ===
-            else:
-                response_body = self._render_html()
+            # 每條連線一個固定大小的輸出緩衝區，串流回應時重複使用 (取得名額後才配置)；
+            # 讀取端最多暫存 HTTP_MAX_HEADER_BYTES + HTTP_MAX_BODY_BYTES，
+            # 每條連線的 heap 用量因此有上限，慢速用戶端在期限前也無法讓伺服器無限配置
+            buf = bytearray(config.HTTP_CHUNK_SIZE)
+            reader = LineReader(reader)
+            while True:
+                # 新連線必須在 header 期限內送出請求；之後的請求之間允許 keep-alive 閒置
+                idle = config.HTTP_KEEPALIVE_SEC if served else config.HTTP_HEADER_TIMEOUT_SEC
+                try:
+                    req = await read_request(reader, idle)
+                except uasyncio.TimeoutError:
+                    if not served:
+                        self.stats["timed_out"] += 1
+                    break
+                except HttpError as e:
+                    if e.status == 408:
+                        self.stats["timed_out"] += 1
+                    elif e.status in (413, 431):
+                        self.stats["too_large"] += 1
+                    await self._send(writer, e.status, STATUS_TEXT.get(e.status, ""), keep_alive=False)
+                    break
+                if req is None:
+                    break
 
-            # 回傳回應
-            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n\r\n".encode("utf-8"))
-            writer.write(response_body.encode("utf-8"))
-            await writer.drain()
-            await writer.aclose()
-            
+                served += 1
+                self.stats["requests"] += 1
+                keep_alive = req.keep_alive and served < config.HTTP_MAX_REQUESTS_PER_CONN
+                t0 = time.ticks_us()
+                try:
+                    keep_alive = await self._dispatch(req, writer, keep_alive, buf)
+                except HttpError as e:
+                    keep_alive = await self._send(writer, e.status, STATUS_TEXT.get(e.status, ""),
+                                                  keep_alive=keep_alive)
+                if req.path != "/api/events":  # SSE 長連線不計入請求耗時
+                    metrics.since("http.request", t0)
+                if not keep_alive:
+                    break
+        except WriteTimeout:
+            self.stats["timed_out"] += 1
+            log.warning("用戶端接收逾時，關閉連線")
         except Exception as e:
-            print(f"[Web] 處理錯誤: {e}")
+            log.error("處理錯誤: %s", e)
+        finally:
+            self.limiter.release()
+            await self._close(writer)
+
+    async def _close(self, writer):
+        try:
+            await writer.aclose()
+        except Exception:
             writer.close()
 
-    def _handle_add(self, path):
+    def conn_stats(self):
+        """連線統計 (累計值 + 目前/峰值同時連線數)"""
+        stats = dict(self.stats)
+        stats["active"] = self.limiter.active
+        stats["peak_active"] = self.limiter.peak
+        stats["limit"] = self.limiter.limit
+        stats["sse_active"] = self._sse_active
+        return stats
+
+    async def _dispatch(self, req, writer, keep_alive, buf):
+        """處理單一請求，返回連線是否繼續保持"""
+        path = req.path
+
+        # === API 路由 ===
+        if path == "/add":
+            # 簡易 GET based API: /add?hour=8&minute=30&Mon=on... (也接受 POST 表單)
+            err = self._handle_add(req.params())
+            if err is not None:
+                return await self._send_json(writer, 400, {"error": f"invalid alarm: {err}"}, keep_alive)
+            return await self._redirect(writer, "/", keep_alive)
+
+        elif path == "/delete":
+            self._handle_delete(req.params())
+            return await self._redirect(writer, "/", keep_alive)
+
+        elif path == "/api/alarms":
+            # 真 JSON API
+            if req.method == "POST":
+                return await self._api_add(req, writer, keep_alive)
+            return await self._send_rendered(writer, req, "api_alarms", "application/json",
+                                             self.alarm_mgr.iter_json, keep_alive, buf)
+
+        elif path == "/api/alarms/batch":
+            if req.method != "POST":
+                return await self._send_json(writer, 405, {"error": "method not allowed"}, keep_alive)
+            return await self._api_batch(req, writer, keep_alive)
+
+        elif path == "/api/logs":
+            return await self._api_logs(req, writer, keep_alive)
+
+        elif path == "/api/songs":
+            # 會在第一次請求時載入所有鈴聲以回報記憶體用量
+            return await self._send_json(writer, 200, songs.info(), keep_alive)
+
+        elif path == "/api/ring":
+            return await self._api_ring(req, writer, keep_alive)
+
+        elif path == "/api/metrics":
+            return await self._send_json(writer, 200, metrics.snapshot(), keep_alive)
+
+        elif path == "/api/events":
+            return await self._event_stream(writer)
+
+        elif path.startswith("/api/alarms/"):
+            if req.method != "DELETE":
+                return await self._send_json(writer, 405, {"error": "method not allowed"}, keep_alive)
+            return await self._api_delete(path[len("/api/alarms/"):], writer, keep_alive)
+
+        # === 網頁 UI ===
+        static = self._static_file(req)
+        if static is not None:
+            return await self._send_file(writer, req, static, keep_alive, buf)
+        if path == "/" or path == "/index.html":
+            return await self._send_rendered(writer, req, "html", "text/html; charset=utf-8",
+                                             self._iter_html, keep_alive, buf)
+        return await self._send(writer, 404, "Not Found", "text/plain", keep_alive)
+
+    # ---------- JSON API ----------
+
+    async def _send_json(self, writer, status, obj, keep_alive):
+        return await self._send(writer, status, ujson.dumps(obj), "application/json", keep_alive)
+
+    async def _api_add(self, req, writer, keep_alive):
+        """POST /api/alarms  {"hour": 8, "minute": 30, "weekdays": ["Mon"], "song": "ode"}"""
+        try:
+            data = req.json()
+            hour = int(data["hour"])
+            minute = int(data["minute"])
+            days = data.get("weekdays", [])
+            song = songs.index_of(data.get("song", 0))
+        except Exception as e:
+            return await self._send_json(writer, 400, {"error": f"invalid alarm: {e}"}, keep_alive)
+        if days is not None and not isinstance(days, list):
+            return await self._send_json(writer, 400, {"error": "weekdays must be a list"}, keep_alive)
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            return await self._send_json(writer, 400, {"error": "hour/minute out of range"}, keep_alive)
+        idx = self.alarm_mgr.add_alarm(hour, minute, days, song=song)
+        alarm = self.alarm_mgr.get_all()[idx]
+        return await self._send_json(writer, 201, {"index": idx, "alarm": alarm.to_dict()}, keep_alive)
+
+    async def _api_batch(self, req, writer, keep_alive):
+        """POST /api/alarms/batch  [{"op": "add", ...}, {"op": "delete", "id": 3}, ...] 或 {"ops": [...]}"""
+        try:
+            ops = req.json()
+        except Exception as e:
+            return await self._send_json(writer, 400, {"ok": False, "errors": [{"index": -1, "error": f"invalid json: {e}"}]}, keep_alive)
+        if isinstance(ops, dict):
+            ops = ops.get("ops")
+        ok, result = self.alarm_mgr.apply_batch(ops)
+        return await self._send_json(writer, 200 if ok else 400, result, keep_alive)
+
+    async def _api_logs(self, req, writer, keep_alive):
+        """
+        GET  /api/logs?since=0&level=INFO&limit=50  讀取最近的日誌
+        POST /api/logs  {"level": "DEBUG", "echo": "WARNING"}  調整記錄 / 序列埠輸出等級
+        """
+        if req.method == "POST":
+            try:
+                data = req.json()
+            except Exception as e:
+                return await self._send_json(writer, 400, {"error": f"invalid json: {e}"}, keep_alive)
+            if not isinstance(data, dict):
+                return await self._send_json(writer, 400, {"error": "body must be a JSON object"}, keep_alive)
+            logging.set_level(data.get("level"), data.get("echo"))
+            return await self._send_json(writer, 200, {"level": logging.get_level()}, keep_alive)
+        q = req.params()
+        try:
+            since = int(q.get("since", 0))
+            limit = int(q.get("limit", 50))
+        except ValueError:
+            return await self._send_json(writer, 400, {"error": "since/limit must be integers"}, keep_alive)
+        doc = logging.snapshot(since, q.get("level", "DEBUG"), limit)
+        return await self._send_json(writer, 200, doc, keep_alive)
+
+    async def _api_ring(self, req, writer, keep_alive):
+        """
+        GET  /api/ring  響鈴狀態 (idle / ringing / snoozed)
+        POST /api/ring  {"action": "stop"}、{"action": "stop_all"} 或 {"action": "snooze"}
+        """
+        if self.ring_ctl is None:
+            return await self._send_json(writer, 404, {"error": "ring control not available"}, keep_alive)
+        if req.method == "POST":
+            try:
+                action = req.json().get("action")
+            except Exception as e:
+                return await self._send_json(writer, 400, {"error": f"invalid json: {e}"}, keep_alive)
+            if action == "stop":
+                queued = self.ring_ctl.stop("web")
+            elif action == "stop_all":
+                queued = self.ring_ctl.stop_all("web")
+            elif action == "snooze":
+                queued = self.ring_ctl.snooze("web")
+            else:
+                return await self._send_json(writer, 400, {"error": "action must be stop, stop_all or snooze"}, keep_alive)
+            # 指令由控制器任務處理，回傳的是排入當下的狀態
+            doc = self.ring_ctl.status()
+            doc["queued"] = queued
+            return await self._send_json(writer, 202 if queued else 503, doc, keep_alive)
+        return await self._send_json(writer, 200, self.ring_ctl.status(), keep_alive)
+
+    async def _api_delete(self, alarm_id, writer, keep_alive):
+        """DELETE /api/alarms/<id> (依固定 id 刪除)"""
+        try:
+            idx = self.alarm_mgr.index_of(int(alarm_id))
+        except ValueError:
+            idx = -1
+        if self.alarm_mgr.delete_alarm(idx) is None:
+            return await self._send_json(writer, 404, {"error": "alarm not found"}, keep_alive)
+        return await self._send_json(writer, 200, {"deleted": int(alarm_id)}, keep_alive)
+
+    async def _event_stream(self, writer):
+        """
+        GET /api/events (Server-Sent Events)
+        一條長連線取代反覆輪詢 /api/alarms；連線期間轉送 bus 上的事件，
+        閒置 SSE_PING_SEC 送出註解行當作心跳 (同時偵測已斷線的用戶端)
+        瀏覽器 (重新) 連線後應自行讀取一次 /api/alarms 取得初始狀態
+
+        返回: False (串流結束後關閉連線)
+        """
+        if self._sse_active >= config.SSE_MAX_CLIENTS:
+            return await self._send_json(writer, 503, {"error": "too many event streams"}, False)
+
+        sub = bus.subscribe(config.SSE_QUEUE_LEN)
+        self._sse_active += 1
+        try:
+            head = self._head(200, "text/event-stream", False, "Cache-Control: no-cache\r\n")
+            writer.write((head + "\r\nretry: 3000\n\n").encode("utf-8"))
+            await drain(writer)
+            while True:
+                frame = await sub.get(config.SSE_PING_SEC)
+                writer.write(frame if frame is not None else b": ping\n\n")
+                await drain(writer)
+        except OSError:
+            pass  # 用戶端已離開
+        finally:
+            self._sse_active -= 1
+            bus.unsubscribe(sub)
+        return False
+
+    # ---------- 靜態檔 ----------
+
+    def _static_file(self, req):
+        """
+        對應到 www/ 下預先 gzip 的檔案 ("/" -> www/index.html.gz)
+        返回: (檔案路徑, 檔案大小, 修改時間)，不存在、方法不符或瀏覽器不接受 gzip 時返回 None
+        """
+        if req.method not in ("GET", "HEAD") or ".." in req.path:
+            return None
+        if "gzip" not in req.headers.get("accept-encoding", ""):
+            return None
+        path = "/index.html" if req.path == "/" else req.path
+        fpath = config.WEB_STATIC_DIR + path + ".gz"
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return None
+        return fpath, st[6], int(st[8])
+
+    async def _send_file(self, writer, req, static, keep_alive, buf):
+        """以固定大小的 buf 分塊讀取檔案並送出，不把整個檔案載入記憶體"""
+        fpath, size, mtime = static
+        etag = f'"{size:x}-{mtime:x}"'
+        ctype = _CONTENT_TYPES.get(fpath[:-3].rsplit(".", 1)[-1], "application/octet-stream")
+        cache_hdr = f"Cache-Control: public, max-age={config.WEB_STATIC_MAX_AGE}\r\nETag: {etag}\r\n"
+        if req.headers.get("if-none-match") == etag:
+            return await self._send(writer, 304, keep_alive=keep_alive, extra=cache_hdr)
+
+        head = self._head(200, ctype, keep_alive, cache_hdr + "Content-Encoding: gzip\r\nVary: Accept-Encoding\r\n")
+        writer.write(f"{head}Content-Length: {size}\r\n\r\n".encode("utf-8"))
+        if req.method == "HEAD":
+            await drain(writer)
+            return keep_alive
+
+        mv = memoryview(buf)
+        with open(fpath, "rb") as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                writer.write(mv[:n])
+                await drain(writer)
+        return keep_alive
+
+    async def _send_rendered(self, writer, req, key, content_type, render, keep_alive, buf):
+        """
+        render: 產生字串片段的 generator 函式
+        鬧鐘不多時組成整份回應並快取；超過 RENDER_CACHE_MAX_ALARMS 時以固定大小的 buf 分塊串流，
+        峰值記憶體與鬧鐘數量無關
+        """
+        if len(self.alarm_mgr.get_all()) <= config.RENDER_CACHE_MAX_ALARMS:
+            return await self._send_cached(writer, req, key, content_type,
+                                           lambda: b"".join(_encode_all(render())), keep_alive)
+        self.stats["streamed"] += 1
+        return await self._send_chunked(writer, 200, content_type, fill_chunks(render(), buf),
+                                        keep_alive, req.version)
+
+    def _head(self, status, content_type, keep_alive, extra=""):
+        return (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                f"{extra}")
+
+    async def _send(self, writer, status, body="", content_type="text/html; charset=utf-8",
+                    keep_alive=True, extra=""):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        head = self._head(status, content_type, keep_alive, extra)
+        writer.write(f"{head}Content-Length: {len(body)}\r\n\r\n".encode("utf-8"))
+        if body:
+            writer.write(body)
+        await drain(writer)
+        return keep_alive
+
+    async def _send_cached(self, writer, req, key, content_type, build_body, keep_alive):
+        """
+        以鬧鐘版本號快取完整的 HTTP 回應 (含 header)，命中時只需一次寫入
+        瀏覽器帶著相同 ETag 詢問時回 304
+        """
+        etag = self.cache.etag()
+        if req.headers.get("if-none-match") == etag:
+            return await self._send(writer, 304, keep_alive=keep_alive, extra=f"ETag: {etag}\r\n")
+
+        def build():
+            body = build_body()
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            # 快取的是保持連線的回應 (HTTP/1.1 預設，不帶 Connection header)；
+            # 同時記下最後空行的位置，要關閉連線時在那裡插入 Connection: close
+            head = (f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\nETag: {etag}\r\nCache-Control: no-cache\r\n\r\n")
+            head = head.encode("utf-8")
+            return head + body, len(head) - 2
+
+        resp, split = self.cache.get(key, build)
+        if keep_alive:
+            writer.write(resp)
+        else:
+            mv = memoryview(resp)
+            writer.write(mv[:split])
+            writer.write(b"Connection: close\r\n")
+            writer.write(mv[split:])
+        await drain(writer)
+        return keep_alive
+
+    async def _send_chunked(self, writer, status, content_type, chunks, keep_alive, version):
+        """以 chunked transfer encoding 串流；HTTP/1.0 用戶端改為寫完即關閉連線"""
+        chunked = version != "HTTP/1.0"
+        if not chunked:
+            keep_alive = False
+        extra = "Transfer-Encoding: chunked\r\n" if chunked else ""
+        writer.write((self._head(status, content_type, keep_alive, extra) + "\r\n").encode("utf-8"))
+        base = _mem_alloc()
+        peak = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            if chunked:
+                writer.write(("%x\r\n" % len(chunk)).encode())
+                writer.write(chunk)
+                writer.write(b"\r\n")
+            else:
+                writer.write(chunk)
+            await drain(writer)
+            peak = max(peak, _mem_alloc() - base)
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+        await drain(writer)
+
+        # 串流期間 heap 的成長量 (未觸發 GC 時為上限估計)
+        self.stats["render_last_peak_bytes"] = peak
+        if peak > self.stats["render_max_peak_bytes"]:
+            self.stats["render_max_peak_bytes"] = peak
+        return keep_alive
+
+    async def _redirect(self, writer, location, keep_alive):
+        return await self._send(writer, 303, keep_alive=keep_alive, extra=f"Location: {location}\r\n")
+
+    def _handle_add(self, kv):
+        """返回 None 表示已新增，否則為錯誤原因 (時分超出範圍等，鬧鐘未變動)"""
         try:
-            params = path.split("?")[1]
-            kv = {k:v for k,v in [p.split("=") for p in params.split("&")]}
             hour = int(kv.get("hour", 0))
             minute = int(kv.get("minute", 0))
             days = [d for d in self.weekdays if kv.get(d) == "on"]
             self.alarm_mgr.add_alarm(hour, minute, days)
         except Exception as e:
-            print(f"[Web] Add Error: {e}")
+            log.error("Add Error: %s", e)
+            return e
 
-    def _handle_delete(self, path):
+    def _handle_delete(self, kv):
         try:
-            params = path.split("?")[1]
-            kv = {k:v for k,v in [p.split("=") for p in params.split("&")]}
             idx = int(kv.get("id", -1))
             self.alarm_mgr.delete_alarm(idx)
         except Exception as e:
-            print(f"[Web] Del Error: {e}")
-
-    def _render_html(self):
-        # 這裡放入原有的 HTML 模板字串 (為節省篇幅，簡化引用)
-        alarms = self.alarm_mgr.get_all()
-        
-        # 構建鬧鐘列表 HTML
-        list_html = ""
-        for i, a in enumerate(alarms):
-            days = ",".join(a.get("weekdays", [])) or "每天"
-            list_html += f'<li>{a["hour"]:02d}:{a["minute"]:02d} ({days}) <a class="delete" href="/delete?id={i}">刪除</a></li>'
+            log.error("Del Error: %s", e)
 
+    def _build_static(self):
+        """頁面中與鬧鐘無關的部分 (CSS、表單、下拉選單) 只在啟動時組一次"""
         hour_opts = "".join([f'<option value="{i}">{i:02d}</option>' for i in range(24)])
         min_opts = "".join([f'<option value="{i}">{i:02d}</option>' for i in range(60)])
-        
+
         day_checks = ""
         for d in self.weekdays:
             day_checks += f'<label class="day-btn"><input type="checkbox" name="{d}"><span>{d}</span></label>'
 
-        # 回傳完整 HTML (參照 mid_fir.py 的 CSS)
-        return f"""
+        # (參照 mid_fir.py 的 CSS)
+        self._page_head = f"""
 <!DOCTYPE html>
 <html lang="zh-Hant">
 <head>
@@ -124,12 +781,21 @@ button {{ width:100%; padding:10px; background:#007aff; color:white; border:none
     <div class="weekdays">{day_checks}</div>
     <button type="submit">新增鬧鐘</button>
 </form>
-<ul>{list_html}</ul>
+<ul>""".encode("utf-8")
+        self._page_tail = b"""</ul>
 </body></html>
 """
 
+    def _iter_html(self):
+        """逐段產生頁面：靜態的 head、每個鬧鐘一個 <li>、靜態的 tail"""
+        yield self._page_head
+        for i, a in enumerate(self.alarm_mgr.get_all()):
+            days = a.days_str("每天")
+            yield f'<li>{a.hour:02d}:{a.minute:02d} ({days}) <a class="delete" href="/delete?id={i}">刪除</a></li>'
+        yield self._page_tail
+
     async def start(self):
-        print("[Web] 啟動網頁伺服器...")
+        log.info("啟動網頁伺服器...")
         server = await uasyncio.start_server(self.handle_request, "0.0.0.0", 80)
         return server
 
@@ -5,6 +5,10 @@ communication/wifi.py - WiFi 連線管理（修正版）
 
 import config
 import time
+from utils.log import get_logger
+
+log = get_logger("WiFi")
+time_log = get_logger("Time")
 
 
 async def connect_wifi():
@@ -14,24 +18,24 @@ async def connect_wifi():
     
     返回: (ssid, password) 元組
     """
-    print("[WiFi] 嘗試連線到已知 WiFi 網路...")
+    log.info("嘗試連線到已知 WiFi 網路...")
     
     try:
         from ns_tools import connect_to_known_wifi
         ssid, password = connect_to_known_wifi(config.WIFI_PROFILES, try_time=10)
         
         if ssid and password:
-            print(f"[WiFi] 已連線到: {ssid}")
+            log.info("已連線到: %s", ssid)
             return ssid, password
         else:
-            print("[WiFi] 未找到已知 WiFi 或連線失敗")
+            log.warning("未找到已知 WiFi 或連線失敗")
             # 使用第一個預設配置作為備選
             ssid = list(config.WIFI_PROFILES.keys())[0]
             password = config.WIFI_PROFILES[ssid]
             return ssid, password
     
     except ImportError:
-        print("[WiFi] 缺少 ns_tools 模組，使用預設配置")
+        log.warning("缺少 ns_tools 模組，使用預設配置")
         ssid = list(config.WIFI_PROFILES.keys())[0]
         password = config.WIFI_PROFILES[ssid]
         return ssid, password
@@ -42,28 +46,28 @@ async def sync_time():
     同步系統時間到本地時區（UTC+8）
     使用 ns_tools 或 aiot_tools 的時間同步函數
     """
-    print("[Time] 同步系統時間...")
+    time_log.info("同步系統時間...")
     
     try:
         # 嘗試優先使用 ns_tools 的 mySetTime()（功能更完善）
         from ns_tools import mySetTime
         result = mySetTime(timezone=8, max_retries=3)
         if result:
-            print("[Time] 時間已同步 (ns_tools)")
+            time_log.info("時間已同步 (ns_tools)")
             return True
     except (ImportError, Exception) as e:
-        print(f"[Time] ns_tools 時間同步失敗: {e}")
+        time_log.warning("ns_tools 時間同步失敗: %s", e)
     
     try:
         # 備選：使用 aiot_tools 的 set_time()
         from aiot_tools import set_time
         set_time(timezone=8)
-        print("[Time] 時間已同步 (aiot_tools)")
+        time_log.info("時間已同步 (aiot_tools)")
         return True
     except (ImportError, Exception) as e:
-        print(f"[Time] aiot_tools 時間同步失敗: {e}")
+        time_log.warning("aiot_tools 時間同步失敗: %s", e)
     
-    print("[Time] 時間同步失敗，使用系統預設時間")
+    time_log.warning("時間同步失敗，使用系統預設時間")
     return False
 
 
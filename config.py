@@ -12,6 +12,9 @@ BUTTON_NEXT_PIN = 21    # 原 button_next
 
 # 蜂鳴器 (PWM)
 BUZZER_PIN = 6
+BUZZER_TIMER_ID = 0     # 播放用的 machine.Timer 編號，None 表示改用 uasyncio 計時
+BUZZER_DUTY = 512       # 發聲時的 PWM duty (0~1023)
+NOTE_GAP_MS = 20        # 音符之間的靜音，讓相同音高的音符分開
 
 # 感測器
 DHT11_PIN = 18
@@ -26,13 +29,27 @@ OLED_HEIGHT = 64
 # ==================== 系統參數 ====================
 
 # 按鈕參數 (修正補上)
-BUTTON_DEBOUNCE_MS = 20         # 按鈕穩定判定時間
-BUTTON_POLL_INTERVAL_MS = 30    # 按鈕輪詢間隔
+BUTTON_DEBOUNCE_MS = 20         # 按鈕狀態改變後忽略彈跳的時間
+BUTTON_LONG_PRESS_MS = 800      # 按住超過此時間發出長按事件
+BUTTON_DOUBLE_PRESS_MS = 400    # 放開後在此時間內再按一次視為雙擊
+BUTTON_QUEUE_LEN = 8            # 每個按鈕的事件佇列長度 (滿了丟棄最舊的事件)
 
 # 鬧鐘設定
 ALARM_FILE = "alarms.json"
-SNOOZE_MINUTES = 5
+ALARM_BIN_FILE = "alarms.bin"   # ALARM_STORE_BACKEND = "binary" 時使用
+SONG_DIR = "songs"          # RTTTL 鈴聲檔目錄 (<名稱>.txt)
+SONGS = ("twinkle", "beep", "ode")  # 可選鈴聲，位置即鬧鐘記錄中的編號 (最多 16 首，只能在尾端新增)；twinkle 為內建
+SNOOZE_MINUTES = 5          # 貪睡時間 (分鐘)，0 表示停止按鈕直接停止
+SNOOZE_MAX_COUNT = 3        # 同一次鬧鐘最多貪睡幾次，之後按下即停止
+RING_QUEUE_LEN = 8          # 響鈴控制器的指令佇列 (觸發 / 停止 / 貪睡)
 MAX_RING_TIME = 60  # 秒
+ALARM_CATCHUP_SEC = 300     # 錯過觸發時間多久內仍補響 (秒)
+ALARM_MAX_SLEEP_SEC = 3600  # 排程器最長睡眠時間，用來偵測時間跳動 (秒)
+ALARM_SAVE_QUIET_MS = 2000      # 最後一次修改後靜置多久才寫入 flash
+ALARM_SAVE_MAX_DELAY_MS = 10000 # 持續修改時最長延遲寫入時間
+ALARM_STORE_BACKEND = "json"    # "json": 整份重寫 / "journal": 快照 + 附加式修改記錄 / "binary": 固定長度 alarms.bin
+ALARM_JOURNAL_COMPACT_BYTES = 8192  # journal 超過此大小時壓縮回快照
+ALARM_BATCH_MAX_OPS = 50        # 批次操作 (/api/alarms/batch、MQTT alarm_batch) 單次上限
 
 # DHT11 量測間隔
 DHT11_POLL_INTERVAL_SEC = 10
@@ -40,6 +57,37 @@ DHT11_POLL_INTERVAL_SEC = 10
 # OLED 更新間隔
 OLED_UPDATE_INTERVAL_SEC = 0.5
 
+# ==================== Web Server ====================
+
+HTTP_KEEPALIVE_SEC = 5          # keep-alive 連線閒置多久後關閉
+HTTP_MAX_REQUESTS_PER_CONN = 20 # 同一條連線最多服務的請求數
+HTTP_MAX_HEADER_BYTES = 2048    # 請求行 + header 上限
+HTTP_MAX_BODY_BYTES = 4096      # Content-Length 上限
+HTTP_MAX_CONNECTIONS = 4        # 同時服務的連線數上限，額滿時直接回 503
+HTTP_HEADER_TIMEOUT_SEC = 5     # 新連線送出請求行、以及請求行之後送完 header 的期限，逾時回 408
+HTTP_BODY_TIMEOUT_SEC = 10      # 讀取 body 的期限
+HTTP_WRITE_TIMEOUT_SEC = 10     # drain() 超過此時間仍未送出 (用戶端不收資料) 即關閉連線
+RENDER_CACHE_MAX_ALARMS = 100   # 鬧鐘數不超過此值時快取整份頁面 / JSON 回應，否則改為分塊串流
+HTTP_CHUNK_SIZE = 512           # 串流回應時每條連線的輸出緩衝區大小
+WEB_STATIC_DIR = "www"          # tools/build_web.py 產生的 *.gz 靜態檔目錄
+WEB_STATIC_MAX_AGE = 86400      # 靜態檔的瀏覽器快取時間 (秒)
+SSE_MAX_CLIENTS = 2             # /api/events 同時連線數 (每條都佔用一個 HTTP_MAX_CONNECTIONS 名額)
+SSE_QUEUE_LEN = 8               # 每個 SSE 用戶端的事件佇列長度，讀太慢時丟棄最舊的事件
+SSE_PING_SEC = 15               # SSE 閒置時送出心跳的間隔
+
+# ==================== 日誌 ====================
+
+LOG_LEVEL = "INFO"              # 記錄等級 (DEBUG / INFO / WARNING / ERROR)，低於此等級的呼叫幾乎沒有成本
+LOG_ECHO_LEVEL = "INFO"         # 達到此等級才同時 print 到序列埠 (UART 輸出每行會阻塞數毫秒)
+LOG_BUFFER_LEN = 64             # 記憶體中保留的最近記錄筆數 (/api/logs、MQTT log_get)
+
+# ==================== 效能指標 ====================
+
+METRICS_ENABLED = True          # 記錄任務 / HTTP / MQTT 耗時直方圖 (每次只需幾次整數比較)
+METRICS_LAG_INTERVAL_MS = 100   # 事件迴圈延遲的取樣間隔
+METRICS_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)  # 直方圖分桶上限 (ms)，超過最後一格另計
+METRICS_PUBLISH_SEC = 300       # 定期發布到 MQTT metrics topic 的間隔，0 表示不發布
+
 # ==================== WiFi 配置 ====================
 
 # 已知 WiFi 網路清單
@@ -67,19 +115,46 @@ MQTT_PORT = 1883
 # DEVICE_ID = 'M1324001_AlarmClock_V2'
 DEVICE_ID = f'M1324001_Alarm_{random.randint(1000, 9999)}'
 
+# 接收佇列：on_message 只排入佇列，由 worker 協程呼叫 Router
+MQTT_RX_QUEUE_LEN = 16          # 佇列長度
+MQTT_RX_WORKERS = 2             # worker 協程數量
+MQTT_RX_OVERFLOW = "drop_oldest"  # 佇列滿時："drop_newest" / "drop_oldest" / "coalesce" (同 topic 以新訊息取代舊訊息)
+
+# 發送佇列：publish() 只排入佇列，斷線期間暫存，重新連線後限速送出
+MQTT_TX_QUEUE_LEN = 16          # 記憶體佇列長度
+MQTT_TX_OVERFLOW = "drop_oldest"  # 佇列滿且無法寫入溢出檔時的策略
+MQTT_TX_MIN_INTERVAL_MS = 100   # 兩次發送的最短間隔 (重新連線後不會一次灌爆 broker)
+MQTT_TX_SPILL_FILE = None       # 佇列滿時的 flash 溢出檔 (例如 "mqtt_spill.jsonl")，None 表示不使用
+MQTT_TX_SPILL_MAX_BYTES = 8192  # 溢出檔大小上限
+MQTT_TX_RETRY_LEN = 8           # QoS 1 重試緩衝區長度
+MQTT_TX_MAX_ATTEMPTS = 5        # QoS 1 訊息最多嘗試次數
+
 # Topic 前綴
 # TOPIC_PREFIX = f"nuu/csie/{DEVICE_ID}"
 TOPIC_PREFIX = f"nuu/csie/{DEVICE_ID}"
 
 # 定義 CRUD Topics
 # 使用者透過這些 Topic 發送指令
+# 狀態發布 (status_pub)：只在變化超過死區或超過最長間隔時發布
+STATUS_CHECK_SEC = 2            # 檢查狀態的間隔 (狀態反映延遲上限)
+STATUS_MAX_INTERVAL_SEC = 900   # 沒有變化時，至少每隔此時間重新發布一次完整狀態
+STATUS_TEMP_DEADBAND = 1        # 溫度變化達此值 (°C) 才發布
+STATUS_HUMI_DEADBAND = 3        # 濕度變化達此值 (%) 才發布
+STATUS_DELTA_ONLY = False       # True: 變化時只發布變動欄位到 status_pub/delta，完整狀態只在最長間隔時發布
+
 MQTT_TOPICS = {
     'subscribe_wildcard': f"{TOPIC_PREFIX}/#",  # 訂閱所有指令
     'alarm_add': f"{TOPIC_PREFIX}/alarm_add",       # Payload: JSON {"h": 8, "m": 30, "days": [...]}
     'alarm_del': f"{TOPIC_PREFIX}/alarm_delete",    # Payload: JSON {"index": 0}
     'alarm_list': f"{TOPIC_PREFIX}/alarm_list",     # Payload: 空 (觸發回傳)
+    'alarm_enable': f"{TOPIC_PREFIX}/alarm/<alarm_id>/enable",  # Payload: true / false (依鬧鐘 id 啟用或停用)
+    'alarm_batch': f"{TOPIC_PREFIX}/alarm_batch",   # Payload: JSON [{"op": "add", "h": 8, "m": 30}, {"op": "delete", "id": 3}, ...]
     'alarm_response': f"{TOPIC_PREFIX}/response",   # 裝置回傳結果
+    'log_get': f"{TOPIC_PREFIX}/log_get",           # Payload: JSON {"since": 0, "level": "INFO"} (可加 "set_level": "DEBUG")
+    'log_pub': f"{TOPIC_PREFIX}/log",               # 裝置回傳最近的日誌
+    'ring_control': f"{TOPIC_PREFIX}/ring_control", # Payload: "stop" / "stop_all" / "snooze" (空 payload 只查詢狀態)
     'status_pub': f"{TOPIC_PREFIX}/status",         # 定期發送溫濕度與狀態
+    'metrics_pub': f"{TOPIC_PREFIX}/metrics",       # 定期發送效能指標 (同 /api/metrics)
 }
 
 # ==================== 字體配置 ====================
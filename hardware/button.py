@@ -1,94 +1,158 @@
 """
 hardware/button.py - 按鈕與去彈跳模組
-提供非同步的按鈕監聽與去彈跳功能
+以 Pin.irq 邊緣中斷取代輪詢：中斷只記下時間戳並喚醒監看協程，
+監看協程去彈跳後把 ButtonEvent 放進佇列，使用端 await 事件即可，不需要定時讀取腳位
+
+去彈跳採「先接受、後忽略」：第一個邊緣立即產生事件 (延遲只有排程時間)，
+之後 BUTTON_DEBOUNCE_MS 內的彈跳不處理，期滿再讀一次腳位，確認沒有漏掉這段時間內的放開 / 按下
 """
 
 from machine import Pin
 import uasyncio
+import time
 import config
+from utils.ring_queue import RingQueue, DROP_OLDEST
+
+# MicroPython 1.15+ 才有 ThreadSafeFlag (可在中斷中 set)；沒有時退回 Event
+_Flag = getattr(uasyncio, "ThreadSafeFlag", None) or uasyncio.Event
+
+
+class ButtonEvent:
+    """按鈕事件類別"""
+
+    PRESSED = 1
+    RELEASED = 2
+    LONG_PRESS = 3    # 按住超過 BUTTON_LONG_PRESS_MS (按住期間發出一次)
+    DOUBLE_PRESS = 4  # 放開後 BUTTON_DOUBLE_PRESS_MS 內再次按下 (緊接在第二次 PRESSED 之後)
+
+    NAMES = {PRESSED: '按下', RELEASED: '釋放', LONG_PRESS: '長按', DOUBLE_PRESS: '雙擊'}
+
+    def __init__(self, button_id, event_type, timestamp=None, duration=0):
+        self.button_id = button_id
+        self.event_type = event_type
+        self.timestamp = timestamp  # 觸發的邊緣中斷時間 (ticks_ms)
+        self.duration = duration    # RELEASED / LONG_PRESS: 已按住的毫秒數
+        self.event_name = self.NAMES.get(event_type, '未知')
+
+    def __str__(self):
+        return f"按鈕 {self.button_id}: {self.event_name}"
 
 
 class Button:
     """
-    非同步按鈕類別，提供穩定的按鈕事件監聽
+    中斷驅動的非同步按鈕 (必須在事件迴圈中建立，會啟動監看協程)
     """
-    
-    def __init__(self, pin_num):
+
+    def __init__(self, pin_num, debounce_ms=config.BUTTON_DEBOUNCE_MS):
         """
         初始化按鈕
         pin_num: GPIO 腳位號碼
         """
         self.pin = Pin(pin_num, Pin.IN, Pin.PULL_UP)
         self.pin_num = pin_num
+        self.debounce_ms = debounce_ms
         self.is_pressed = False
-    
-    async def debounce_read(self, debounce_ms=config.BUTTON_DEBOUNCE_MS):
+        self.events = RingQueue(config.BUTTON_QUEUE_LEN, DROP_OLDEST)
+
+        self._flag = _Flag()
+        self._edge_ms = time.ticks_ms()  # 最近一次邊緣中斷的時間 (中斷中寫入)
+        self._press_ms = 0               # 目前這次按下的時間
+        self._click_ms = None            # 上一次短按放開的時間 (雙擊判定)
+        self._long_sent = False
+        self.stats = {"irqs": 0, "events": 0}
+
+        self.pin.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._irq)
+        self._task = uasyncio.create_task(self._watch())
+
+    def _irq(self, pin):
+        # 中斷處理：不配置記憶體，只記時間並喚醒監看協程
+        self._edge_ms = time.ticks_ms()
+        self.stats["irqs"] += 1
+        self._flag.set()
+
+    def _emit(self, event_type, timestamp, duration=0):
+        self.events.put(ButtonEvent(self.pin_num, event_type, timestamp, duration))
+        self.stats["events"] += 1
+
+    async def _watch(self):
+        """監看協程：把去彈跳後的狀態變化轉成事件"""
+        flag = self._flag
+        while True:
+            if self.is_pressed and not self._long_sent:
+                # 按住中：最多等到長按門檻
+                remain = config.BUTTON_LONG_PRESS_MS - time.ticks_diff(time.ticks_ms(), self._press_ms)
+                if remain > 0:
+                    try:
+                        await uasyncio.wait_for(flag.wait(), remain / 1000)
+                    except uasyncio.TimeoutError:
+                        pass
+                if self.pin.value() == 0 and \
+                        time.ticks_diff(time.ticks_ms(), self._press_ms) >= config.BUTTON_LONG_PRESS_MS:
+                    self._long_sent = True
+                    self._emit(ButtonEvent.LONG_PRESS, time.ticks_ms(), config.BUTTON_LONG_PRESS_MS)
+            else:
+                await flag.wait()
+            flag.clear()
+
+            while True:
+                pressed = self.pin.value() == 0
+                if pressed == self.is_pressed:
+                    break
+                self._changed(pressed, self._edge_ms)
+                await uasyncio.sleep_ms(self.debounce_ms)
+                flag.clear()
+
+    def _changed(self, pressed, t):
+        self.is_pressed = pressed
+        if pressed:
+            self._press_ms = t
+            self._long_sent = False
+            self._emit(ButtonEvent.PRESSED, t)
+            if self._click_ms is not None and time.ticks_diff(t, self._click_ms) <= config.BUTTON_DOUBLE_PRESS_MS:
+                self._click_ms = None
+                self._emit(ButtonEvent.DOUBLE_PRESS, t)
+        else:
+            held = time.ticks_diff(t, self._press_ms)
+            # 長按之後的放開不算一次點擊
+            self._click_ms = None if self._long_sent else t
+            self._emit(ButtonEvent.RELEASED, t, held)
+
+    def clear(self):
+        """丟棄尚未讀取的事件 (例如開始響鈴前，忽略先前的按鍵)"""
+        while self.events.get_nowait() is not None:
+            pass
+
+    async def get_event(self, timeout=None):
         """
-        非同步去彈跳讀取按鈕狀態
-        連續檢測 debounce_ms 毫秒內的穩定狀態
-        
-        返回: True 表示按鈕已穩定按下，False 表示已穩定釋放
+        等待下一個 ButtonEvent
+        timeout: 秒，逾時返回 None
         """
-        # 初始狀態
-        current_state = self.pin.value()
-        stable_count = 0
-        
-        # 需要連續檢測的次數
-        checks_needed = debounce_ms
-        
-        while stable_count < checks_needed:
-            new_state = self.pin.value()
-            
-            if new_state == current_state:
-                stable_count += 1
-            else:
-                # 狀態改變，重新開始計數
-                current_state = new_state
-                stable_count = 0
-            
-            # 每 1ms 檢查一次
-            await uasyncio.sleep_ms(1)
-        
-        # 返回最終穩定狀態（0 = 按下，1 = 釋放）
-        return current_state == 0
-    
-    async def wait_press(self):
+        return await self.events.get(timeout)
+
+    async def wait_press(self, timeout=None):
         """
         等待按鈕被按下（非同步）
-        返回: 按下時的時間戳
+        返回: PRESSED 事件，逾時返回 None
         """
+        deadline = None if timeout is None else time.ticks_add(time.ticks_ms(), int(timeout * 1000))
         while True:
-            # 輪詢按鈕狀態
-            if self.pin.value() == 0:  # 按下（低電位）
-                # 執行非同步去彈跳
-                is_pressed = await self.debounce_read()
-                if is_pressed:
-                    self.is_pressed = True
-                    return True
-            
-            await uasyncio.sleep_ms(config.BUTTON_POLL_INTERVAL_MS)
-    
+            remain = None
+            if deadline is not None:
+                remain = time.ticks_diff(deadline, time.ticks_ms())
+                if remain <= 0:
+                    return None
+                remain /= 1000
+            ev = await self.events.get(remain)
+            if ev is None:
+                return None
+            if ev.event_type == ButtonEvent.PRESSED:
+                return ev
+
     async def wait_release(self):
         """
         等待按鈕被釋放（非同步）
         """
-        while self.pin.value() == 0:  # 仍在按下
-            await uasyncio.sleep_ms(config.BUTTON_POLL_INTERVAL_MS)
-        
-        self.is_pressed = False
-
-
-class ButtonEvent:
-    """按鈕事件類別"""
-    
-    PRESSED = 1
-    RELEASED = 2
-    
-    def __init__(self, button_id, event_type, timestamp=None):
-        self.button_id = button_id
-        self.event_type = event_type  # PRESSED 或 RELEASED
-        self.timestamp = timestamp
-        self.event_name = '按下' if event_type == self.PRESSED else '釋放'
-    
-    def __str__(self):
-        return f"按鈕 {self.button_id}: {self.event_name}"
+        while self.is_pressed:
+            ev = await self.events.get()
+            if ev.event_type == ButtonEvent.RELEASED:
+                break
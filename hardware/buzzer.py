@@ -1,24 +1,26 @@
-
 """
 hardware/buzzer.py - 蜂鳴器音樂控制
+
+播放預先編譯的 Melody (utils/songs.py)：
+- 有 machine.Timer 時由一次性 (ONE_SHOT) 計時器的回調切換音符，節拍不受事件迴圈忙碌程度影響
+- 沒有 Timer (或 BUZZER_TIMER_ID 為 None) 時改用 uasyncio，依絕對時間點睡眠，延遲不會逐音符累積
 """
 from machine import Pin, PWM
 import uasyncio
+import time
+import config
+from utils.songs import Melody, library, compile_notes
+from utils.log import get_logger
+
+try:
+    from machine import Timer
+except ImportError:
+    Timer = None
 
-# 音階頻率表
-NOTE_FREQS = {
-    'C4': 262, 'D4': 294, 'E4': 330, 'F4': 349, 'G4': 392,
-    'A4': 440, 'B4': 494, 'C5': 523, 'Bb4':466, 'G3': 196,
-    'E5': 659, 'D#5': 622, 'D5': 587, 'Ab4': 415, 'REST': 0
-}
+log = get_logger("Buzzer")
+
+_Flag = getattr(uasyncio, "ThreadSafeFlag", None) or uasyncio.Event
 
-# 小星星樂譜
-NOTES_TWINKLE = [
-    ('C4', 500), ('C4', 500), ('G4', 500), ('G4', 500),
-    ('A4', 500), ('A4', 500), ('G4', 1000),
-    ('F4', 500), ('F4', 500), ('E4', 500), ('E4', 500),
-    ('D4', 500), ('D4', 500), ('C4', 1000),
-]
 
 class Buzzer:
     def __init__(self, pin_num):
@@ -27,50 +29,109 @@ class Buzzer:
         self.is_playing = False
         self._stop_flag = False
 
+        # 播放狀態 (計時器回調中讀寫)
+        self._seq = None
+        self._pos = 0
+        self._gap_next = False
+        self._done = _Flag()
+        self._timer = None
+        if Timer is not None and config.BUZZER_TIMER_ID is not None:
+            try:
+                self._timer = Timer(config.BUZZER_TIMER_ID)
+            except Exception as e:
+                log.warning("無法使用 Timer，改用 uasyncio 計時: %s", e)
+
     def stop(self):
-        """停止播放"""
+        """停止播放 (立即靜音)"""
         self._stop_flag = True
+        if self._timer is not None:
+            self._timer.deinit()
         self.pwm.duty(0)
         self.is_playing = False
+        self._done.set()
 
-    async def play_song(self, notes=NOTES_TWINKLE):
+    def _next(self):
         """
-        非同步播放歌曲
-        notes: list of (note_name, duration_ms)
+        送出下一段聲音或音符間的靜音
+        返回: 這一段持續的毫秒數，播完返回 0
+        """
+        if self._gap_next:
+            self._gap_next = False
+            self.pwm.duty(0)
+            return config.NOTE_GAP_MS
+        seq = self._seq
+        i = self._pos
+        if i >= len(seq):
+            return 0
+        freq = seq[i]
+        dur = seq[i + 1]
+        self._pos = i + 2
+        if freq:
+            self.pwm.freq(freq)
+            self.pwm.duty(config.BUZZER_DUTY)
+        else:
+            self.pwm.duty(0)
+        # 音符尾端留一段靜音，總長度不變
+        if dur > 2 * config.NOTE_GAP_MS:
+            self._gap_next = True
+            return dur - config.NOTE_GAP_MS
+        return dur
+
+    def _on_timer(self, t):
+        # 計時器回調：切換到下一段並重新設定計時器
+        ms = 0 if self._stop_flag else self._next()
+        if ms:
+            self._timer.init(mode=Timer.ONE_SHOT, period=ms, callback=self._on_timer)
+        else:
+            self.pwm.duty(0)
+            self._done.set()
+
+    async def play_song(self, song=None):
+        """
+        非同步播放歌曲 (播完或 stop() 後返回)
+        song: Melody、鈴聲編號 / 名稱 (見 config.SONGS)、[(音名, ms), ...]，None 為預設鈴聲
         """
         if self.is_playing:
             return
 
+        if isinstance(song, Melody):
+            melody = song
+        elif isinstance(song, list):
+            melody = compile_notes("custom", song)
+        else:
+            melody = library.get(library.index_of(song or 0))
+
         self.is_playing = True
         self._stop_flag = False
-        print("[Buzzer] 開始播放音樂")
+        self._seq = melody.seq
+        self._pos = 0
+        self._gap_next = False
+        log.info("開始播放 %s", melody.name)
 
         try:
-            for note, duration in notes:
-                if self._stop_flag:
-                    break
-                
-                freq = NOTE_FREQS.get(note, 0)
-                if freq == 0:
-                    self.pwm.duty(0)
-                else:
-                    self.pwm.freq(freq)
-                    self.pwm.duty(512) # 50% duty cycle
-                
-                # 每個音符之間稍微停頓，讓非同步任務切換
-                await uasyncio.sleep_ms(duration)
-                
-                # 短暫靜音讓音符分開
-                self.pwm.duty(0)
-                await uasyncio.sleep_ms(20)
-
+            if self._timer is not None:
+                self._done.clear()
+                self._on_timer(None)  # 第一個音符立即送出
+                await self._done.wait()
+            else:
+                await self._play_async()
         except Exception as e:
-            print(f"[Buzzer] 播放錯誤: {e}")
+            log.error("播放錯誤: %s", e)
         finally:
+            if self._timer is not None:
+                self._timer.deinit()
             self.pwm.duty(0)
             self.is_playing = False
-            print("[Buzzer] 播放結束")
-
-
-
+            log.info("播放結束")
 
+    async def _play_async(self):
+        """沒有 Timer 時的播放：每一段都對齊起始時間算出的絕對時間點"""
+        t = time.ticks_ms()
+        while not self._stop_flag:
+            ms = self._next()
+            if not ms:
+                break
+            t = time.ticks_add(t, ms)
+            delay = time.ticks_diff(t, time.ticks_ms())
+            if delay > 0:
+                await uasyncio.sleep_ms(delay)
@@ -1,27 +1,126 @@
 """
 hardware/display.py - OLED 顯示模組
 提供基礎繪圖介面，並暴露原始 framebuf 以供複雜 UI 使用
+
+show() 採「保留模式」：保存上一次送出的畫面 (shadow)，
+以 SSD1306 的 page (8 列像素一組) 為單位比對，只傳送有變動的欄位範圍；
+畫面完全沒變時不做任何 I2C 傳輸
 """
 
 from machine import Pin, I2C
 from ssd1306 import SSD1306_I2C
+import time
 import config
+from utils.log import get_logger
+
+log = get_logger("OLED")
+
+# SSD1306 指令
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+
+# 每次設定視窗需 4 個指令 + 2 個參數，每個指令 byte 前帶 1 個控制 byte
+_WINDOW_CMD_BYTES = 6 * 2
+
 
 class OledDisplay:
     def __init__(self):
         self._i2c = I2C(config.I2C_ID, scl=Pin(config.I2C_SCL_PIN), sda=Pin(config.I2C_SDA_PIN))
         self._oled = SSD1306_I2C(config.OLED_WIDTH, config.OLED_HEIGHT, self._i2c)
-        print("[OLED] 初始化完成")
+        self.width = config.OLED_WIDTH
+        self.pages = config.OLED_HEIGHT // 8
+        self._buf = self._oled.buffer
+        self._shadow = bytearray(len(self._buf))
+        self._force_full = True  # 第一次 show() 必須整頁送出
+        self._frame_start = time.ticks_us()
+
+        # 統計 (last_* 為最近一幀，其餘為累計)
+        self.stats = {
+            "frames": 0,
+            "frames_skipped": 0,
+            "pages_sent": 0,
+            "bytes_sent": 0,
+            "bytes_saved": 0,
+            "last_bytes": 0,
+            "last_render_us": 0,
+            "last_flush_us": 0,
+        }
+        log.info("初始化完成")
 
     def clear(self):
+        """清空畫面，同時作為一幀的起點 (計算繪圖時間)"""
+        self._frame_start = time.ticks_us()
         self._oled.fill(0)
 
-    def show(self):
-        self._oled.show()
-
     def text(self, msg, x, y):
         self._oled.text(str(msg), x, y)
 
+    def invalidate(self):
+        """下一次 show() 強制整頁更新 (例如螢幕重新上電後)"""
+        self._force_full = True
+
+    def show(self):
+        """只傳送與上一幀不同的 page / 欄位範圍"""
+        t0 = time.ticks_us()
+        stats = self.stats
+        stats["last_render_us"] = time.ticks_diff(t0, self._frame_start)
+        stats["frames"] += 1
+
+        if self._force_full:
+            self._force_full = False
+            self._oled.show()
+            self._shadow[:] = self._buf
+            sent = _WINDOW_CMD_BYTES + 1 + len(self._buf)
+            stats["pages_sent"] += self.pages
+        elif self._buf == self._shadow:
+            sent = 0
+            stats["frames_skipped"] += 1
+        else:
+            sent = self._flush_dirty_pages()
+
+        full = _WINDOW_CMD_BYTES + 1 + len(self._buf)
+        stats["last_bytes"] = sent
+        stats["bytes_sent"] += sent
+        stats["bytes_saved"] += full - sent
+        stats["last_flush_us"] = time.ticks_diff(time.ticks_us(), t0)
+
+    def _flush_dirty_pages(self):
+        buf = self._buf
+        shadow = self._shadow
+        w = self.width
+        sent = 0
+        for page in range(self.pages):
+            start = page * w
+            end = start + w
+            if buf[start:end] == shadow[start:end]:
+                continue
+
+            # 找出該 page 中變動的欄位範圍
+            x0 = 0
+            while buf[start + x0] == shadow[start + x0]:
+                x0 += 1
+            x1 = w - 1
+            while buf[start + x1] == shadow[start + x1]:
+                x1 -= 1
+
+            sent += self._write_window(page, x0, x1)
+            shadow[start + x0:start + x1 + 1] = buf[start + x0:start + x1 + 1]
+            self.stats["pages_sent"] += 1
+        return sent
+
+    def _write_window(self, page, x0, x1):
+        oled = self._oled
+        col_offset = 32 if self.width == 64 else 0  # 64 寬的面板欄位從 32 開始 (同 ssd1306 驅動)
+        oled.write_cmd(SET_COL_ADDR)
+        oled.write_cmd(x0 + col_offset)
+        oled.write_cmd(x1 + col_offset)
+        oled.write_cmd(SET_PAGE_ADDR)
+        oled.write_cmd(page)
+        oled.write_cmd(page)
+        start = page * self.width
+        oled.write_data(memoryview(self._buf)[start + x0:start + x1 + 1])
+        return _WINDOW_CMD_BYTES + 1 + (x1 - x0 + 1)
+
     def get_raw_oled(self):
-        """取得原始 SSD1306 物件以進行進階繪圖"""
-        return self._oled
\ No newline at end of file
+        """取得原始 SSD1306 物件以進行進階繪圖 (直接呼叫其 show() 後請執行 invalidate())"""
+        return self._oled
@@ -7,6 +7,9 @@ hardware/sensors.py - 感測器模組 (Refactored for Alarm System)
 from machine import Pin
 import dht
 import config
+from utils.log import get_logger
+
+log = get_logger("DHT11")
 
 class Dht11Sensor:
     """DHT11 溫濕度感測器控制類別"""
@@ -29,7 +32,7 @@ class Dht11Sensor:
             self.humidity = self.sensor.humidity()
             return (self.temperature, self.humidity)
         except Exception as e:
-            print(f"[DHT11] 量測錯誤: {e}")
+            log.error("量測錯誤: %s", e)
             # 發生錯誤時保持舊值或回傳 None，視需求而定
             # 這裡回傳 None 讓呼叫端知道失敗
             return None
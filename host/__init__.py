@@ -0,0 +1,100 @@
+"""
+host/ - 在電腦 (CPython) 上執行裝置端程式的替身模組 (不需上傳到 ESP32)
+
+install() 把下列模組註冊到 sys.modules，main.py、tasks.py、hardware/、communication/ 不必修改即可 import：
+  machine   Pin (可用 drive() 模擬外部電位與中斷) / PWM / I2C / Timer
+  uasyncio  對應到 asyncio，另外補上 sleep_ms、ThreadSafeFlag
+  ujson     直接使用 json
+  framebuf  MONO_VLSB 的 FrameBuffer (含 8x8 字型)
+  ssd1306   SSD1306_I2C 驅動 + 模擬面板，可把螢幕內容存成 PNG / PBM
+  dht       DHT11 / DHT22，讀值由模組變數決定
+  network   WLAN (立即連線成功)
+  mqtt_as   同一行程內的 MQTTClient 與 broker (不連網路)
+並在 time 補上 ticks_ms / ticks_us / ticks_diff / ticks_add / sleep_ms (與 MicroPython 一樣會溢位回繞)，
+在 gc 補上 mem_alloc / mem_free (tracemalloc 追蹤中才有數值)
+
+用法:
+  import host; host.install()     # 工具腳本 (tools/) 在 import 裝置端模組之前呼叫
+  python -m host --help           # 在電腦上啟動 main()
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# 模擬的 heap 大小 (ESP32 未接 PSRAM 時 MicroPython 約有 110 KB 可用)
+HEAP_BYTES = 110 * 1024
+
+# MicroPython 的 ticks 以 2**30 回繞
+TICKS_PERIOD = 1 << 30
+_TICKS_MASK = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MODULES = ("machine", "uasyncio", "framebuf", "ssd1306", "dht", "network", "mqtt_as")
+
+_t0 = time.perf_counter_ns()
+
+
+def ticks_ms():
+    return ((time.perf_counter_ns() - _t0) // 1000000) & _TICKS_MASK
+
+
+def ticks_us():
+    return ((time.perf_counter_ns() - _t0) // 1000) & _TICKS_MASK
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MASK
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MASK) - _TICKS_HALF
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    time.sleep(us / 1000000)
+
+
+def mem_alloc():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def mem_free():
+    return max(HEAP_BYTES - mem_alloc(), 0)
+
+
+def _patch(module, **attrs):
+    for name, value in attrs.items():
+        if not hasattr(module, name):
+            setattr(module, name, value)
+
+
+def install(http_port=None):
+    """
+    註冊替身模組 (可重複呼叫)；已存在的同名模組不會被覆蓋
+    http_port: 裝置端監聽 80 埠的伺服器在電腦上改聽這個埠 (None 表示不變)
+    """
+    import importlib
+    import json
+
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    _patch(time, ticks_ms=ticks_ms, ticks_us=ticks_us, ticks_cpu=ticks_us,
+           ticks_add=ticks_add, ticks_diff=ticks_diff, sleep_ms=sleep_ms, sleep_us=sleep_us)
+    _patch(gc, mem_alloc=mem_alloc, mem_free=mem_free)
+    sys.modules.setdefault("ujson", json)
+    for name in _MODULES:
+        if name not in sys.modules:
+            sys.modules[name] = importlib.import_module("host." + name)
+
+    if http_port is not None:
+        from host import uasyncio
+        uasyncio.PORTS[80] = http_port
@@ -0,0 +1,67 @@
+"""
+python -m host - 在電腦上執行 main.main() (程式碼不修改，硬體與網路由 host/ 的替身模組代替)
+
+用法: python -m host [--http-port 8080] [--seconds N] [--profile main.prof] [--oled oled.png]
+  --http-port  Web 伺服器在電腦上的連接埠 (裝置上為 80)
+  --seconds    執行 N 秒後結束 (預設一直執行到 Ctrl-C)
+  --profile    以 cProfile 記錄整段執行，存檔並列出自身耗時最多的函式
+  --oled       結束時把 OLED 畫面存成 PNG / PBM (--oled-scale 放大倍數)
+  --cwd        裝置檔案系統的根目錄 (alarms.json、www/、songs/ 的位置，預設為專案根目錄)
+"""
+
+import argparse
+import asyncio
+import os
+
+import host
+
+
+def parse_args():
+    p = argparse.ArgumentParser(prog="python -m host", description="Run main() under CPython")
+    p.add_argument("--http-port", type=int, default=8080)
+    p.add_argument("--seconds", type=float, default=None)
+    p.add_argument("--profile", default=None)
+    p.add_argument("--oled", default=None)
+    p.add_argument("--oled-scale", type=int, default=4)
+    p.add_argument("--cwd", default=host.ROOT)
+    return p.parse_args()
+
+
+async def run(seconds):
+    import main
+    try:
+        await asyncio.wait_for(main.main(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+def main():
+    args = parse_args()
+    host.install(http_port=args.http_port)
+    os.chdir(args.cwd)
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        asyncio.run(run(args.seconds))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler).sort_stats("tottime").print_stats(20)
+        if args.oled:
+            from host import ssd1306
+            for i, panel in enumerate(ssd1306.panels):
+                path = args.oled if i == 0 else f"{i}.".join(args.oled.rsplit(".", 1))
+                panel.dump(path, args.oled_scale)
+                print(f"OLED -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+host/dht.py - dht 替身
+
+讀值取自模組變數，測試時可直接修改：
+  import dht; dht.temperature = 31; dht.error = OSError(116)   # measure() 拋出 error (ETIMEDOUT)
+"""
+
+temperature = 25.0
+humidity = 60.0
+error = None
+
+
+class DHTBase:
+    def __init__(self, pin):
+        self.pin = pin
+        self._t = 0
+        self._h = 0
+
+    def measure(self):
+        if error is not None:
+            raise error
+        self._t = temperature
+        self._h = humidity
+
+
+class DHT11(DHTBase):
+    # DHT11 只有整數解析度
+    def temperature(self):
+        return int(self._t)
+
+    def humidity(self):
+        return int(self._h)
+
+
+class DHT22(DHTBase):
+    def temperature(self):
+        return round(self._t, 1)
+
+    def humidity(self):
+        return round(self._h, 1)
@@ -0,0 +1,221 @@
+"""
+host/machine.py - machine 模組替身 (Pin / PWM / I2C / Timer)
+
+- 同一個腳位號碼的 Pin 是同一個物件：Pin(17).drive(0) 即可模擬按下接在 GPIO17 的按鈕，
+  電位改變時依 irq() 設定的 trigger 呼叫中斷處理函式
+- PWM.trace 設為 list 時，每次 freq / duty 改變都記錄 (ticks_ms, 腳位, freq, duty)
+- I2C 依位址轉交給掛在匯流排上的裝置 (ssd1306 的模擬面板)，並統計傳輸的 bytes
+- Timer 的回調排在執行中的事件迴圈上 (沒有事件迴圈時用 threading.Timer)，同 ESP32 的軟體中斷
+"""
+
+import asyncio
+import threading
+from host import ticks_ms
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_DOWN = 1
+    PULL_UP = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    _pins = {}
+
+    def __new__(cls, id, *args, **kwargs):
+        pin = cls._pins.get(id)
+        if pin is None:
+            pin = object.__new__(cls)
+            pin.id = id
+            pin._mode = cls.IN
+            pin._pull = None
+            pin._out = 0
+            pin._driven = None  # 外部電路施加的電位 (None 表示浮接)
+            pin._handler = None
+            pin._trigger = 0
+            cls._pins[id] = pin
+        return pin
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self._mode = mode
+        if pull != -1:
+            self._pull = pull
+        if value is not None:
+            self._out = 1 if value else 0
+
+    def __repr__(self):
+        return f"Pin({self.id})"
+
+    def value(self, v=None):
+        if v is None:
+            if self._mode == self.OUT:
+                return self._out
+            if self._driven is not None:
+                return self._driven
+            return 1 if self._pull == self.PULL_UP else 0
+        self._out = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self._out = 1
+
+    def off(self):
+        self._out = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self._handler = handler
+        self._trigger = trigger
+
+    # ---------- 電腦端：模擬外部電路 ----------
+
+    def drive(self, v):
+        """外部把腳位拉到 v (0 / 1)；產生符合 trigger 的邊緣時呼叫中斷處理函式"""
+        old = self.value()
+        self._driven = 1 if v else 0
+        self._edge(old)
+
+    def release(self):
+        """外部放開腳位，回到上拉 / 下拉的電位"""
+        old = self.value()
+        self._driven = None
+        self._edge(old)
+
+    def _edge(self, old):
+        new = self.value()
+        if new == old or self._handler is None:
+            return
+        if self._trigger & (self.IRQ_RISING if new else self.IRQ_FALLING):
+            self._handler(self)
+
+
+class PWM:
+    # 設為 list 時記錄每次輸出變化 (ticks_ms, 腳位, freq, duty)
+    trace = None
+
+    def __init__(self, pin, freq=5000, duty=0):
+        self.pin = pin
+        self._freq = freq
+        self._duty = duty
+
+    def _changed(self):
+        if PWM.trace is not None:
+            PWM.trace.append((ticks_ms(), self.pin.id, self._freq, self._duty))
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+        self._changed()
+
+    def duty(self, value=None):
+        """ESP32 的 duty 為 0..1023"""
+        if value is None:
+            return self._duty
+        self._duty = value
+        self._changed()
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty * 65535 // 1023
+        self.duty(value * 1023 // 65535)
+
+    def deinit(self):
+        self._duty = 0
+        self._changed()
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.scl = scl
+        self.sda = sda
+        self.freq = freq
+        self.devices = {}  # 位址 -> 有 i2c_write(buf) 方法的模擬裝置
+        self.stats = {"transactions": 0, "bytes_written": 0}
+
+    def attach(self, addr, device):
+        """電腦端：把模擬裝置掛到匯流排上"""
+        self.devices[addr] = device
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        device = self.devices.get(addr)
+        if device is None:
+            raise OSError(19)  # ENODEV，同 MicroPython 沒有 ACK 時
+        buf = bytes(buf)
+        self.stats["transactions"] += 1
+        self.stats["bytes_written"] += len(buf)
+        device.i2c_write(buf)
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        return self.writeto(addr, b"".join(bytes(b) for b in vector), stop)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, callback=None, freq=None):
+        self.id = id
+        self._handle = None
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback, freq=freq)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=None):
+        self.deinit()
+        if freq:
+            period = 1000 / freq
+        self._mode = mode
+        self._period = max(period, 0) / 1000
+        self._callback = callback
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._next = self._loop.time()
+        except RuntimeError:
+            self._loop = None
+        self._schedule()
+
+    def _schedule(self):
+        if self._loop is not None:
+            # 週期模式以絕對時間排程，不累積回調本身的延遲
+            self._next += self._period
+            self._handle = self._loop.call_at(self._next, self._fire)
+        else:
+            self._handle = threading.Timer(self._period, self._fire)
+            self._handle.daemon = True
+            self._handle.start()
+
+    def _fire(self):
+        if self._mode == self.PERIODIC:
+            self._schedule()
+        else:
+            self._handle = None
+        if self._callback is not None:
+            self._callback(self)
+
+    def deinit(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def unique_id():
+    return b"\x24\x0a\xc4\x00\x00\x01"
@@ -0,0 +1,165 @@
+"""
+host/mqtt_as.py - mqtt_as 替身：同一行程內的 MQTTClient 與 broker，不連網路
+
+- 所有 MQTTClient 都連到模組內的 broker (config["server"] 只記錄不使用)
+- broker 依 MQTT 的 + / # 規則轉送訊息 (發布者自己有訂閱時也會收到)，並保存 retain 訊息
+- 模擬外部用戶端: broker.publish(topic, msg)；模擬斷線: broker.set_online(False)
+  (斷線期間 publish / subscribe 會等待，與 mqtt_as 相同)
+- 與 mqtt_as 相同，subs_cb 以同步方式呼叫，返回值 (包括協程) 一律丟棄
+"""
+
+import asyncio
+from host import network
+
+config = {
+    "client_id": "esp32-host",
+    "server": None,
+    "port": 0,
+    "user": "",
+    "password": "",
+    "keepalive": 60,
+    "ping_interval": 0,
+    "ssl": False,
+    "ssl_params": {},
+    "response_time": 10,
+    "clean_init": True,
+    "clean": True,
+    "max_repubs": 4,
+    "will": None,
+    "subs_cb": lambda *_: None,
+    "wifi_coro": None,
+    "connect_coro": None,
+    "ssid": None,
+    "wifi_pw": None,
+    "queue_len": 0,
+}
+
+
+def _as_bytes(s):
+    return s.encode() if isinstance(s, str) else bytes(s)
+
+
+def topic_matches(filt, topic):
+    """MQTT topic filter 比對 (bytes)"""
+    f = filt.split(b"/")
+    t = topic.split(b"/")
+    for i, seg in enumerate(f):
+        if seg == b"#":
+            return True
+        if i >= len(t) or (seg != b"+" and seg != t[i]):
+            return False
+    return len(f) == len(t)
+
+
+class Broker:
+    def __init__(self):
+        self.clients = []
+        self.retained = {}     # topic -> msg
+        self.online = True
+        self.stats = {"published": 0, "delivered": 0}
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        """轉送給所有符合的訂閱 (每個用戶端最多一次)"""
+        topic = _as_bytes(topic)
+        msg = _as_bytes(msg)
+        self.stats["published"] += 1
+        if retain:
+            if msg:
+                self.retained[topic] = msg
+            else:
+                self.retained.pop(topic, None)
+        for client in self.clients:
+            if client.isconnected() and any(topic_matches(f, topic) for f in client.subscriptions):
+                self.stats["delivered"] += 1
+                client._deliver(topic, msg, False)
+
+    def set_online(self, online):
+        """模擬網路中斷 / 恢復：通知所有已連線的用戶端"""
+        if online == self.online:
+            return
+        self.online = online
+        for client in self.clients:
+            if client._started:
+                client._set_connected(online)
+
+
+broker = Broker()
+
+
+class MQTTClient:
+    def __init__(self, config):
+        self._c = config
+        self._cb = config["subs_cb"]
+        self._wifi_handler = config.get("wifi_coro")
+        self._connect_handler = config.get("connect_coro")
+        self.subscriptions = {}  # filter -> qos
+        self._connected = False
+        self._started = False
+        self._tasks = set()
+
+    def dprint(self, msg, *args):
+        pass
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _set_connected(self, connected):
+        self._connected = connected
+        if self._wifi_handler is not None:
+            self._spawn(self._wifi_handler(connected))
+        if connected and self._connect_handler is not None:
+            self._spawn(self._connect_handler(self))
+
+    async def wifi_connect(self, quick=False):
+        network.WLAN(network.STA_IF).connect(self._c.get("ssid"), self._c.get("wifi_pw"))
+
+    async def connect(self, quick=False):
+        if not broker.online:
+            raise OSError(-1, "broker unreachable")
+        await self.wifi_connect(quick)
+        if self not in broker.clients:
+            broker.clients.append(self)
+        self._started = True
+        self._set_connected(True)
+
+    async def disconnect(self):
+        self._started = False
+        self._connected = False
+        if self in broker.clients:
+            broker.clients.remove(self)
+
+    def close(self):
+        self._started = False
+        self._connected = False
+
+    def isconnected(self):
+        return self._connected
+
+    async def broker_up(self):
+        return broker.online
+
+    async def _wait_connected(self):
+        # 同 mqtt_as：斷線時 publish / subscribe 等到重新連線才送出
+        while not self._connected:
+            await asyncio.sleep(0.1)
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        await self._wait_connected()
+        await asyncio.sleep(0)  # 送出時會讓出事件迴圈
+        broker.publish(topic, msg, retain, qos)
+
+    async def subscribe(self, topic, qos=0):
+        await self._wait_connected()
+        topic = _as_bytes(topic)
+        self.subscriptions[topic] = qos
+        for t, msg in list(broker.retained.items()):
+            if topic_matches(topic, t):
+                self._deliver(t, msg, True)
+
+    async def unsubscribe(self, topic):
+        self.subscriptions.pop(_as_bytes(topic), None)
+
+    def _deliver(self, topic, msg, retained):
+        self._cb(topic, msg, retained)
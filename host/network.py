@@ -0,0 +1,58 @@
+"""
+host/network.py - network 替身：WLAN.connect() 立即成功，ifconfig() 返回本機位址
+"""
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+
+_ifaces = {}
+
+
+class WLAN:
+    def __new__(cls, interface_id=STA_IF):
+        wlan = _ifaces.get(interface_id)
+        if wlan is None:
+            wlan = object.__new__(cls)
+            wlan.interface_id = interface_id
+            wlan._active = False
+            wlan._ssid = None
+            _ifaces[interface_id] = wlan
+        return wlan
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._ssid = None
+
+    def connect(self, ssid=None, key=None, bssid=None):
+        self._active = True
+        self._ssid = ssid
+
+    def disconnect(self):
+        self._ssid = None
+
+    def isconnected(self):
+        return self._ssid is not None
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -50
+        return STAT_GOT_IP if self.isconnected() else STAT_IDLE
+
+    def scan(self):
+        return []
+
+    def ifconfig(self, config=None):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
+
+    def config(self, *args, **kwargs):
+        if not args:
+            return None
+        return {"mac": b"\x24\x0a\xc4\x00\x00\x01", "essid": self._ssid or "",
+                "hostname": "esp32-alarm"}.get(args[0])
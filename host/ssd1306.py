@@ -0,0 +1,249 @@
+"""
+host/ssd1306.py - ssd1306 替身：SSD1306_I2C 驅動 + 模擬面板
+
+SSD1306_I2C 與 MicroPython 的 ssd1306.py 相同，經由 machine.I2C 送出指令與資料；
+匯流排另一端的 Panel 解析指令 (欄 / page 視窗、反白、開關) 並把資料寫入自己的 GDDRAM，
+因此 dump() 存下的是「實際傳到螢幕上的畫面」，只送出部分 page 的 OledDisplay.show() 也能驗證
+
+  oled.dump("oled.png", scale=4)   # 或 .pbm
+"""
+
+import struct
+import zlib
+from host.framebuf import FrameBuffer, MONO_VLSB
+
+SET_CONTRAST = 0x81
+SET_ENTIRE_ON = 0xA4
+SET_NORM_INV = 0xA6
+SET_DISP = 0xAE
+SET_MEM_ADDR = 0x20
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+SET_DISP_START_LINE = 0x40
+SET_SEG_REMAP = 0xA0
+SET_MUX_RATIO = 0xA8
+SET_IFACE = 0xAD
+SET_COM_OUT_DIR = 0xC0
+SET_DISP_OFFSET = 0xD3
+SET_COM_PIN_CFG = 0xDA
+SET_DISP_CLK_DIV = 0xD5
+SET_PRECHARGE = 0xD9
+SET_VCOM_DESEL = 0xDB
+SET_CHARGE_PUMP = 0x8D
+
+# 所有建立過的面板 (python -m host --oled 結束時輸出)
+panels = []
+
+
+class SSD1306(FrameBuffer):
+    def __init__(self, width, height, external_vcc):
+        self.width = width
+        self.height = height
+        self.external_vcc = external_vcc
+        self.pages = self.height // 8
+        self.buffer = bytearray(self.pages * self.width)
+        super().__init__(self.buffer, self.width, self.height, MONO_VLSB)
+        self.init_display()
+
+    def init_display(self):
+        for cmd in (
+            SET_DISP,
+            SET_MEM_ADDR, 0x00,
+            SET_DISP_START_LINE,
+            SET_SEG_REMAP | 0x01,
+            SET_MUX_RATIO, self.height - 1,
+            SET_COM_OUT_DIR | 0x08,
+            SET_DISP_OFFSET, 0x00,
+            SET_COM_PIN_CFG, 0x02 if self.width > 2 * self.height else 0x12,
+            SET_DISP_CLK_DIV, 0x80,
+            SET_PRECHARGE, 0x22 if self.external_vcc else 0xF1,
+            SET_VCOM_DESEL, 0x30,
+            SET_CONTRAST, 0xFF,
+            SET_ENTIRE_ON,
+            SET_NORM_INV,
+            SET_IFACE, 0x00,
+            SET_CHARGE_PUMP, 0x10 if self.external_vcc else 0x14,
+            SET_DISP | 0x01,
+        ):
+            self.write_cmd(cmd)
+        self.fill(0)
+        self.show()
+
+    def poweroff(self):
+        self.write_cmd(SET_DISP)
+
+    def poweron(self):
+        self.write_cmd(SET_DISP | 0x01)
+
+    def contrast(self, contrast):
+        self.write_cmd(SET_CONTRAST)
+        self.write_cmd(contrast)
+
+    def invert(self, invert):
+        self.write_cmd(SET_NORM_INV | (invert & 1))
+
+    def rotate(self, rotate):
+        self.write_cmd(SET_COM_OUT_DIR | ((rotate & 1) << 3))
+        self.write_cmd(SET_SEG_REMAP | (rotate & 1))
+
+    def show(self):
+        x0 = 0
+        x1 = self.width - 1
+        if self.width == 64:
+            # 寬 64 的面板從第 32 欄開始顯示
+            x0 += 32
+            x1 += 32
+        self.write_cmd(SET_COL_ADDR)
+        self.write_cmd(x0)
+        self.write_cmd(x1)
+        self.write_cmd(SET_PAGE_ADDR)
+        self.write_cmd(0)
+        self.write_cmd(self.pages - 1)
+        self.write_data(self.buffer)
+
+
+class SSD1306_I2C(SSD1306):
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+        self.i2c = i2c
+        self.addr = addr
+        self.temp = bytearray(2)
+        self.write_list = [b"\x40", None]  # Co=0, D/C#=1
+        self.panel = Panel(width, height)
+        i2c.attach(addr, self.panel)
+        super().__init__(width, height, external_vcc)
+
+    def write_cmd(self, cmd):
+        self.temp[0] = 0x80  # Co=1, D/C#=0
+        self.temp[1] = cmd
+        self.i2c.writeto(self.addr, self.temp)
+
+    def write_data(self, buf):
+        self.write_list[1] = buf
+        self.i2c.writevto(self.addr, self.write_list)
+
+    # ---------- 電腦端 ----------
+
+    def dump(self, path, scale=1):
+        """把螢幕目前顯示的內容存成 PNG 或 PBM (依副檔名)"""
+        self.panel.dump(path, scale)
+
+
+# 帶參數的指令 -> 參數個數
+_ARGS = {SET_MEM_ADDR: 1, SET_COL_ADDR: 2, SET_PAGE_ADDR: 2, SET_CONTRAST: 1, SET_MUX_RATIO: 1,
+         SET_IFACE: 1, SET_DISP_OFFSET: 1, SET_COM_PIN_CFG: 1, SET_DISP_CLK_DIV: 1,
+         SET_PRECHARGE: 1, SET_VCOM_DESEL: 1, SET_CHARGE_PUMP: 1}
+
+
+class Panel:
+    """SSD1306 控制器：128 欄 x 8 page 的 GDDRAM，水平定址模式"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.col_offset = 32 if width == 64 else 0
+        self.gddram = bytearray(128 * 8)
+        self.on = False
+        self.inverted = False
+        self.col_start, self.col_end = 0, 127
+        self.page_start, self.page_end = 0, 7
+        self.col = 0
+        self.page = 0
+        self._cmd = []
+        self.stats = {"commands": 0, "data_bytes": 0}
+        panels.append(self)
+
+    def i2c_write(self, buf):
+        # 每段以控制 byte 開頭：Co=1 表示只帶一個 byte，之後再接控制 byte
+        i = 0
+        while i < len(buf):
+            ctrl = buf[i]
+            i += 1
+            data = ctrl & 0x40
+            if ctrl & 0x80:
+                if i < len(buf):
+                    self._byte(data, buf[i])
+                    i += 1
+            else:
+                for b in buf[i:]:
+                    self._byte(data, b)
+                break
+
+    def _byte(self, data, b):
+        if data:
+            self.stats["data_bytes"] += 1
+            self.gddram[self.page * 128 + self.col] = b
+            if self.col < self.col_end:
+                self.col += 1
+            else:
+                self.col = self.col_start
+                self.page = self.page + 1 if self.page < self.page_end else self.page_start
+            return
+        cmd = self._cmd
+        cmd.append(b)
+        if len(cmd) <= _ARGS.get(cmd[0], 0):
+            return  # 等待參數
+        self._cmd = []
+        self.stats["commands"] += 1
+        op = cmd[0]
+        if op == SET_COL_ADDR:
+            self.col_start, self.col_end = cmd[1] & 0x7F, cmd[2] & 0x7F
+            self.col = self.col_start
+        elif op == SET_PAGE_ADDR:
+            self.page_start, self.page_end = cmd[1] & 7, cmd[2] & 7
+            self.page = self.page_start
+        elif op & 0xFE == SET_DISP:
+            self.on = bool(op & 1)
+        elif op & 0xFE == SET_NORM_INV:
+            self.inverted = bool(op & 1)
+
+    def pixel(self, x, y):
+        """顯示中的像素 (1 = 亮)"""
+        if not self.on:
+            return 0
+        lit = self.gddram[(y >> 3) * 128 + x + self.col_offset] >> (y & 7) & 1
+        return lit ^ self.inverted
+
+    def rows(self, scale=1):
+        """逐列返回像素 (list，1 = 亮)，每個像素放大為 scale x scale"""
+        for y in range(self.height):
+            row = [self.pixel(x, y) for x in range(self.width) for _ in range(scale)]
+            for _ in range(scale):
+                yield row
+
+    def dump(self, path, scale=1):
+        w = self.width * scale
+        h = self.height * scale
+        if path.lower().endswith(".pbm"):
+            # P4：1 = 黑，亮的像素存成 0 (白)
+            out = bytearray(b"P4\n%d %d\n" % (w, h))
+            for row in self.rows(scale):
+                out += _pack(1 - p for p in row)
+        else:
+            # 1-bit 灰階 PNG：1 = 白
+            raw = bytearray()
+            for row in self.rows(scale):
+                raw.append(0)  # filter: None
+                raw += _pack(row)
+            out = b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 1, 0, 0, 0, 0)) + \
+                _chunk(b"IDAT", zlib.compress(bytes(raw))) + _chunk(b"IEND", b"")
+        with open(path, "wb") as f:
+            f.write(out)
+
+
+def _pack(bits):
+    """像素 (0/1) -> 每 byte 8 個像素，高位元在左"""
+    out = bytearray()
+    byte = n = 0
+    for b in bits:
+        byte = byte << 1 | b
+        n += 1
+        if n == 8:
+            out.append(byte)
+            byte = n = 0
+    if n:
+        out.append(byte << (8 - n))
+    return out
+
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
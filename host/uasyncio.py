@@ -0,0 +1,67 @@
+"""
+host/uasyncio.py - uasyncio 替身：asyncio 加上 MicroPython 特有的 API
+
+- sleep_ms / wait_for_ms
+- ThreadSafeFlag：可從 machine.Timer 回調、Pin 中斷 (或其他執行緒) set()，wait() 返回時自動清除
+- start_server：依 PORTS 重新對應連接埠 (例如 80 -> 8080，不需要 root 權限)
+"""
+
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+
+# 裝置端連接埠 -> 電腦上實際監聽的連接埠
+PORTS = {}
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(aw, timeout):
+    return _asyncio.wait_for(aw, timeout / 1000)
+
+
+async def start_server(callback, host, port, backlog=5):
+    return await _asyncio.start_server(callback, host, PORTS.get(port, port), backlog=backlog)
+
+
+class ThreadSafeFlag:
+    """單一等待者的旗標 (同 MicroPython 1.15+ 的 uasyncio.ThreadSafeFlag)"""
+
+    def __init__(self):
+        self._flag = False
+        self._waiter = None
+        self._loop = None
+
+    def set(self):
+        try:
+            loop = _asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None and self._loop is not None:
+            # 事件迴圈以外的執行緒 (threading.Timer 等)
+            self._loop.call_soon_threadsafe(self._set)
+        else:
+            self._set()
+
+    def _set(self):
+        self._flag = True
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def clear(self):
+        self._flag = False
+
+    def is_set(self):
+        return self._flag
+
+    async def wait(self):
+        if not self._flag:
+            self._loop = _asyncio.get_running_loop()
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        self._flag = False
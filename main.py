@@ -10,6 +10,8 @@ from communication.wifi import connect_wifi, sync_time
 from communication.mqtt_client import MqttManager
 from communication.web_server import WebServer
 from utils.alarm_manager import AlarmManager
+from utils.ring_controller import RingController
+from utils.songs import library as songs
 
 # 硬體
 from hardware.display import OledDisplay
@@ -19,15 +21,21 @@ from hardware.sensors import Dht11Sensor
 
 # 任務
 import tasks
+import utils.log as logging
+from utils.log import get_logger
+import utils.metrics as metrics
+from utils.event_bus import bus
+
+log = get_logger("Init")
 # import config
 # print(f"Topic: [{config.TOPIC_PREFIX}]")
 # print(f"Length: {len(config.TOPIC_PREFIX)}")
 
 async def main():
-    print("\n=== ESP32 Smart Alarm System Starting ===\n")
+    log.info("=== ESP32 Smart Alarm System Starting ===")
 
     # 1. 硬體初始化
-    print("[Init] 初始化硬體...")
+    log.info("初始化硬體...")
     oled = OledDisplay()
     buzzer = Buzzer(config.BUZZER_PIN)
     btn_stop = Button(config.BUTTON_STOP_PIN)
@@ -36,6 +44,8 @@ async def main():
     
     # 2. 資料管理器初始化
     alarm_mgr = AlarmManager()
+    songs.preload()  # 鈴聲預先編譯，觸發響鈴時不必讀取 flash
+    ring_ctl = RingController(buzzer, btn_stop, tasks.sys_state)
     
     # 3. 網路連線
     ssid, pwd = await connect_wifi() # 使用既有的 wifi.py 邏輯
@@ -57,29 +67,46 @@ async def main():
     uasyncio.create_task(mqtt_manager.connect()) # 非同步連線
 
     # Web Server
-    web_server = WebServer(alarm_mgr)
+    web_server = WebServer(alarm_mgr, ring_ctl)
+
+    # 5. 效能指標：各模組既有的統計一併由 /api/metrics 與 MQTT metrics 輸出
+    metrics.register("http", web_server.conn_stats)
+    metrics.register("mqtt_rx", mqtt_manager.queue_stats)
+    metrics.register("mqtt_tx", mqtt_manager.publish_stats)
+    metrics.register("persist", alarm_mgr.persist_stats)
+    metrics.register("render_cache", alarm_mgr.cache.stats)
+    metrics.register("oled", oled.stats)
+    metrics.register("status", tasks.status_stats)
+    metrics.register("ring", ring_ctl.stats)
+    metrics.register("events", bus.stats)
+    metrics.register("log", logging.stats)
+    if config.METRICS_ENABLED:
+        uasyncio.create_task(metrics.lag_monitor())
     
-    print("[Init] 啟動任務協程...")
+    log.info("啟動任務協程...")
     
     try:
         await uasyncio.gather(
             # 硬體任務
-            #tasks.sensor_task(dht_sensor),
+            tasks.sensor_task(dht_sensor),  # 狀態發布 (status_pub) 與 /api/events 的溫濕度來源
             tasks.display_task(oled, alarm_mgr, btn_next),
-            tasks.alarm_check_task(alarm_mgr, buzzer, btn_stop),
+            tasks.alarm_check_task(alarm_mgr, ring_ctl),
+            ring_ctl.run(),
+            tasks.persist_task(alarm_mgr),
             
             # 通訊任務
-            tasks.mqtt_dispatch_task(mqtt_manager, alarm_mgr), # 包含 CRUD Router
+            tasks.mqtt_dispatch_task(mqtt_manager, alarm_mgr, ring_ctl), # 包含 CRUD Router
+            tasks.status_task(mqtt_manager, alarm_mgr, dht_sensor),
+            tasks.metrics_task(mqtt_manager),
             web_server.start() # 啟動 Web Server
         )
     except KeyboardInterrupt:
-        print("使用者中斷")
+        log.warning("使用者中斷")
     except Exception as e:
-        print(f"主程式錯誤: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(e, "主程式錯誤")
     finally:
-        print("系統關閉")
+        alarm_mgr.flush()  # 確保延遲寫入的修改落地
+        log.info("系統關閉")
 
 if __name__ == '__main__':
     uasyncio.run(main())
@@ -16,45 +16,63 @@ from communication.mqtt_router import MqttRouter
 # 引入硬體
 from hardware.display import OledDisplay
 from hardware.buzzer import Buzzer
-from hardware.button import Button
+from hardware.button import Button, ButtonEvent
 from hardware.sensors import Dht11Sensor
 
+# 事件發布 (/api/events)
+from utils.event_bus import bus
+from utils.alarm import WEEKDAYS
+import utils.log as logging
+from utils.log import get_logger
+import utils.metrics as metrics
+
+log = get_logger("Task")
+alarm_log = get_logger("Alarm")
+cmd_log = get_logger("MQTT CMD")
+
 # 全域狀態 (用於 UI 顯示)
 sys_state = {
     "ip": "0.0.0.0",
     "temp": 0,
     "humi": 0,
-    "alarm_idx": 0  # 顯示第幾個鬧鐘
+    "alarm_idx": 0,  # 顯示第幾個鬧鐘
+    "ringing": False,
 }
 
 # ==================== 任務 1: 感測器讀取 ====================
 async def sensor_task(dht_sensor):
     while True:
+        t0 = time.ticks_us()
         res = dht_sensor.measure()
         if res:
             sys_state["temp"], sys_state["humi"] = res
+            bus.publish("sensor", {"temp": res[0], "humi": res[1]}, retain=True)
+        metrics.since("task.sensor", t0)
         await uasyncio.sleep(config.DHT11_POLL_INTERVAL_SEC)
 
 # ==================== 任務 2: OLED UI 顯示 ====================
 async def display_task(oled_display, alarm_mgr, btn_next):
-    oled = oled_display.get_raw_oled()
+    # OledDisplay.show() 只傳送有變動的 page，畫面沒變時不會佔用 I2C
+    # 兩次更新之間等待 btn_next 的事件：按下立即切換並重畫，不會漏掉短按
+    oled = oled_display
+    last_tick = None
     while True:
-        if btn_next.pin.value() == 0:
-            await btn_next.debounce_read()
-            alarms = alarm_mgr.get_all()
-            if alarms:
-                sys_state["alarm_idx"] = (sys_state["alarm_idx"] + 1) % len(alarms)
-            await btn_next.wait_release()
-        
+        t0 = time.ticks_us()
         current_time = get_current_time()
         try:
             date_s, _, time_s = current_time
         except:
             date_s, time_s = "--/--", "--:--"
+
+        # 時鐘事件：每秒一次 (畫面每 OLED_UPDATE_INTERVAL_SEC 更新，但只在秒數改變時發布)
+        if time_s != last_tick:
+            last_tick = time_s
+            if bus.has_subscribers():
+                bus.publish("tick", {"date": date_s, "time": time_s[:8]})
             
         alarms = alarm_mgr.get_all()
-        oled.fill(0)
-        oled.text(str(sys_state["ip"]), 0, 0)
+        oled.clear()
+        oled.text(sys_state["ip"], 0, 0)
         oled.text(date_s, 0, 10)
         oled.text(time_s[:8], 0, 20)
         oled.text(f"T:{sys_state['temp']}C H:{sys_state['humi']}%", 0, 30)
@@ -62,106 +80,120 @@ async def display_task(oled_display, alarm_mgr, btn_next):
         if alarms:
             if sys_state["alarm_idx"] >= len(alarms): sys_state["alarm_idx"] = 0
             a = alarms[sys_state["alarm_idx"]]
-            oled.text(f"Alarm:{a['hour']:02d}:{a['minute']:02d}", 0, 45)
-            days = ",".join(a.get("weekdays", [])) or "Once"
-            oled.text(days[:16], 0, 55)
+            oled.text(f"Alarm:{a.hour:02d}:{a.minute:02d}", 0, 45)
+            oled.text(a.days_str("Once")[:16], 0, 55)
         else:
             oled.text("No Alarms", 0, 48)
             
         oled.show()
-        await uasyncio.sleep(config.OLED_UPDATE_INTERVAL_SEC)
+        metrics.since("task.display", t0)
+        await _wait_next_button(btn_next, alarm_mgr, config.OLED_UPDATE_INTERVAL_SEC)
 
 
-# ==================== 任務 3: 鬧鐘偵測與響鈴 ====================
-async def alarm_check_task(alarm_mgr, buzzer, btn_stop):
-    """每秒檢查一次鬧鐘"""
-    weekdays_map = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    
+async def _wait_next_button(btn_next, alarm_mgr, timeout):
+    """
+    等待至多 timeout 秒；期間按下 btn_next 切換到下一個鬧鐘，長按回到第一個
+    返回: 是否有切換 (需要立即重畫)
+    """
+    deadline = time.ticks_add(time.ticks_ms(), int(timeout * 1000))
     while True:
-        # 取得系統時間 (tuple: year, month, mday, hour, minute, second, weekday, yearday)
-        # 注意：get_current_time 返回的是字串，這裡需要數值，使用 time.localtime
-        now = time.localtime() 
-        h, m, s, wd = now[3], now[4], now[5], now[6]
-        today_str = weekdays_map[wd]
-
-        # 每一秒檢查所有鬧鐘
-        if s == 0: # 只在每分鐘的第0秒觸發
+        remain = time.ticks_diff(deadline, time.ticks_ms())
+        if remain <= 0:
+            return False
+        ev = await btn_next.get_event(remain / 1000)
+        if ev is None:
+            return False
+        if ev.event_type == ButtonEvent.PRESSED:
             alarms = alarm_mgr.get_all()
-            for idx, a in enumerate(alarms):
-                if not a.get("enabled", True):
-                    continue
-                
-                # 檢查時間
-                if a["hour"] == h and a["minute"] == m:
-                    # 檢查星期
-                    days = a.get("weekdays", [])
-                    if not days or today_str in days:
-                        print(f"[Alarm] 鬧鐘響起! {h}:{m}")
-                        
-                        # 觸發響鈴
-                        await _ring_alarm(buzzer, btn_stop)
-                        
-                        # 如果是單次鬧鐘，停用它
-                        if not days:
-                            alarm_mgr.disable_single_shot(idx)
-        
-        await uasyncio.sleep(1)
+            if alarms:
+                sys_state["alarm_idx"] = (sys_state["alarm_idx"] + 1) % len(alarms)
+            return True
+        if ev.event_type == ButtonEvent.LONG_PRESS:
+            sys_state["alarm_idx"] = 0
+            return True
+
+
+# ==================== 任務 3: 鬧鐘偵測 ====================
+async def alarm_check_task(alarm_mgr, ring_ctl):
+    """
+    睡到排程器中最早的鬧鐘到期，再處理到期 (含錯過) 的鬧鐘
+    響鈴交給 RingController 的任務，這裡只排入觸發就繼續檢查，不會因響鈴而漏掉其他鬧鐘
+    """
+    # AlarmManager 在 NTP 同步前就已建立，這裡依正確時間重建排程
+    alarm_mgr.reschedule()
+    wakeup = alarm_mgr.scheduler.changed
+    # 以整數秒比較 (與排程器的觸發時間相同)；CPython 的 time.time() 是 float，
+    # 直接相減會讓準時的鬧鐘也算成延遲
+    last_now = int(time.time())
 
-async def _ring_alarm(buzzer, btn_stop):
-    """響鈴處理邏輯：播放音樂直到按下停止或超時"""
-    start_time = time.time()
-    
-    # 啟動音樂任務
-    play_task = uasyncio.create_task(buzzer.play_song())
-    
-    print(">>> 鬧鐘響鈴中，按按鈕停止...")
-    
     while True:
-        # 1. 檢查停止按鈕
-        if btn_stop.pin.value() == 0:
-            print("[Alarm] 使用者手動停止")
-            buzzer.stop()
-            break
-        
-        # 2. 檢查超時
-        if time.time() - start_time > config.MAX_RING_TIME:
-            print("[Alarm] 響鈴超時自動停止")
-            buzzer.stop()
-            break
-            
-        await uasyncio.sleep_ms(100)
-        
-        # 如果音樂播完了（小星星播完），重新播放
-        if not buzzer.is_playing and not buzzer._stop_flag:
-             play_task = uasyncio.create_task(buzzer.play_song())
+        t0 = time.ticks_us()
+        now = int(time.time())
+        # 時間倒退 (例如重新對時)：原本的觸發時間全部失準，重建排程
+        if now < last_now:
+            alarm_log.warning("偵測到系統時間倒退，重建排程")
+            alarm_mgr.reschedule(now)
+        last_now = now
+
+        for a, fire_at in alarm_mgr.pop_due(now):
+            late = now - fire_at
+            if late > config.ALARM_CATCHUP_SEC:
+                metrics.inc("alarms_missed")
+                alarm_log.warning("鬧鐘 %02d:%02d 已錯過 %s 秒，略過", a.hour, a.minute, late)
+            else:
+                metrics.inc("alarms_fired")
+                if late > 0:
+                    metrics.inc("alarms_late")
+                    alarm_log.info("補響延遲 %s 秒的鬧鐘", late)
+                alarm_log.info("鬧鐘響起! %s:%s", a.hour, a.minute)
+                ring_ctl.trigger(a)
 
-    # 確保完全停止
-    buzzer.stop()
-    await uasyncio.sleep(2) # 避免按鈕誤觸
+            # 如果是單次鬧鐘，停用它
+            if a.is_once():
+                alarm_mgr.disable_single_shot(alarm_mgr.index_of(a.id))
+
+        # 先清除旗標再計算睡眠時間，避免漏掉計算期間的新增
+        wakeup.clear()
+        next_at = alarm_mgr.scheduler.next_due()
+        if next_at is None:
+            delay = config.ALARM_MAX_SLEEP_SEC
+        else:
+            delay = min(max(next_at - time.time(), 0), config.ALARM_MAX_SLEEP_SEC)
+        metrics.since("task.alarm_check", t0)
+
+        try:
+            await uasyncio.wait_for(wakeup.wait(), delay)
+        except uasyncio.TimeoutError:
+            pass
 
 
 # ==================== 任務 4: MQTT 訂閱處理 (使用 Decorator) ====================
-async def mqtt_dispatch_task(mqtt_manager, alarm_mgr):
+async def mqtt_dispatch_task(mqtt_manager, alarm_mgr, ring_ctl):
     """設定 MQTT 路由並開始監聽"""
     
     router = MqttRouter(mqtt_manager)
+    metrics.register("mqtt_router", router.stats)
 
     # --- 定義 MQTT 路由 ---
     
     @router.route(config.MQTT_TOPICS['alarm_add'])
     async def handle_add(payload):
-        print(f"[MQTT CMD] 收到新增指令: {payload}")
+        cmd_log.debug("收到新增指令: %s", payload)
         if isinstance(payload, dict):
             h = payload.get("h")
             m = payload.get("m")
             days = payload.get("days", [])
             if h is not None and m is not None:
-                idx = alarm_mgr.add_alarm(h, m, days)
+                try:
+                    idx = alarm_mgr.add_alarm(h, m, days, song=payload.get("song", 0))
+                except (ValueError, TypeError) as e:
+                    await _reply(f"Add failed: {e}")
+                    return
                 await _reply(f"Added alarm at {h}:{m}, index={idx}")
 
     @router.route(config.MQTT_TOPICS['alarm_del'])
     async def handle_del(payload):
-        print(f"[MQTT CMD] 收到刪除指令: {payload}")
+        cmd_log.debug("收到刪除指令: %s", payload)
         if isinstance(payload, dict):
             idx = payload.get("index")
             if idx is not None:
@@ -171,16 +203,58 @@ async def mqtt_dispatch_task(mqtt_manager, alarm_mgr):
 
     @router.route(config.MQTT_TOPICS['alarm_list'])
     async def handle_list(payload):
-        print("[MQTT CMD] 收到查詢列表指令")
-        alarms = alarm_mgr.get_all()
-        json_str = ujson.dumps(alarms)
-        await mqtt_manager.publish(config.MQTT_TOPICS['alarm_response'], json_str)
+        cmd_log.debug("收到查詢列表指令")
+        await mqtt_manager.publish(config.MQTT_TOPICS['alarm_response'], alarm_mgr.list_json())
+
+    @router.route(config.MQTT_TOPICS['alarm_enable'])
+    async def handle_enable(payload, alarm_id):
+        # payload: true / false / 1 / 0 或 {"enabled": true}
+        if isinstance(payload, dict):
+            payload = payload.get("enabled", True)
+        try:
+            idx = alarm_mgr.index_of(int(alarm_id))
+        except ValueError:
+            idx = -1
+        ok = alarm_mgr.set_enabled(idx, payload not in (False, 0, "0", "false", "off"))
+        await _reply(f"Enable result: {'OK' if ok else 'Not Found'} (id={alarm_id})")
+
+    @router.route(config.MQTT_TOPICS['alarm_batch'])
+    async def handle_batch(payload):
+        if isinstance(payload, dict):
+            payload = payload.get("ops")
+        cmd_log.debug("收到批次指令: %s 筆", len(payload) if isinstance(payload, list) else 0)
+        ok, result = alarm_mgr.apply_batch(payload)
+        await mqtt_manager.publish(config.MQTT_TOPICS['alarm_response'], ujson.dumps(result))
+
+    @router.route(config.MQTT_TOPICS['log_get'])
+    async def handle_log_get(payload):
+        # payload: {"since": 0, "level": "INFO", "limit": 20, "set_level": "DEBUG"}，可為空
+        if not isinstance(payload, dict):
+            payload = {}
+        if "set_level" in payload:
+            logging.set_level(payload["set_level"])
+        doc = logging.snapshot(int(payload.get("since", 0)), payload.get("level", "INFO"),
+                               int(payload.get("limit", 20)))
+        await mqtt_manager.publish(config.MQTT_TOPICS['log_pub'], ujson.dumps(doc))
+
+    @router.route(config.MQTT_TOPICS['ring_control'])
+    async def handle_ring(payload):
+        # payload: "stop" / "stop_all" / "snooze" 或 {"action": "snooze"}；空 payload 只回傳目前狀態
+        if isinstance(payload, dict):
+            payload = payload.get("action")
+        if payload == "stop":
+            ring_ctl.stop("mqtt")
+        elif payload == "stop_all":
+            ring_ctl.stop_all("mqtt")
+        elif payload == "snooze":
+            ring_ctl.snooze("mqtt")
+        await mqtt_manager.publish(config.MQTT_TOPICS['alarm_response'], ujson.dumps(ring_ctl.status()))
 
     async def _reply(msg):
         await mqtt_manager.publish(config.MQTT_TOPICS['alarm_response'], msg)
 
     # --- 啟動連線與訂閱 ---
-    print("[Task] 等待 MQTT 連線...")
+    log.info("等待 MQTT 連線...")
     await mqtt_manager.wait_connected()
     
     mqtt_manager.set_callback(router.dispatch)
@@ -188,15 +262,135 @@ async def mqtt_dispatch_task(mqtt_manager, alarm_mgr):
     # 1. 訂閱
     target_topic = config.MQTT_TOPICS['subscribe_wildcard'] # 這裡通常是 ".../#"
     await mqtt_manager.subscribe(target_topic)
-    print(f"[Task] 已訂閱: {target_topic}")
+    log.info("已訂閱: %s", target_topic)
 #     await mqtt_manager.subscribe("test/debug/123") 
 #     print("[Debug] 強制訂閱: test/debug/123")
     
     # 2. 【新增】自我測試：發送一條訊息給自己
     # 使用一個絕對簡單、不會打錯的 topic，例如測試 topic 的子路徑
     test_topic = f"{config.TOPIC_PREFIX}/self_test"
-    print(f"[Debug] 嘗試發送測試訊息到: {test_topic}")
+    log.debug("嘗試發送測試訊息到: %s", test_topic)
     await mqtt_manager.publish(test_topic, '{"msg": "Hello ESP32"}')
 
     while True:
         await uasyncio.sleep(10)
+
+
+# ==================== 任務 5: 鬧鐘設定延遲寫入 ====================
+async def persist_task(alarm_mgr):
+    """合併短時間內的多次修改：靜置 ALARM_SAVE_QUIET_MS 後才寫入一次"""
+    dirty = alarm_mgr.dirty
+    while True:
+        await dirty.wait()
+        start = time.ticks_ms()
+
+        # 每次有新修改就重新計時，但最多延遲 ALARM_SAVE_MAX_DELAY_MS
+        while alarm_mgr.is_dirty():
+            waited = time.ticks_diff(time.ticks_ms(), start)
+            remain = config.ALARM_SAVE_MAX_DELAY_MS - waited
+            if remain <= 0:
+                break
+            dirty.clear()
+            try:
+                await uasyncio.wait_for(dirty.wait(), min(config.ALARM_SAVE_QUIET_MS, remain) / 1000)
+            except uasyncio.TimeoutError:
+                break
+
+        t0 = time.ticks_us()
+        if not alarm_mgr.flush():
+            # 寫入失敗：保留未儲存狀態，稍後重試
+            await uasyncio.sleep(5)
+            dirty.set()
+        elif alarm_mgr.needs_compaction():
+            # journal 過大：先讓出 CPU 給其他任務，再壓縮成新快照
+            await uasyncio.sleep(0)
+            alarm_mgr.compact()
+        metrics.since("task.persist", t0)
+
+
+# ==================== 任務 6: 狀態發布 ====================
+# 累計發布量 (評估每小時訊息數 / bytes)
+status_stats = {"full": 0, "delta": 0, "bytes": 0, "checks": 0}
+
+# 數值欄位的死區 (變化量未超過不算改變)
+_DEADBANDS = {"t": config.STATUS_TEMP_DEADBAND, "h": config.STATUS_HUMI_DEADBAND}
+
+
+def _status_doc(alarm_mgr, dht_sensor):
+    """精簡的狀態文件：t 溫度、h 濕度、r 響鈴中、c 鬧鐘數、n 下一次鬧鐘"""
+    temp, humi = dht_sensor.get_data()
+    nxt = alarm_mgr.next_alarm()
+    if nxt is None:
+        n = None
+    else:
+        t = time.localtime(nxt[0])
+        n = f"{WEEKDAYS[t[6]]} {t[3]:02d}:{t[4]:02d}"
+    return {
+        "t": temp,
+        "h": humi,
+        "r": 1 if sys_state["ringing"] else 0,
+        "c": len(alarm_mgr.get_all()),
+        "n": n,
+    }
+
+
+def _status_changes(doc, last):
+    """與上次發布的內容比較，返回超過死區的欄位"""
+    changed = {}
+    for k, v in doc.items():
+        old = last.get(k)
+        band = _DEADBANDS.get(k)
+        if band is not None and old is not None:
+            if abs(v - old) >= band:
+                changed[k] = v
+        elif v != old:
+            changed[k] = v
+    return changed
+
+
+async def status_task(mqtt_manager, alarm_mgr, dht_sensor):
+    """
+    只在狀態改變 (數值超過死區) 或超過 STATUS_MAX_INTERVAL_SEC 時才發布
+    完整狀態以 retain 發布到 status_pub (發送佇列會合併尚未送出的舊狀態)；
+    STATUS_DELTA_ONLY 時，兩次完整發布之間只把變動欄位送到 status_pub/delta
+    """
+    topic = config.MQTT_TOPICS['status_pub']
+    delta_topic = topic + "/delta"
+    last = {}       # 上次發布的值 (死區比較基準)
+    last_full = None
+    while True:
+        t0 = time.ticks_us()
+        status_stats["checks"] += 1
+        doc = _status_doc(alarm_mgr, dht_sensor)
+        changed = _status_changes(doc, last)
+        now = time.ticks_ms()
+        due = last_full is None or time.ticks_diff(now, last_full) >= config.STATUS_MAX_INTERVAL_SEC * 1000
+
+        if due or (changed and not config.STATUS_DELTA_ONLY):
+            # 死區內的小變化不更新基準，避免緩慢漂移永遠不發布
+            last.update(changed if not due else doc)
+            msg = ujson.dumps(last)
+            await mqtt_manager.publish(topic, msg, retain=True)
+            last_full = now
+            status_stats["full"] += 1
+            status_stats["bytes"] += len(msg)
+        elif changed:
+            last.update(changed)
+            msg = ujson.dumps(changed)
+            await mqtt_manager.publish(delta_topic, msg)
+            status_stats["delta"] += 1
+            status_stats["bytes"] += len(msg)
+        metrics.since("task.status", t0)
+
+        await uasyncio.sleep(config.STATUS_CHECK_SEC)
+
+
+# ==================== 任務 7: 效能指標發布 ====================
+async def metrics_task(mqtt_manager):
+    """每 METRICS_PUBLISH_SEC 把 metrics.snapshot() 發布到 metrics_pub (尚未送出的舊快照會被合併)"""
+    if not config.METRICS_PUBLISH_SEC:
+        return
+    topic = config.MQTT_TOPICS['metrics_pub']
+    while True:
+        await uasyncio.sleep(config.METRICS_PUBLISH_SEC)
+        await mqtt_manager.publish(topic, ujson.dumps(metrics.snapshot()), coalesce=True)
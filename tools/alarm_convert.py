@@ -0,0 +1,56 @@
+"""
+tools/alarm_convert.py - alarms.json 與 alarms.bin 互轉 (在電腦上以 CPython 執行)
+
+用法:
+    python tools/alarm_convert.py alarms.json alarms.bin
+    python tools/alarm_convert.py alarms.bin alarms.json
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import host  # noqa: E402
+
+host.install()  # ujson、uasyncio、time.ticks_* 等裝置端模組改用 host/ 的替身
+
+from utils.alarm import Alarm  # noqa: E402
+from utils.alarm_binfile import AlarmFile, write_alarms  # noqa: E402
+
+
+def json_to_bin(src, dst):
+    with open(src) as f:
+        records = json.load(f)
+    alarms = []
+    next_id = max([d["id"] for d in records if "id" in d] or [-1]) + 1
+    for d in records:
+        alarms.append(Alarm.from_dict(d, next_id))
+        if "id" not in d:
+            next_id += 1
+    write_alarms(dst, alarms)
+    return len(alarms)
+
+
+def bin_to_json(src, dst):
+    with AlarmFile(src) as af:
+        records = [a.to_dict() for a in af]
+    with open(dst, "w") as f:
+        json.dump(records, f)
+    return len(records)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    src, dst = sys.argv[1], sys.argv[2]
+    if src.endswith(".bin"):
+        n = bin_to_json(src, dst)
+    else:
+        n = json_to_bin(src, dst)
+    print(f"{src} -> {dst}: {n} 個鬧鐘")
+
+
+if __name__ == "__main__":
+    main()
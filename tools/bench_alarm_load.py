@@ -0,0 +1,73 @@
+"""
+tools/bench_alarm_load.py - 鬧鐘檔載入效能比較 (在電腦上以 CPython 執行)
+比較 alarms.json 全部解析 與 alarms.bin (mmap) 的載入時間與記憶體峰值
+
+用法: python tools/bench_alarm_load.py [鬧鐘數量 ...]   (預設 10 1000 50000)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import host  # noqa: E402
+
+host.install()  # ujson、uasyncio、time.ticks_* 等裝置端模組改用 host/ 的替身
+
+from utils.alarm import Alarm  # noqa: E402
+from utils.alarm_binfile import AlarmFile, write_alarms  # noqa: E402
+
+
+def make_alarms(n):
+    return [Alarm(i, i % 24, i % 60, (i * 37) & 0x7F) for i in range(n)]
+
+
+def run(label, fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - t0) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<28} {elapsed:9.2f} ms  peak {peak / 1024:9.1f} KiB")
+    return result
+
+
+def bench(n, tmpdir):
+    json_path = os.path.join(tmpdir, "alarms.json")
+    bin_path = os.path.join(tmpdir, "alarms.bin")
+    alarms = make_alarms(n)
+    with open(json_path, "w") as f:
+        json.dump([a.to_dict() for a in alarms], f)
+    write_alarms(bin_path, alarms)
+    print(f"{n} alarms: json {os.path.getsize(json_path)} bytes, bin {os.path.getsize(bin_path)} bytes")
+
+    def load_json():
+        with open(json_path) as f:
+            return [Alarm.from_dict(d) for d in json.load(f)]
+
+    def open_bin():
+        with AlarmFile(bin_path) as af:
+            return len(af), af[n // 2]
+
+    def load_bin():
+        with AlarmFile(bin_path) as af:
+            return list(af)
+
+    run("json: parse all", load_json)
+    run("bin: open + seek middle", open_bin)
+    run("bin: materialize all", load_bin)
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] or [10, 1000, 50000]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            bench(n, tmpdir)
+
+
+if __name__ == "__main__":
+    main()
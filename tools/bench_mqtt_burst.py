@@ -0,0 +1,106 @@
+"""
+tools/bench_mqtt_burst.py - MQTT 訊息解碼成本比較 (在電腦上以 CPython 執行)
+重播一段混合訊息：指令、查詢，以及經由 # 訂閱回到自己的 response / self_test，
+比較舊流程 (收到就解碼、列印、json 解析，再以完整字串查路由)
+與目前流程 (bytes 過濾自己的 topic，路由命中後才解析) 的解析次數與每則訊息 CPU 時間
+
+用法: python tools/bench_mqtt_burst.py [重播次數]   (預設 200)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import host  # noqa: E402
+
+host.install()  # ujson、uasyncio、time.ticks_* 等裝置端模組改用 host/ 的替身
+
+from communication.mqtt_router import MqttRouter  # noqa: E402
+from communication.mqtt_message import MqttMessage, parse_stats  # noqa: E402
+
+PREFIX = "nuu/csie/bench"
+LIST_REPLY = json.dumps([{"id": i, "hour": 7, "minute": i, "weekdays": ["Mon", "Fri"], "enabled": True}
+                         for i in range(20)])
+
+
+def make_burst():
+    """一次 alarm_list 查詢會產生一則大的 response 回到自己"""
+    burst = []
+    for i in range(10):
+        burst.append((f"{PREFIX}/alarm_add".encode(), b'{"h": 7, "m": %d, "days": ["Mon"]}' % i))
+        burst.append((f"{PREFIX}/alarm_list".encode(), b""))
+        burst.append((f"{PREFIX}/response".encode(), LIST_REPLY.encode()))
+        burst.append((f"{PREFIX}/alarm/{i}/enable".encode(), b"true"))
+        burst.append((f"{PREFIX}/response".encode(), b"Enable result: OK"))
+    burst.append((f"{PREFIX}/self_test".encode(), b'{"msg": "Hello ESP32"}'))
+    return burst
+
+
+async def handler(payload, **params):
+    pass
+
+
+async def legacy(burst, routes, counts):
+    """舊流程：on_message 解碼並列印，dispatch 再解碼一次並先做 json 解析"""
+    for topic, msg in burst:
+        topic_str = topic.decode("utf-8")
+        msg_str = msg.decode("utf-8")
+        counts["decodes"] += 2
+        _ = f"[MQTT Safe] Topic: {topic_str} Msg: {msg_str}"
+        topic_str = topic.decode()
+        msg_str = msg.decode()
+        counts["decodes"] += 2
+        try:
+            payload = json.loads(msg_str)
+        except ValueError:
+            payload = msg_str
+        counts["parses"] += 1
+        h = routes.get(topic_str)
+        if h is not None:
+            await h(payload)
+
+
+async def current(burst, router, own):
+    """目前流程：MqttManager.on_message 的 bytes 過濾 + MqttRouter.dispatch"""
+    for topic, msg in burst:
+        if topic in own:
+            continue
+        await router.dispatch(MqttMessage(topic, msg))
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    burst = make_burst()
+    n = len(burst) * rounds
+
+    routes = {f"{PREFIX}/{t}": handler for t in ("alarm_add", "alarm_delete", "alarm_list", "alarm_batch")}
+    router = MqttRouter(None, PREFIX)
+    for pattern in list(routes) + [f"{PREFIX}/alarm/<alarm_id>/enable"]:
+        router.add(pattern, handler)
+    own = {f"{PREFIX}/response".encode(), f"{PREFIX}/self_test".encode()}
+
+    counts = {"decodes": 0, "parses": 0}
+    t0 = time.perf_counter()
+    asyncio.run(_repeat(legacy, rounds, burst, routes, counts))
+    before = (time.perf_counter() - t0) / n * 1e6
+
+    t0 = time.perf_counter()
+    asyncio.run(_repeat(current, rounds, burst, router, own))
+    after = (time.perf_counter() - t0) / n * 1e6
+
+    decodes = parse_stats["topic_decodes"] + parse_stats["text_decodes"]
+    print(f"{n} messages ({len(burst)} per burst x {rounds})")
+    print(f"  before: {counts['decodes']:6d} decodes {counts['parses']:6d} json parses  {before:6.2f} us/msg")
+    print(f"  after : {decodes:6d} decodes {parse_stats['json_parses']:6d} json parses  {after:6.2f} us/msg")
+
+
+async def _repeat(fn, rounds, burst, *args):
+    for _ in range(rounds):
+        await fn(burst, *args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+tools/bench_mqtt_log.py - 日誌等級對 MQTT 處理量的影響 (在電腦上以 CPython 執行)
+訊息經 MqttManager.on_message -> 接收佇列 -> worker -> MqttRouter -> 處理函式，
+分別量測 DEBUG 關閉、DEBUG 只記錄到環形緩衝區、DEBUG 同時輸出到 stdout 時的每秒訊息數
+(stdout 導向 os.devnull；實機的 UART 輸出會更慢)
+
+用法: python tools/bench_mqtt_log.py [訊息數]   (預設 20000)
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import host  # noqa: E402
+
+host.install()  # ujson、uasyncio、time.ticks_* 等裝置端模組改用 host/ 的替身
+
+import config  # noqa: E402
+import utils.log as logging  # noqa: E402
+from communication.mqtt_client import MqttManager  # noqa: E402
+from communication.mqtt_router import MqttRouter  # noqa: E402
+
+cmd_log = logging.get_logger("MQTT CMD")
+
+
+async def run(count):
+    mgr = MqttManager("bench", "")
+    router = MqttRouter(mgr)
+    done = asyncio.Event()
+    handled = [0]
+
+    @router.route(config.MQTT_TOPICS["alarm_add"])
+    async def handle_add(payload):
+        cmd_log.debug("收到新增指令: %s", payload)
+        handled[0] += 1
+        if handled[0] == count:
+            done.set()
+
+    mgr.set_callback(router.dispatch)
+    topic = config.MQTT_TOPICS["alarm_add"].encode()
+    miss = (config.TOPIC_PREFIX + "/unknown").encode()
+    msg = b'{"h": 7, "m": 30, "days": ["Mon"]}'
+
+    t0 = time.perf_counter()
+    for i in range(count):
+        mgr.on_message(topic, msg, False)
+        mgr.on_message(miss, b"", False)  # 未處理的 topic 走 debug 記錄
+        if i % 8 == 7:
+            await asyncio.sleep(0)  # 讓 worker 消化佇列
+    await done.wait()
+    return count / (time.perf_counter() - t0)
+
+
+def bench(label, level, echo, count, repeat=3):
+    """取 repeat 次中最快的一次"""
+    logging.set_level(level, echo)
+    best = 0
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        for _ in range(repeat):
+            logging.stats["records"] = logging.stats["echoed"] = 0
+            best = max(best, asyncio.run(run(count)))
+    print(f"  {label:<28} {best:9.0f} msg/s  (records {logging.stats['records']}, echoed {logging.stats['echoed']})")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{count} handled messages (+{count} unrouted):")
+    bench("warm-up", "INFO", "INFO", count, 1)
+    bench("DEBUG off", "INFO", "INFO", count)
+    bench("DEBUG on, buffer only", "DEBUG", "INFO", count)
+    bench("DEBUG on, echo to stdout", "DEBUG", "DEBUG", count)
+
+
+if __name__ == "__main__":
+    main()
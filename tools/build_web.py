@@ -0,0 +1,51 @@
+"""
+tools/build_web.py - 建置網頁介面 (在電腦上以 CPython 執行)
+把 web/ 下的原始檔做簡易壓縮 (去除縮排、空行與註解) 後 gzip，輸出到 www/*.gz，
+上傳到 ESP32 後由 WebServer 直接以 Content-Encoding: gzip 傳送
+
+用法: python tools/build_web.py
+"""
+
+import gzip
+import os
+import re
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+SRC_DIR = os.path.join(ROOT, "web")
+OUT_DIR = os.path.join(ROOT, "www")
+
+
+def minify(text):
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.S)
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        # 整行的 // 註解 (不處理行尾註解，避免誤刪字串中的 //)
+        if not line or line.startswith("//"):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def build(name):
+    with open(os.path.join(SRC_DIR, name), encoding="utf-8") as f:
+        raw = f.read()
+    data = minify(raw).encode("utf-8")
+    out = os.path.join(OUT_DIR, name + ".gz")
+    # mtime=0 讓輸出可重現 (內容不變時檔案不變)
+    with open(out, "wb") as f:
+        with gzip.GzipFile(filename="", mode="wb", fileobj=f, compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    size = os.path.getsize(out)
+    print(f"{name}: {len(raw.encode('utf-8'))} -> {len(data)} (minified) -> {size} bytes (gzip)")
+
+
+def main():
+    os.makedirs(OUT_DIR, exist_ok=True)
+    for name in sorted(os.listdir(SRC_DIR)):
+        build(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+tools/measure_alarm_memory.py - 鬧鐘資料結構記憶體量測 (在電腦上以 CPython 執行)
+比較舊版 dict + 星期字串列表 與 utils.alarm.Alarm (__slots__ + 星期 mask) 每筆鬧鐘佔用的 bytes
+
+用法: python tools/measure_alarm_memory.py [鬧鐘數量]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.alarm import Alarm, WEEKDAYS  # noqa: E402
+
+
+def make_dict(i):
+    # 舊版格式；星期字串由 JSON 解析產生，每筆都是獨立物件
+    days = ["".join(list(d)) for d in WEEKDAYS[: (i % 7) + 1]]
+    return {"id": i, "hour": i % 24, "minute": i % 60, "weekdays": days, "enabled": True}
+
+
+def make_alarm(i):
+    return Alarm(i, i % 24, i % 60, (1 << ((i % 7) + 1)) - 1)
+
+
+def measure(factory, n):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    items = [factory(i) for i in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del items
+    return used / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    old = measure(make_dict, n)
+    new = measure(make_alarm, n)
+    print(f"alarms: {n}")
+    print(f"dict + list[str] : {old:8.1f} bytes/alarm")
+    print(f"Alarm (__slots__): {new:8.1f} bytes/alarm")
+    print(f"節省: {100 * (1 - new / old):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
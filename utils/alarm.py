@@ -0,0 +1,118 @@
+"""
+utils/alarm.py - 鬧鐘資料結構
+以 __slots__ 類別取代 dict + 星期字串列表：
+星期以 7-bit mask 表示 (bit0 = Mon ... bit6 = Sun，0 = 單次鬧鐘)，
+只在 JSON (檔案、Web API、MQTT) 的邊界才轉換回 {"weekdays": ["Mon", ...]}
+"""
+
+import struct
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+ALL_DAYS = 0x7F
+
+# flags
+FLAG_ENABLED = 0x01
+
+# 固定長度二進位記錄 (alarms.bin)：id(u32) hour minute days flags
+# flags 的高 4 bits 存放鈴聲編號 (config.SONGS 中的位置)，舊檔案為 0 即預設鈴聲
+SONG_SHIFT = 4
+RECORD_FMT = "<IBBBB"
+RECORD_SIZE = 8
+
+
+def days_to_mask(names):
+    """["Mon", "Wed"] -> 0b0000101，無法辨識的名稱會被忽略"""
+    mask = 0
+    for d in names or ():
+        if d in WEEKDAYS:
+            mask |= 1 << WEEKDAYS.index(d)
+    return mask
+
+
+def valid_time(hour, minute):
+    """時分是否在 00:00 ~ 23:59 之間 (超出範圍的時分會落在其他星期的分鐘槽)"""
+    return 0 <= hour < 24 and 0 <= minute < 60
+
+
+def mask_to_days(mask):
+    """0b0000101 -> ["Mon", "Wed"]"""
+    return [d for i, d in enumerate(WEEKDAYS) if mask & (1 << i)]
+
+
+class Alarm:
+    """
+    單一鬧鐘 (每個欄位皆為小整數，可直接打包成固定長度記錄)
+    id: 固定編號；days: 星期 mask；flags: FLAG_ENABLED 等旗標；song: 鈴聲編號 (0 為預設)
+    """
+    __slots__ = ("id", "hour", "minute", "days", "flags", "song")
+
+    def __init__(self, alarm_id, hour, minute, days=0, flags=FLAG_ENABLED, song=0):
+        self.id = alarm_id
+        self.hour = hour
+        self.minute = minute
+        self.days = days
+        self.flags = flags
+        self.song = song
+
+    @property
+    def enabled(self):
+        return bool(self.flags & FLAG_ENABLED)
+
+    @enabled.setter
+    def enabled(self, value):
+        if value:
+            self.flags |= FLAG_ENABLED
+        else:
+            self.flags &= ~FLAG_ENABLED
+
+    def is_once(self):
+        return not self.days
+
+    def on_weekday(self, wd):
+        """wd: 0=Mon ... 6=Sun (與 time.localtime()[6] 相同)"""
+        return not self.days or bool(self.days & (1 << wd))
+
+    @property
+    def weekdays(self):
+        return mask_to_days(self.days)
+
+    def days_str(self, once=""):
+        """顯示用："Mon,Wed"，單次鬧鐘返回 once"""
+        return ",".join(mask_to_days(self.days)) or once
+
+    def to_dict(self):
+        """轉為 JSON 格式 (alarms.json、/api/alarms、MQTT alarm_list)；預設鈴聲不輸出 song"""
+        d = {
+            "id": self.id,
+            "hour": self.hour,
+            "minute": self.minute,
+            "weekdays": mask_to_days(self.days),
+            "enabled": self.enabled,
+        }
+        if self.song:
+            d["song"] = self.song
+        return d
+
+    @staticmethod
+    def from_dict(d, alarm_id=None):
+        """由 JSON 格式建立；舊版資料沒有 id 時使用 alarm_id"""
+        return Alarm(
+            d.get("id", alarm_id),
+            int(d["hour"]),
+            int(d["minute"]),
+            days_to_mask(d.get("weekdays")),
+            FLAG_ENABLED if d.get("enabled", True) else 0,
+            int(d.get("song", 0)),
+        )
+
+    def pack_into(self, buf, offset=0):
+        struct.pack_into(RECORD_FMT, buf, offset, self.id, self.hour, self.minute, self.days,
+                         self.flags | (self.song << SONG_SHIFT))
+
+    @staticmethod
+    def unpack_from(buf, offset=0):
+        alarm_id, hour, minute, days, flags = struct.unpack_from(RECORD_FMT, buf, offset)
+        return Alarm(alarm_id, hour, minute, days, flags & 0x0F, flags >> SONG_SHIFT)
+
+    def __repr__(self):
+        return f"Alarm({self.id}, {self.hour:02d}:{self.minute:02d}, days={self.days:#04x}, flags={self.flags}, song={self.song})"
@@ -0,0 +1,104 @@
+"""
+utils/alarm_binfile.py - 鬧鐘二進位檔 (alarms.bin)
+固定長度格式：12 bytes 檔頭 + 每筆 8 bytes 記錄 (見 utils.alarm.RECORD_FMT)，
+可依索引直接定位到任一筆，不必解析整個檔案
+
+檔頭: magic "ALRM" | version (u8) | record_size (u8) | reserved (u16) | count (u32)
+在 CPython (電腦端) 以 mmap 存取；MicroPython 沒有 mmap 時改用 seek + read
+"""
+
+import struct
+from utils.alarm import Alarm, RECORD_SIZE
+from utils.alarm_store import atomic_write
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+MAGIC = b"ALRM"
+VERSION = 1
+HEADER_FMT = "<4sBBHI"
+HEADER_SIZE = 12
+
+
+def write_alarms(path, alarms):
+    """以原子方式寫入 alarms.bin (逐筆寫入，只使用一個 8 bytes 緩衝區)"""
+    if not isinstance(alarms, list):
+        alarms = list(alarms)
+
+    def _write(f):
+        f.write(struct.pack(HEADER_FMT, MAGIC, VERSION, RECORD_SIZE, 0, len(alarms)))
+        rec = bytearray(RECORD_SIZE)
+        for a in alarms:
+            a.pack_into(rec)
+            f.write(rec)
+
+    atomic_write(path, _write, "wb")
+
+
+class AlarmFile:
+    """
+    唯讀存取 alarms.bin，記錄只在讀取時才轉成 Alarm
+    用法:
+        with AlarmFile("alarms.bin") as af:
+            n = len(af)
+            a = af[10]
+            for a in af: ...
+    """
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        self._map = None
+        if mmap is not None:
+            try:
+                self._map = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError, AttributeError):
+                self._map = None
+        self._rec = bytearray(RECORD_SIZE)
+
+        header = self._read(0, HEADER_SIZE)
+        magic, version, rec_size, _, count = struct.unpack_from(HEADER_FMT, header, 0)
+        if magic != MAGIC or version != VERSION or rec_size != RECORD_SIZE:
+            self.close()
+            raise ValueError("not an alarms.bin file")
+        self.count = count
+
+    def _read(self, offset, size):
+        if self._map is not None:
+            return self._map[offset:offset + size]
+        self._f.seek(offset)
+        if size == RECORD_SIZE:
+            self._f.readinto(self._rec)
+            return self._rec
+        return self._f.read(size)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        if self._map is not None:
+            return Alarm.unpack_from(self._map, HEADER_SIZE + i * RECORD_SIZE)
+        return Alarm.unpack_from(self._read(HEADER_SIZE + i * RECORD_SIZE, RECORD_SIZE))
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,110 @@
+"""
+utils/alarm_index.py - 鬧鐘「一週分鐘」索引
+把一週切成 10080 個分鐘槽 (星期 * 1440 + 時 * 60 + 分)，
+以 1260 bytes 的 bitmap 標記有鬧鐘的槽，另以 dict 記錄每個槽的鬧鐘 id，
+讓「現在有沒有鬧鐘」的查詢為 O(1)，不必逐一比對星期
+"""
+
+from utils.alarm import ALL_DAYS, valid_time
+
+SLOTS_PER_DAY = 1440
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+
+
+def slot_of(weekday, hour, minute):
+    """weekday: 0=Mon ... 6=Sun (與 time.localtime()[6] 相同)"""
+    return weekday * SLOTS_PER_DAY + hour * 60 + minute
+
+
+def slots_of(alarm):
+    """鬧鐘佔用的所有分鐘槽；單次鬧鐘 (days 為 0) 佔用每天同一時分"""
+    base = alarm.hour * 60 + alarm.minute
+    days = alarm.days or ALL_DAYS
+    return [wd * SLOTS_PER_DAY + base for wd in range(7) if days & (1 << wd)]
+
+
+class AlarmIndex:
+    def __init__(self):
+        self.bitmap = bytearray(SLOTS_PER_WEEK // 8)
+        self._slots = {}  # slot -> [alarm_id, ...]
+
+    def __len__(self):
+        """有鬧鐘的槽數"""
+        return len(self._slots)
+
+    def clear(self):
+        self.bitmap = bytearray(SLOTS_PER_WEEK // 8)
+        self._slots = {}
+
+    def rebuild(self, alarms):
+        """依鬧鐘列表重建索引 (只收錄啟用中、時分有效的鬧鐘)"""
+        self.clear()
+        for a in alarms:
+            if a.enabled and valid_time(a.hour, a.minute):
+                self.add(a)
+
+    def is_set(self, slot):
+        return bool(self.bitmap[slot >> 3] & (1 << (slot & 7)))
+
+    def ids_at(self, slot):
+        """返回該槽的鬧鐘 id 列表 (唯讀，請勿修改)"""
+        if not self.is_set(slot):
+            return ()
+        return self._slots[slot]
+
+    def occupied(self):
+        return self._slots.keys()
+
+    def add(self, alarm):
+        """
+        加入鬧鐘
+        返回: 由空變為有鬧鐘的槽 (供排程器新增)
+        """
+        new_slots = []
+        for slot in slots_of(alarm):
+            ids = self._slots.get(slot)
+            if ids is None:
+                self._slots[slot] = [alarm.id]
+                self.bitmap[slot >> 3] |= 1 << (slot & 7)
+                new_slots.append(slot)
+            elif alarm.id not in ids:
+                ids.append(alarm.id)
+        return new_slots
+
+    def remove(self, alarm):
+        """
+        移除鬧鐘 (須在修改鬧鐘時分前呼叫)
+        返回: 變為空的槽
+        """
+        freed = []
+        for slot in slots_of(alarm):
+            ids = self._slots.get(slot)
+            if ids is None or alarm.id not in ids:
+                continue
+            ids.remove(alarm.id)
+            if not ids:
+                del self._slots[slot]
+                self.bitmap[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+                freed.append(slot)
+        return freed
+
+    def next_slot(self, slot):
+        """
+        從 slot (含) 開始往後找下一個有鬧鐘的槽 (跨週環繞)
+        以 byte 為單位跳過空白區段，最多掃描 1260 bytes
+        返回: slot 或 None
+        """
+        if not self._slots:
+            return None
+        bm = self.bitmap
+        n = len(bm)
+        for step in range(n + 1):
+            byte_i = ((slot >> 3) + step) % n
+            b = bm[byte_i]
+            if not b:
+                continue
+            for bit in range(8):
+                s = byte_i * 8 + bit
+                if b & (1 << bit) and (step or s >= slot):
+                    return s
+        return None
@@ -2,70 +2,406 @@
 """
 utils/alarm_manager.py - 鬧鐘資料管理員
 負責 alarms.json 的 CRUD 操作，供 Web 與 MQTT 共用
+
+記憶體中以 utils.alarm.Alarm 保存，只有在讀寫檔案與對外 API (export) 時才轉為 JSON dict
+修改只會標記為 dirty，由 tasks.persist_task 在安靜一段時間後合併寫入一次；
+需要立即落地時呼叫 flush()
 """
 
 import ujson
-import os
 import config
+import time
+import uasyncio
+from utils.alarm import Alarm, days_to_mask, valid_time
+from utils.alarm_store import make_store
+from utils.alarm_index import AlarmIndex, slot_of
+from utils.alarm_scheduler import AlarmScheduler
+from utils.render_cache import RenderCache
+from utils.event_bus import bus
+from utils.songs import library as songs
+from utils.log import get_logger
+
+log = get_logger("AlarmMgr")
 
 class AlarmManager:
     def __init__(self, filepath=config.ALARM_FILE):
         self.filepath = filepath
+        self.store = make_store(config.ALARM_STORE_BACKEND, filepath,
+                                config.ALARM_JOURNAL_COMPACT_BYTES, config.ALARM_BIN_FILE)
         self.alarms = []
+        self._by_id = {}
+        self._next_id = 0
+        self.index = AlarmIndex()
+        self.scheduler = AlarmScheduler(self.index)
+
+        # 每次修改遞增，供 Web / MQTT 輸出快取判斷是否過期
+        self.version = 0
+        self.cache = RenderCache(self)
+
+        # 延遲寫入狀態
+        self.dirty = uasyncio.Event()  # 有尚未寫入的修改時 set()
+        self._dirty = False
+        self.persist_stats = {
+            "saves_requested": 0,
+            "writes": 0,
+            "writes_avoided": 0,
+            "write_errors": 0,
+            "last_flush_ms": 0,
+            "max_flush_ms": 0,
+            "compactions": 0,
+        }
         self.load()
 
     def load(self):
         """從檔案讀取鬧鐘"""
         try:
-            with open(self.filepath, "r") as f:
-                self.alarms = ujson.load(f)
-            print(f"[AlarmMgr] 載入 {len(self.alarms)} 個鬧鐘")
+            records = self.store.load()
+            log.info("載入 %s 個鬧鐘", len(records))
         except:
-            self.alarms = []
-            print("[AlarmMgr] 無設定檔或載入失敗，初始化為空")
+            records = []
+            log.warning("無設定檔或載入失敗，初始化為空")
+        self._assign_ids(records)
+        self.version += 1
+        self.index.rebuild(self.alarms)
+        self.scheduler.rebuild()
+
+    def _assign_ids(self, records):
+        """
+        把 JSON 記錄轉為 Alarm，並為沒有 id 的舊版資料配置固定 id
+        records: dict (JSON 後端) 或 Alarm (二進位後端) 的列表
+        """
+        self._next_id = 0
+        for d in records:
+            rid = d.id if isinstance(d, Alarm) else d.get("id")
+            if rid is not None:
+                self._next_id = max(self._next_id, rid + 1)
+        self.alarms = []
+        for d in records:
+            if isinstance(d, Alarm):
+                a = d
+            else:
+                a = Alarm.from_dict(d, self._next_id)
+                if "id" not in d:
+                    self._next_id += 1
+            if not valid_time(a.hour, a.minute):
+                # 損毀或舊版未驗證的記錄：略過，不讓整個設定檔無法載入
+                log.warning("略過時間無效的鬧鐘 id=%s (%s:%s)", a.id, a.hour, a.minute)
+                continue
+            self.alarms.append(a)
+        self._by_id = {a.id: a for a in self.alarms}
+
+    def export(self):
+        """轉為 JSON 格式的列表 (MQTT alarm_list 使用)"""
+        return [a.to_dict() for a in self.alarms]
+
+    def list_json(self):
+        """整份鬧鐘列表的 JSON 字串 (依版本號快取，MQTT alarm_list 與 SSE 事件共用)"""
+        return self.cache.get("list_json", lambda: ujson.dumps(self.export()))
+
+    def _publish_change(self):
+        """
+        發布 alarms 事件：鬧鐘不多時附上完整列表，
+        超過 RENDER_CACHE_MAX_ALARMS 時只送版本號與數量，由瀏覽器自行讀取 /api/alarms
+        """
+        if not bus.has_subscribers():
+            return
+        if len(self.alarms) <= config.RENDER_CACHE_MAX_ALARMS:
+            bus.publish("alarms", f'{{"version": {self.version}, "alarms": {self.list_json()}}}')
+        else:
+            bus.publish("alarms", {"version": self.version, "count": len(self.alarms)})
+
+    def iter_json(self):
+        """
+        逐筆產生 JSON 陣列片段 (供 /api/alarms 串流輸出，不必組出整份字串)
+        二進位後端且沒有未儲存修改時，直接從 alarms.bin 讀取記錄
+        """
+        reader = None if self._dirty else self.store.open_reader()
+        records = reader if reader is not None else self.alarms
+        try:
+            yield "["
+            for i, a in enumerate(records):
+                yield ("," if i else "") + ujson.dumps(a.to_dict())
+            yield "]"
+        finally:
+            if reader is not None:
+                reader.close()
 
     def save(self):
-        """寫入鬧鐘到檔案"""
+        """標記鬧鐘需要儲存 (實際寫入由 persist_task 合併處理)"""
+        self.version += 1
+        stats = self.persist_stats
+        stats["saves_requested"] += 1
+        if self._dirty:
+            stats["writes_avoided"] += 1
+        self._dirty = True
+        self.dirty.set()
+        self._publish_change()
+
+    def flush(self):
+        """
+        立即將未儲存的修改寫入檔案 (關機前或需要確保落地時呼叫)
+        返回: True 表示檔案已是最新狀態
+        """
+        if not self._dirty:
+            return True
+        stats = self.persist_stats
+        t0 = time.ticks_ms()
         try:
-            with open(self.filepath, "w") as f:
-                ujson.dump(self.alarms, f)
-            print("[AlarmMgr] 鬧鐘設定已儲存")
+            self.store.write(self.alarms)
         except Exception as e:
-            print(f"[AlarmMgr] 儲存失敗: {e}")
+            stats["write_errors"] += 1
+            log.error("儲存失敗: %s", e)
+            return False
+        self._dirty = False
+        self.dirty.clear()
+        elapsed = time.ticks_diff(time.ticks_ms(), t0)
+        stats["writes"] += 1
+        stats["last_flush_ms"] = elapsed
+        if elapsed > stats["max_flush_ms"]:
+            stats["max_flush_ms"] = elapsed
+        log.info("鬧鐘設定已儲存 (%s ms)", elapsed)
+        return True
 
-    def add_alarm(self, hour, minute, weekdays=None, enabled=True):
+    def is_dirty(self):
+        return self._dirty
+
+    def needs_compaction(self):
+        return self.store.needs_compaction()
+
+    def compact(self):
+        """把 journal 壓縮成新快照 (json 後端等同一次完整寫入)"""
+        if not self.flush():
+            return False
+        t0 = time.ticks_ms()
+        try:
+            self.store.compact(self.alarms)
+        except Exception as e:
+            self.persist_stats["write_errors"] += 1
+            log.error("壓縮失敗: %s", e)
+            return False
+        self.persist_stats["compactions"] += 1
+        log.info("journal 已壓縮 (%s ms)", time.ticks_diff(time.ticks_ms(), t0))
+        return True
+
+    def add_alarm(self, hour, minute, weekdays=None, enabled=True, song=0):
         """
         新增鬧鐘
         weekdays: list of strings ["Mon", "Tue"...] 或 None (單次)
+        song: 鈴聲名稱或編號 (見 config.SONGS)，無法辨識時拋出 ValueError
+        時分超出範圍時拋出 ValueError，不做任何修改
         """
-        if weekdays is None:
-            weekdays = []
-        
-        new_alarm = {
-            "hour": int(hour),
-            "minute": int(minute),
-            "weekdays": weekdays,
-            "enabled": enabled
-        }
-        self.alarms.append(new_alarm)
+        hour = int(hour)
+        minute = int(minute)
+        if not valid_time(hour, minute):
+            raise ValueError("hour/minute out of range")
+        self._add(hour, minute, days_to_mask(weekdays), enabled, songs.index_of(song))
         self.save()
         return len(self.alarms) - 1
 
     def delete_alarm(self, index):
         """刪除指定索引的鬧鐘"""
         if 0 <= index < len(self.alarms):
-            removed = self.alarms.pop(index)
+            removed = self._remove(index)
             self.save()
             return removed
         return None
 
+    def _add(self, hour, minute, days, enabled, song=0):
+        """加入鬧鐘並更新索引與 journal，不觸發儲存"""
+        new_alarm = Alarm(self._next_id, hour, minute, days, song=song)
+        new_alarm.enabled = enabled
+        self._next_id += 1
+        self.alarms.append(new_alarm)
+        self._by_id[new_alarm.id] = new_alarm
+        self.store.record("add", new_alarm.to_dict())
+        if enabled:
+            self.scheduler.add_slots(self.index.add(new_alarm))
+        return new_alarm
+
+    def _remove(self, index):
+        removed = self.alarms.pop(index)
+        self._by_id.pop(removed.id, None)
+        self.scheduler.remove_slots(self.index.remove(removed))
+        self.store.record("del", {"id": removed.id})
+        return removed
+
+    def _update(self, a, fields):
+        """修改鬧鐘欄位 (hour / minute / days / enabled / song)，先移出索引再依新時間排入"""
+        self.scheduler.remove_slots(self.index.remove(a))
+        for k, v in fields.items():
+            if k == "enabled":
+                a.enabled = v
+            else:
+                setattr(a, k, v)
+        if a.enabled:
+            self.scheduler.add_slots(self.index.add(a))
+        rec = {"id": a.id}
+        for k in fields:
+            if k == "days":
+                rec["weekdays"] = a.weekdays
+            else:
+                rec[k] = getattr(a, k)
+        self.store.record("set", rec)
+
+    def apply_batch(self, ops):
+        """
+        一次套用多筆操作 (POST /api/alarms/batch、MQTT alarm_batch)
+        ops: [{"op": "add", "hour": 8, "minute": 30, "weekdays": [...], "enabled": true, "song": "ode"},
+              {"op": "delete", "id": 3},
+              {"op": "update", "id": 3, "hour": 9, ...}, ...]
+        (也接受 MQTT alarm_add 的 h / m / days 寫法)
+
+        全部驗證通過才開始修改，任何一筆有誤則完全不套用；
+        套用後只呼叫一次 save()：一次版本遞增、一次寫入、一個 SSE 事件
+
+        返回: (成功與否, 結果 dict)
+        """
+        if not isinstance(ops, list):
+            return False, {"ok": False, "errors": [{"index": -1, "error": "ops must be a list"}]}
+        if len(ops) > config.ALARM_BATCH_MAX_OPS:
+            return False, {"ok": False, "errors": [{"index": -1, "error": f"too many ops (max {config.ALARM_BATCH_MAX_OPS})"}]}
+
+        # 1. 驗證並正規化
+        plan = []
+        errors = []
+        deleted = set()
+        for i, op in enumerate(ops):
+            try:
+                plan.append(self._validate_op(op, deleted))
+            except (ValueError, TypeError, KeyError) as e:
+                errors.append({"index": i, "error": str(e)})
+        if errors:
+            return False, {"ok": False, "errors": errors}
+
+        # 2. 套用 (已驗證，不會中途失敗)
+        results = []
+        for kind, arg, fields in plan:
+            if kind == "add":
+                a = self._add(fields["hour"], fields["minute"], fields["days"], fields["enabled"],
+                              fields.get("song", 0))
+                results.append({"op": "add", "id": a.id})
+            elif kind == "delete":
+                self._remove(self.index_of(arg))
+                results.append({"op": "delete", "id": arg})
+            else:
+                self._update(self._by_id[arg], fields)
+                results.append({"op": "update", "id": arg})
+        if plan:
+            self.save()
+        return True, {"ok": True, "version": self.version, "results": results}
+
+    def _validate_op(self, op, deleted):
+        """檢查單筆操作，返回 (kind, id, fields)；deleted 記錄本批次已刪除的 id"""
+        if not isinstance(op, dict):
+            raise ValueError("op must be an object")
+        kind = op.get("op")
+        if kind == "add":
+            fields = self._parse_fields(op)
+            if "hour" not in fields or "minute" not in fields:
+                raise ValueError("add requires hour and minute")
+            fields.setdefault("days", 0)
+            fields.setdefault("enabled", True)
+            return kind, None, fields
+        if kind in ("delete", "update"):
+            alarm_id = int(op["id"])
+            if alarm_id not in self._by_id or alarm_id in deleted:
+                raise ValueError(f"alarm {alarm_id} not found")
+            if kind == "delete":
+                deleted.add(alarm_id)
+                return kind, alarm_id, None
+            fields = self._parse_fields(op)
+            if not fields:
+                raise ValueError("update has no fields")
+            return kind, alarm_id, fields
+        raise ValueError(f"unknown op {kind}")
+
+    def _parse_fields(self, op):
+        fields = {}
+        hour = op.get("hour", op.get("h"))
+        minute = op.get("minute", op.get("m"))
+        if hour is not None:
+            fields["hour"] = int(hour)
+            if not 0 <= fields["hour"] < 24:
+                raise ValueError("hour out of range")
+        if minute is not None:
+            fields["minute"] = int(minute)
+            if not 0 <= fields["minute"] < 60:
+                raise ValueError("minute out of range")
+        days = op.get("weekdays", op.get("days"))
+        if days is not None:
+            if not isinstance(days, list):
+                raise ValueError("weekdays must be a list")
+            fields["days"] = days_to_mask(days)
+        if "enabled" in op:
+            fields["enabled"] = bool(op["enabled"])
+        if "song" in op:
+            fields["song"] = songs.index_of(op["song"])
+        return fields
+
     def get_all(self):
         return self.alarms
 
+    def get_by_id(self, alarm_id):
+        return self._by_id.get(alarm_id)
+
+    def index_of(self, alarm_id):
+        """由 id 找出目前的列表索引，找不到返回 -1"""
+        for i, a in enumerate(self.alarms):
+            if a.id == alarm_id:
+                return i
+        return -1
+
+    def reschedule(self, now=None):
+        """依目前時間重建排程 (NTP 同步後或時間跳動時呼叫)"""
+        self.scheduler.rebuild(now)
+
+    def due_now(self, now=None):
+        """以分鐘槽索引 O(1) 查詢此刻 (同一分鐘內) 應響的鬧鐘"""
+        t = time.localtime(now)
+        return [self._by_id[i] for i in self.index.ids_at(slot_of(t[6], t[3], t[4]))]
+
+    def next_alarm(self):
+        """
+        下一次響鈴 (排程器堆積頂端，O(1))
+        返回: (fire_epoch, [alarm, ...]) 或 None
+        """
+        head = self.scheduler.peek()
+        if head is None:
+            return None
+        fire, slot = head
+        return fire, [self._by_id[i] for i in self.index.ids_at(slot)]
+
+    def pop_due(self, now):
+        """
+        取出到期 (含錯過) 的鬧鐘，分鐘槽會自動排入下一週
+        返回: [(alarm, fire_epoch), ...]
+        """
+        due = []
+        for slot, fire in self.scheduler.pop_due(now):
+            for alarm_id in self.index.ids_at(slot):
+                due.append((self._by_id[alarm_id], fire))
+        return due
+
+    def set_enabled(self, index, enabled):
+        """啟用或停用指定索引的鬧鐘，返回是否成功"""
+        if not 0 <= index < len(self.alarms):
+            return False
+        a = self.alarms[index]
+        enabled = bool(enabled)
+        if a.enabled == enabled:
+            return True
+        a.enabled = enabled
+        if enabled:
+            self.scheduler.add_slots(self.index.add(a))
+        else:
+            self.scheduler.remove_slots(self.index.remove(a))
+        self.store.record("set", {"id": a.id, "enabled": enabled})
+        self.save()
+        return True
+
     def disable_single_shot(self, index):
         """停用單次鬧鐘 (響鈴後呼叫)"""
         if 0 <= index < len(self.alarms):
-            if not self.alarms[index].get("weekdays"):
-                self.alarms[index]["enabled"] = False
-                self.save()
+            if self.alarms[index].is_once():
+                self.set_enabled(index, False)
 
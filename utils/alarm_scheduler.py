@@ -0,0 +1,118 @@
+"""
+utils/alarm_scheduler.py - 鬧鐘排程器 (Min-Heap)
+以最小堆積維護每個「有鬧鐘的分鐘槽」的下一次觸發時間 (epoch 秒)，
+讓 alarm_check_task 只需睡到最早的槽到期；到期時再由 AlarmIndex
+以 O(1) 查出該槽的鬧鐘，不必每秒掃描全部鬧鐘
+"""
+
+import time
+import uasyncio
+from utils.alarm_index import SLOTS_PER_WEEK
+
+try:
+    import heapq
+except ImportError:
+    import uheapq as heapq
+
+WEEK_SEC = SLOTS_PER_WEEK * 60
+
+
+def next_slot_time(slot, now):
+    """
+    計算分鐘槽在 now 之後的下一次觸發時間
+
+    返回: epoch 秒
+    """
+    now = int(now)
+    t = time.localtime(now)
+    cur = t[6] * 1440 + t[3] * 60 + t[4]
+    fire = now - t[5] + ((slot - cur) % SLOTS_PER_WEEK) * 60
+    if fire <= now:
+        fire += WEEK_SEC
+    return fire
+
+
+class AlarmScheduler:
+    """
+    以最小堆積維護 (觸發時間, 分鐘槽)
+    刪除與重新排程採「延遲刪除」：_fire 記錄每個槽目前有效的觸發時間，
+    堆積頂端與 _fire 不一致的項目視為過期，取出時直接丟棄
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._heap = []
+        self._fire = {}  # slot -> fire_epoch
+        # 最早觸發時間提前時 set()，讓睡眠中的 alarm_check_task 重新計算
+        self.changed = uasyncio.Event()
+
+    def __len__(self):
+        return len(self._fire)
+
+    def rebuild(self, now=None):
+        """依目前時間重新計算所有槽 (開機、NTP 同步或時間跳動後呼叫)"""
+        if now is None:
+            now = time.time()
+        self._fire = {s: next_slot_time(s, now) for s in self.index.occupied()}
+        self._heap = [(f, s) for s, f in self._fire.items()]
+        heapq.heapify(self._heap)
+        self.changed.set()
+
+    def add_slots(self, slots, now=None):
+        """排入新出現的分鐘槽"""
+        if not slots:
+            return
+        if now is None:
+            now = time.time()
+        head = self.next_due()
+        earliest = None
+        for slot in slots:
+            fire = next_slot_time(slot, now)
+            self._fire[slot] = fire
+            heapq.heappush(self._heap, (fire, slot))
+            if earliest is None or fire < earliest:
+                earliest = fire
+        if head is None or earliest < head:
+            self.changed.set()
+
+    def remove_slots(self, slots):
+        """移除已無鬧鐘的槽 (堆積中的項目留待取出時丟棄)"""
+        for slot in slots:
+            self._fire.pop(slot, None)
+        # 過期項目過多時重建堆積，避免無限成長
+        if len(self._heap) > 2 * len(self._fire) + 8:
+            self._heap = [(f, s) for s, f in self._fire.items()]
+            heapq.heapify(self._heap)
+
+    def _prune(self):
+        heap = self._heap
+        while heap and self._fire.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_due(self):
+        """返回最早的觸發時間，沒有排程時返回 None"""
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def peek(self):
+        """返回 (最早的觸發時間, 分鐘槽)，沒有排程時返回 None"""
+        self._prune()
+        return self._heap[0] if self._heap else None
+
+    def pop_due(self, now):
+        """
+        取出所有觸發時間 <= now 的槽 (包含錯過的)，並排入下一週
+        返回: [(slot, fire_epoch), ...]，依觸發時間排序
+        """
+        due = []
+        self._prune()
+        while self._heap and self._heap[0][0] <= now:
+            fire, slot = heapq.heappop(self._heap)
+            due.append((slot, fire))
+            nxt = fire + WEEK_SEC
+            if nxt <= now:
+                nxt = next_slot_time(slot, now)
+            self._fire[slot] = nxt
+            heapq.heappush(self._heap, (nxt, slot))
+            self._prune()
+        return due
@@ -0,0 +1,278 @@
+"""
+utils/alarm_store.py - 鬧鐘設定檔儲存層
+以「寫入暫存檔 -> rename 覆蓋」的方式寫入，斷電時不會留下寫到一半的 alarms.json
+
+提供三種後端 (由 config.ALARM_STORE_BACKEND 選擇)：
+  json    : 每次寫入整份 alarms.json
+  journal : alarms.json 作為快照，每筆修改以一行 JSON 附加到 alarms.json.log，
+            log 超過 ALARM_JOURNAL_COMPACT_BYTES 時再壓縮回快照
+  binary  : 固定長度記錄的 alarms.bin (見 utils.alarm_binfile)
+json 與 journal 讀取時都會「快照 + 重播 log」，因此可以互相切換；
+binary 在 alarms.bin 不存在時會讀取舊的 alarms.json 以便移轉
+
+write() / compact() 接收 Alarm 物件列表，由各後端自行轉換格式
+"""
+
+import ujson
+import os
+from utils.log import get_logger
+
+log = get_logger("Store")
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+def atomic_write(path, write_fn, mode="w"):
+    """
+    先寫到 path + ".tmp"，完成後再 rename 成正式檔名
+    write_fn(f): 負責把內容寫入已開啟的檔案
+    """
+    tmp = path + ".tmp"
+    with open(tmp, mode) as f:
+        write_fn(f)
+    try:
+        os.rename(tmp, path)  # LittleFS 的 rename 會直接覆蓋目的檔
+    except OSError:
+        # FAT 不允許覆蓋：先刪除舊檔 (若此時斷電，load 會改讀 .tmp)
+        os.remove(path)
+        os.rename(tmp, path)
+
+
+def apply_record(alarms, rec):
+    """
+    將一筆 journal 記錄套用到鬧鐘列表
+    所有操作都是冪等的：壓縮途中斷電而重播到已包含該修改的快照也不會出錯
+    """
+    op = rec.get("op")
+    if op == "add":
+        a = rec["a"]
+        for i, old in enumerate(alarms):
+            if old.get("id") == a["id"]:
+                alarms[i] = a
+                return
+        alarms.append(a)
+    elif op == "del":
+        for i, old in enumerate(alarms):
+            if old.get("id") == rec["id"]:
+                alarms.pop(i)
+                return
+    elif op == "set":
+        for old in alarms:
+            if old.get("id") == rec["id"]:
+                for k, v in rec.items():
+                    if k not in ("op", "id"):
+                        old[k] = v
+                return
+
+
+def assign_missing_ids(alarms):
+    """
+    為舊版快照中沒有 id 的記錄依順序配置 id (從快照內最大 id + 1 起算)
+    只由快照內容決定，每次開機結果相同，journal 中以 id 指定的 del / set 才能對上
+    """
+    next_id = 0
+    for a in alarms:
+        if a.get("id") is not None:
+            next_id = max(next_id, a["id"] + 1)
+    for a in alarms:
+        if a.get("id") is None:
+            a["id"] = next_id
+            next_id += 1
+
+
+def _dump_alarms(alarms, f):
+    """逐筆寫出 JSON 陣列，不必先建立整份 dict 列表"""
+    f.write("[")
+    for i, a in enumerate(alarms):
+        if i:
+            f.write(", ")
+        ujson.dump(a.to_dict(), f)
+    f.write("]")
+
+
+class JsonStore:
+    """整份鬧鐘列表存成單一 JSON 檔"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.log_path = filepath + ".log"
+        self._torn = False  # log 末端有斷電留下的半行記錄
+
+    def load(self):
+        """
+        讀取鬧鐘列表 (快照 + 重播 log)
+        正式檔損毀或不存在時，改讀上次未完成 rename 的暫存檔
+
+        返回: list，快照與 log 皆無法讀取時拋出例外
+        """
+        alarms = self._load_snapshot()
+        has_log = _exists(self.log_path)
+        if alarms is None:
+            if not has_log:
+                raise OSError("no valid alarm file")
+            alarms = []
+        # 舊版 alarms.json 沒有 id：先在快照上配置，再重播 log
+        assign_missing_ids(alarms)
+        if has_log:
+            self._replay_log(alarms)
+        return alarms
+
+    def _load_snapshot(self):
+        for path in (self.filepath, self.filepath + ".tmp"):
+            if not _exists(path):
+                continue
+            try:
+                with open(path, "r") as f:
+                    return ujson.load(f)
+            except Exception as e:
+                log.error("讀取 %s 失敗: %s", path, e)
+                if path == self.filepath:
+                    # 保留損毀檔供人工檢查，避免下次儲存時被覆蓋
+                    try:
+                        os.rename(path, path + ".bad")
+                        log.warning("損毀檔已另存為 %s.bad", path)
+                    except OSError:
+                        pass
+        return None
+
+    def _replay_log(self, alarms):
+        """在快照上依序重播 log 記錄 (直接修改 alarms)"""
+        count = 0
+        with open(self.log_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = ujson.loads(line)
+                except ValueError:
+                    # 斷電時只寫了一半的記錄：略過，下次附加時先補上換行
+                    log.warning("journal 有不完整的記錄，已略過")
+                    self._torn = True
+                    continue
+                apply_record(alarms, rec)
+                count += 1
+        log.info("重播 %s 筆 journal 記錄", count)
+
+    def record(self, op, data):
+        """JSON 後端每次都寫入整份列表，不需要記錄個別修改"""
+        pass
+
+    def open_reader(self):
+        """可逐筆讀取檔案內容的 reader；此後端不支援時返回 None"""
+        return None
+
+    def write(self, alarms):
+        atomic_write(self.filepath, lambda f: _dump_alarms(alarms, f))
+        # 快照已包含所有修改，舊的 journal (切換後端前留下的) 可以丟棄
+        if _exists(self.log_path):
+            os.remove(self.log_path)
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, alarms):
+        self.write(alarms)
+
+
+class JournalStore(JsonStore):
+    """alarms.json 快照 + 附加式 journal，修改成本與鬧鐘數量無關"""
+
+    def __init__(self, filepath, compact_bytes=8192):
+        super().__init__(filepath)
+        self.compact_bytes = compact_bytes
+        self._pending = []
+        self.log_size = _file_size(self.log_path)
+
+    def record(self, op, data):
+        """
+        記錄一筆修改 (立即序列化，之後修改 dict 不影響記錄內容)
+        op: "add" (data 為完整鬧鐘)、"del" 或 "set" (data 含 id 與要修改的欄位)
+        """
+        if op == "add":
+            rec = {"op": op, "a": data}
+        else:
+            rec = {"op": op}
+            rec.update(data)
+        self._pending.append(ujson.dumps(rec))
+
+    def write(self, alarms):
+        """把累積的記錄一次附加到 log (不重寫快照)"""
+        if not self._pending:
+            return
+        data = "\n".join(self._pending) + "\n"
+        if self._torn:
+            data = "\n" + data
+            self._torn = False
+        with open(self.log_path, "a") as f:
+            f.write(data)
+        self._pending = []
+        self.log_size += len(data)
+
+    def needs_compaction(self):
+        return self.log_size >= self.compact_bytes
+
+    def compact(self, alarms):
+        """將目前狀態寫成新快照並清空 log"""
+        atomic_write(self.filepath, lambda f: _dump_alarms(alarms, f))
+        if _exists(self.log_path):
+            os.remove(self.log_path)
+        self._pending = []
+        self._torn = False
+        self.log_size = 0
+
+
+class BinaryStore(JsonStore):
+    """
+    固定長度記錄的 alarms.bin
+    load() 直接產生 Alarm 物件；alarms.bin 不存在時讀取 alarms.json (舊格式移轉)
+    """
+
+    def __init__(self, filepath, bin_path):
+        super().__init__(filepath)
+        self.bin_path = bin_path
+
+    def load(self):
+        from utils.alarm_binfile import AlarmFile
+        if not _exists(self.bin_path):
+            log.warning("找不到 %s，改讀 %s (下次儲存時轉為二進位)", self.bin_path, self.filepath)
+            return super().load()
+        with AlarmFile(self.bin_path) as af:
+            return list(af)
+
+    def open_reader(self):
+        from utils.alarm_binfile import AlarmFile
+        if not _exists(self.bin_path):
+            return None
+        return AlarmFile(self.bin_path)
+
+    def write(self, alarms):
+        from utils.alarm_binfile import write_alarms
+        write_alarms(self.bin_path, alarms)
+
+    def compact(self, alarms):
+        self.write(alarms)
+
+
+def make_store(backend, filepath, compact_bytes=8192, bin_path="alarms.bin"):
+    """依 config.ALARM_STORE_BACKEND 建立儲存後端"""
+    if backend == "journal":
+        return JournalStore(filepath, compact_bytes)
+    if backend == "binary":
+        return BinaryStore(filepath, bin_path)
+    if backend != "json":
+        log.warning("未知的儲存後端 %s，改用 json", backend)
+    return JsonStore(filepath)
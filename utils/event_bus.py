@@ -0,0 +1,61 @@
+"""
+utils/event_bus.py - 系統事件的單一發布點
+AlarmManager 與各任務把狀態變化 (鬧鐘列表、響鈴、時鐘、感測器) 發布到 bus，
+訂閱者 (目前為 /api/events 的 SSE 連線) 各自擁有固定長度的佇列：
+讀太慢時丟棄最舊的事件，不會讓發布端阻塞，也不會讓記憶體無限成長
+
+事件在發布時只序列化一次 (SSE 格式的 bytes)，所有訂閱者共用同一份內容
+retain=True 的事件 (例如溫溼度，每 DHT11_POLL_INTERVAL_SEC 才更新) 會保留最後一筆，
+新的訂閱者一連上就先收到，不必等下一次發布
+"""
+
+import ujson
+from utils.ring_queue import RingQueue, DROP_OLDEST
+
+
+class EventBus:
+    def __init__(self):
+        self._subs = []
+        self._seq = 0
+        self._retained = {}  # name -> 最後一筆 frame
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, size=8):
+        """返回訂閱者的 RingQueue (滿了覆蓋最舊的事件)"""
+        sub = RingQueue(size, DROP_OLDEST)
+        for frame in self._retained.values():
+            sub.put(frame)
+        self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub in self._subs:
+            self._subs.remove(sub)
+            self.stats["dropped"] += sub.dropped
+
+    def has_subscribers(self):
+        """沒有訂閱者時發布端可略過組資料的成本"""
+        return bool(self._subs)
+
+    def publish(self, name, data, retain=False):
+        """
+        發布事件 (同步、不阻塞)
+        data: 可序列化為 JSON 的物件，或已序列化好的 JSON 字串
+        retain: 保留為該事件的最後一筆，之後的訂閱者連上時先收到
+        """
+        if not self._subs and not retain:
+            return
+        self._seq += 1
+        if not isinstance(data, str):
+            data = ujson.dumps(data)
+        frame = f"id: {self._seq}\nevent: {name}\ndata: {data}\n\n".encode("utf-8")
+        if retain:
+            self._retained[name] = frame
+        for sub in self._subs:
+            sub.put(frame)
+        self.stats["published"] += 1
+        self.stats["delivered"] += len(self._subs)
+
+
+# 全系統共用的 bus
+bus = EventBus()
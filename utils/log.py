@@ -0,0 +1,149 @@
+"""
+utils/log.py - 分級、環形緩衝的輕量 logger
+取代各模組的 print()：ESP32 上 print 經 UART 輸出，每行會阻塞數毫秒
+
+  log = get_logger("MQTT")
+  log.debug("收到 %s (%d bytes)", topic, len(msg))
+
+- 低於 LOG_LEVEL 的呼叫只做一次整數比較就返回，參數不會被格式化
+  (請傳入參數而非預先組好的 f-string，才能省下格式化成本)
+- 記錄保存在長度 LOG_BUFFER_LEN 的環形緩衝區，可由 /api/logs 或 MQTT log_get 讀出
+- 達到 LOG_ECHO_LEVEL 的記錄才同時 print 到序列埠 (格式與原本的 "[Tag] 訊息" 相同)
+"""
+
+import time
+import config
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_LEVELS = {v: k for k, v in LEVEL_NAMES.items()}
+
+# 模組層級狀態 (所有 logger 共用)
+_level = _LEVELS.get(config.LOG_LEVEL, INFO)
+_echo_level = _LEVELS.get(config.LOG_ECHO_LEVEL, INFO)
+_ring = [None] * config.LOG_BUFFER_LEN
+_seq = 0  # 下一筆記錄的序號 (單調遞增，讀取端用來接續)
+_loggers = {}
+
+stats = {"records": 0, "echoed": 0}
+
+
+def level_of(name):
+    """"DEBUG" -> 10，無法辨識時返回 None"""
+    if isinstance(name, int):
+        return name
+    return _LEVELS.get(str(name).upper())
+
+
+def set_level(level, echo=None):
+    """調整記錄等級 (與序列埠輸出等級)，可傳入名稱或數值"""
+    global _level, _echo_level
+    lv = level_of(level)
+    if lv is not None:
+        _level = lv
+    if echo is not None:
+        lv = level_of(echo)
+        if lv is not None:
+            _echo_level = lv
+
+
+def get_level():
+    return LEVEL_NAMES.get(_level, str(_level))
+
+
+def _emit(level, name, msg, args):
+    global _seq
+    if args:
+        try:
+            msg = msg % args
+        except Exception:
+            msg = f"{msg} {args}"
+    _ring[_seq % len(_ring)] = (_seq, time.ticks_ms(), level, name, msg)
+    _seq += 1
+    stats["records"] += 1
+    if level >= _echo_level:
+        stats["echoed"] += 1
+        print(f"[{name}] {msg}")
+
+
+def records(since=0, min_level=DEBUG, limit=None):
+    """
+    返回序號 >= since 且等級 >= min_level 的記錄 (由舊到新)
+    每筆為 (seq, ticks_ms, level, name, msg)；已被覆蓋的舊記錄會被略過
+    """
+    size = len(_ring)
+    start = max(since, _seq - size, 0)
+    out = []
+    for seq in range(start, _seq):
+        rec = _ring[seq % size]
+        if rec is not None and rec[2] >= min_level:
+            out.append(rec)
+    if limit is not None and len(out) > limit:
+        out = out[-limit:]
+    return out
+
+
+def next_seq():
+    return _seq
+
+
+def to_dicts(recs):
+    """轉為 JSON 友善的格式 (Web / MQTT 輸出)"""
+    return [{"seq": r[0], "ms": r[1], "lvl": LEVEL_NAMES.get(r[2], r[2]), "src": r[3], "msg": r[4]}
+            for r in recs]
+
+
+def snapshot(since=0, min_level=DEBUG, limit=None):
+    """/api/logs 與 MQTT log_get 的回應內容；next 供下次以 since 接續讀取"""
+    lv = level_of(min_level)
+    return {
+        "level": get_level(),
+        "next": _seq,
+        "records": to_dicts(records(since, DEBUG if lv is None else lv, limit)),
+    }
+
+
+class Logger:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def enabled(self, level):
+        """組參數本身就很昂貴時，先以此判斷"""
+        return level >= _level
+
+    def debug(self, msg, *args):
+        if DEBUG >= _level:
+            _emit(DEBUG, self.name, msg, args)
+
+    def info(self, msg, *args):
+        if INFO >= _level:
+            _emit(INFO, self.name, msg, args)
+
+    def warning(self, msg, *args):
+        if WARNING >= _level:
+            _emit(WARNING, self.name, msg, args)
+
+    def error(self, msg, *args):
+        if ERROR >= _level:
+            _emit(ERROR, self.name, msg, args)
+
+    def exception(self, e, msg, *args):
+        """記錄錯誤並在序列埠印出 traceback"""
+        self.error(msg + ": %s", *(args + (e,)))
+        import sys
+        if hasattr(sys, "print_exception"):
+            sys.print_exception(e)
+
+
+def get_logger(name):
+    """同名 logger 共用同一個物件"""
+    lg = _loggers.get(name)
+    if lg is None:
+        lg = _loggers[name] = Logger(name)
+    return lg
@@ -0,0 +1,146 @@
+"""
+utils/metrics.py - 事件迴圈延遲與任務耗時統計 (/api/metrics、MQTT metrics)
+
+  t0 = time.ticks_us()
+  ...                                   # 任務一輪的工作
+  metrics.since("task.display", t0)     # 記入固定分桶的直方圖
+
+- 直方圖的分桶上限固定為 METRICS_BUCKETS_MS，observe() 只做幾次整數比較，不配置記憶體
+- lag_monitor() 每 METRICS_LAG_INTERVAL_MS 睡一次，實際醒來的延遲即為 uasyncio 的排程延遲；
+  某個任務長時間不 await 時，loop_lag 的尾端分桶會先反映出來
+- 各模組既有的統計 dict (連線數、佇列、寫入次數...) 以 register() 登記，snapshot() 時才讀取
+"""
+
+import time
+import gc
+import uasyncio
+import config
+
+_BOUNDS_US = tuple(ms * 1000 for ms in config.METRICS_BUCKETS_MS)
+
+
+class Histogram:
+    """固定分桶的延遲直方圖 (單位 us)；最後一格為超過最大分桶上限的次數"""
+
+    __slots__ = ("counts", "count", "total_us", "max_us")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS_US) + 1)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def observe(self, us):
+        i = 0
+        for b in _BOUNDS_US:
+            if us <= b:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def quantile_ms(self, q):
+        """依分桶估計分位數 (返回該分桶的上限；落在最後一格時返回最大值)"""
+        if not self.count:
+            return 0
+        need = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= need:
+                if i < len(_BOUNDS_US):
+                    return config.METRICS_BUCKETS_MS[i]
+                break
+        return self.max_us // 1000
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "avg_us": self.total_us // self.count if self.count else 0,
+            "max_us": self.max_us,
+            "p50_ms": self.quantile_ms(0.5),
+            "p99_ms": self.quantile_ms(0.99),
+            "buckets": self.counts,
+        }
+
+
+# 模組層級狀態
+_hists = {}
+_counters = {}
+_providers = []  # [(名稱, 返回 dict 的函式), ...]
+_boot_ms = time.ticks_ms()
+
+
+def histogram(name):
+    """取得 (必要時建立) 名為 name 的直方圖"""
+    h = _hists.get(name)
+    if h is None:
+        h = _hists[name] = Histogram()
+    return h
+
+
+def observe(name, us):
+    if config.METRICS_ENABLED:
+        histogram(name).observe(us)
+
+
+def since(name, t0):
+    """記入從 t0 (time.ticks_us()) 到現在的耗時"""
+    if config.METRICS_ENABLED:
+        histogram(name).observe(time.ticks_diff(time.ticks_us(), t0))
+
+
+def inc(name, n=1):
+    _counters[name] = _counters.get(name, 0) + n
+
+
+def register(name, provider):
+    """
+    登記一個統計來源，snapshot() 時呼叫
+    provider: 無參數、返回 dict 的函式 (例如 web_server.conn_stats)，或直接傳入統計 dict
+    """
+    for i, (n, _) in enumerate(_providers):
+        if n == name:
+            _providers[i] = (name, provider)
+            return
+    _providers.append((name, provider))
+
+
+def _heap():
+    try:
+        return gc.mem_free(), gc.mem_alloc()
+    except AttributeError:
+        return 0, 0
+
+
+def snapshot():
+    """/api/metrics 與 MQTT metrics 的內容"""
+    free, alloc = _heap()
+    doc = {
+        "uptime_s": time.ticks_diff(time.ticks_ms(), _boot_ms) // 1000,
+        "heap_free": free,
+        "heap_alloc": alloc,
+        "bucket_ms": config.METRICS_BUCKETS_MS,
+        "counters": dict(_counters),
+        "latency": {name: h.to_dict() for name, h in _hists.items()},
+    }
+    for name, provider in _providers:
+        try:
+            doc[name] = provider() if callable(provider) else dict(provider)
+        except Exception as e:
+            doc[name] = {"error": str(e)}
+    return doc
+
+
+async def lag_monitor():
+    """量測 uasyncio 排程延遲：預定睡 interval，多睡的部分就是其他任務佔用 CPU 的時間"""
+    interval = config.METRICS_LAG_INTERVAL_MS
+    lag = histogram("loop_lag")
+    while True:
+        t0 = time.ticks_us()
+        await uasyncio.sleep_ms(interval)
+        late = time.ticks_diff(time.ticks_us(), t0) - interval * 1000
+        lag.observe(late if late > 0 else 0)
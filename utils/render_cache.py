@@ -0,0 +1,41 @@
+"""
+utils/render_cache.py - 以鬧鐘版本號為 key 的輸出快取
+Web 頁面、/api/alarms JSON 與 MQTT alarm_list 的內容只在鬧鐘變動時才改變，
+因此以 AlarmManager.version 判斷快取是否有效；版本不變時直接回傳上次的結果
+"""
+
+import random
+
+# 每次開機不同，避免重開機後版本號歸零而與瀏覽器快取的 ETag 撞號
+BOOT_ID = random.getrandbits(24)
+
+
+class RenderCache:
+    def __init__(self, source):
+        """source: 具有 version 屬性的物件 (AlarmManager)"""
+        self.source = source
+        self._entries = {}  # key -> (version, value)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, build):
+        """
+        取得快取內容，版本不符時呼叫 build() 重新產生
+        build: 無參數函式，返回要快取的內容
+        """
+        version = self.source.version
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.stats["hits"] += 1
+            return entry[1]
+        self.stats["misses"] += 1
+        # 先釋放舊內容再建立新的，降低峰值記憶體
+        self._entries.pop(key, None)
+        value = build()
+        self._entries[key] = (version, value)
+        return value
+
+    def etag(self):
+        return f'"{BOOT_ID:06x}-{self.source.version}"'
+
+    def clear(self):
+        self._entries = {}
@@ -0,0 +1,248 @@
+"""
+utils/ring_controller.py - 響鈴控制器 (獨立任務的狀態機)
+
+alarm_check_task 只呼叫 trigger() 就繼續檢查下一個鬧鐘，響鈴期間不會漏掉其他鬧鐘；
+控制器自己的任務負責播放、停止與貪睡：
+
+  idle --trigger--> ringing --stop / 逾時--> idle
+                       |
+                       +--snooze--> snoozed --SNOOZE_MINUTES 到--> ringing
+                                       |
+                                       +--stop (取消該鬧鐘的貪睡) / stop_all (取消所有貪睡)--> idle
+
+- 觸發、停止、貪睡都是排入同一個佇列的指令 (不阻塞，可從按鈕、Web、MQTT 呼叫)
+- 響鈴中再有鬧鐘到期時排在後面，目前的響鈴結束後接著響；同一個鬧鐘重複觸發會合併
+- stop 只結束響鈴中的鬧鐘 (沒有響鈴時取消最近一次貪睡的鬧鐘)，其他鬧鐘的貪睡不受影響；
+  stop_all 才會連同所有貪睡一起取消
+- 停止按鈕：按下立即靜音並貪睡 (SNOOZE_MINUTES 為 0 或已達 SNOOZE_MAX_COUNT 次時直接停止)，
+  長按為 stop_all
+- 觸發到發聲 (ring.trigger_to_sound)、停止指令到靜音 (ring.stop_to_silence) 的延遲記錄於 metrics
+"""
+
+import uasyncio
+import time
+import config
+from utils.ring_queue import RingQueue, DROP_NEWEST
+from utils.event_bus import bus
+import utils.metrics as metrics
+from utils.songs import library as songs
+from utils.log import get_logger
+
+log = get_logger("Ring")
+
+IDLE = "idle"
+RINGING = "ringing"
+SNOOZED = "snoozed"
+
+
+class RingController:
+    def __init__(self, buzzer, btn_stop=None, sys_state=None):
+        """
+        buzzer: hardware.buzzer.Buzzer
+        btn_stop: hardware.button.Button (None 表示只由 Web / MQTT 控制)
+        sys_state: 共用狀態 dict，響鈴時 sys_state["ringing"] 為 True
+        """
+        self.buzzer = buzzer
+        self.btn = btn_stop
+        self.sys_state = sys_state
+        self.state = IDLE
+        self._cmds = RingQueue(config.RING_QUEUE_LEN, DROP_NEWEST)
+        self._pending = []     # 等待響鈴的 (alarm, 觸發時間 ticks_us 或 None, 已貪睡次數)
+        self._snoozed = []     # [(喚醒時間 ticks_ms, alarm, 已貪睡次數), ...]
+        self.current = None    # 響鈴中的 (alarm, 已貪睡次數)
+        self._deadline = 0     # 響鈴逾時的 ticks_ms
+        self._play = None
+        self.stats = {"triggers": 0, "merged": 0, "rings": 0, "snoozes": 0, "stops": 0, "timeouts": 0}
+
+    # ---------- 指令 (同步、不阻塞) ----------
+
+    def _put(self, cmd):
+        if not self._cmds.put(cmd):
+            log.warning("指令佇列已滿，丟棄 %s", cmd[0])
+            return False
+        return True
+
+    def trigger(self, alarm):
+        """鬧鐘到期 (由 alarm_check_task 呼叫)"""
+        self.stats["triggers"] += 1
+        return self._put(("trigger", alarm, time.ticks_us()))
+
+    def stop(self, source="web", t=None):
+        """停止響鈴中的鬧鐘；沒有響鈴時取消最近一次的貪睡。t: 指令發生時間 (ticks_ms)，用於量測靜音延遲"""
+        return self._put(("stop", source, time.ticks_ms() if t is None else t))
+
+    def stop_all(self, source="web", t=None):
+        """停止響鈴並取消所有貪睡"""
+        return self._put(("stop_all", source, time.ticks_ms() if t is None else t))
+
+    def snooze(self, source="web", t=None):
+        """貪睡 SNOOZE_MINUTES 分鐘後再響"""
+        return self._put(("snooze", source, time.ticks_ms() if t is None else t))
+
+    def status(self):
+        """目前狀態 (/api/ring、MQTT ring_control 的回覆)"""
+        now = time.ticks_ms()
+        return {
+            "state": self.state,
+            "id": self.current[0].id if self.current else None,
+            "pending": [p[0].id for p in self._pending],
+            "snoozed": [{"id": a.id, "in_sec": max(time.ticks_diff(w, now), 0) // 1000, "count": n}
+                        for w, a, n in self._snoozed],
+        }
+
+    # ---------- 控制器任務 ----------
+
+    async def run(self):
+        if self.btn is not None:
+            uasyncio.create_task(self._button_loop())
+        while True:
+            cmd = await self._cmds.get(self._timeout())
+            # 單一指令出錯 (例如設定值錯誤、找不到曲目) 只記錄下來，控制器任務繼續處理之後的指令
+            try:
+                await self._handle(cmd)
+            except Exception as e:
+                log.exception(e, "處理指令失敗 (%s)", cmd[0] if cmd else "timeout")
+            self._set_state()
+
+    async def _handle(self, cmd):
+        """處理一個指令 (None 表示等待逾時)，再喚醒到期的貪睡、開始下一個響鈴"""
+        if cmd is None:
+            if self.current is not None and time.ticks_diff(self._deadline, time.ticks_ms()) <= 0:
+                log.info("響鈴超時自動停止")
+                self.stats["timeouts"] += 1
+                await self._end("timeout", None)
+        else:
+            kind = cmd[0]
+            if kind == "trigger":
+                self._enqueue(cmd[1], cmd[2], 0)
+            elif kind == "stop":
+                await self._on_stop(cmd[1], cmd[2])
+            elif kind == "stop_all":
+                await self._on_stop_all(cmd[1], cmd[2])
+            elif kind == "snooze":
+                await self._on_snooze(cmd[1], cmd[2])
+
+        self._wake_snoozed()
+        if self.current is None and self._pending:
+            self._start(*self._pending.pop(0))
+
+    def _timeout(self):
+        """等待指令的最長時間 (秒)：響鈴逾時或最早的貪睡到期，兩者都沒有時無限等待"""
+        now = time.ticks_ms()
+        deadlines = [w for w, _, _ in self._snoozed]
+        if self.current is not None:
+            deadlines.append(self._deadline)
+        if not deadlines:
+            return None
+        remain = min(time.ticks_diff(d, now) for d in deadlines)
+        return max(remain, 0) / 1000
+
+    def _enqueue(self, alarm, t_us, snoozes):
+        if (self.current is not None and self.current[0].id == alarm.id) or \
+                any(p[0].id == alarm.id for p in self._pending):
+            self.stats["merged"] += 1
+            return
+        if self.current is not None:
+            t_us = None  # 排在其他響鈴之後：發聲延遲改從輪到它時起算
+        self._pending.append((alarm, t_us, snoozes))
+
+    def _wake_snoozed(self):
+        now = time.ticks_ms()
+        for item in list(self._snoozed):
+            if time.ticks_diff(item[0], now) <= 0:
+                self._snoozed.remove(item)
+                log.info("貪睡結束，再次響鈴 (id=%s)", item[1].id)
+                self._enqueue(item[1], time.ticks_us(), item[2])
+
+    def _set_state(self):
+        if self.current is not None:
+            self.state = RINGING
+        elif self._snoozed:
+            self.state = SNOOZED
+        else:
+            self.state = IDLE
+        if self.sys_state is not None:
+            self.sys_state["ringing"] = self.state == RINGING
+
+    def _start(self, alarm, t_us, snoozes):
+        self.current = (alarm, snoozes)
+        self._deadline = time.ticks_add(time.ticks_ms(), config.MAX_RING_TIME * 1000)
+        self.stats["rings"] += 1
+        log.info(">>> 鬧鐘響鈴中 %02d:%02d (id=%s)", alarm.hour, alarm.minute, alarm.id)
+        melody = songs.get(alarm.song)
+        self._play = uasyncio.create_task(self._play_repeat(melody, time.ticks_us() if t_us is None else t_us))
+        bus.publish("ring", {"state": "start", "id": alarm.id, "hour": alarm.hour,
+                             "minute": alarm.minute, "snoozes": snoozes})
+
+    async def _play_repeat(self, melody, t_us):
+        """重複播放直到被取消；play_song() 第一個音符在第一次 await 之前就已送出"""
+        metrics.since("ring.trigger_to_sound", t_us)
+        while True:
+            await self.buzzer.play_song(melody)
+            await uasyncio.sleep_ms(0)
+
+    async def _silence(self, t):
+        """立即靜音並等待播放任務結束"""
+        self.buzzer.stop()
+        if t is not None:
+            metrics.observe("ring.stop_to_silence", time.ticks_diff(time.ticks_ms(), t) * 1000)
+        play, self._play = self._play, None
+        if play is not None:
+            play.cancel()
+            try:
+                await play
+            except uasyncio.CancelledError:
+                pass
+
+    async def _end(self, reason, t):
+        """結束目前的響鈴"""
+        alarm = self.current[0]
+        await self._silence(t)
+        self.current = None
+        bus.publish("ring", {"state": "stop", "id": alarm.id, "reason": reason})
+
+    async def _stop_current(self, source, t):
+        log.info("停止響鈴 (%s)", source)
+        self.stats["stops"] += 1
+        await self._end(source, t)
+
+    async def _on_stop(self, source, t):
+        if self.current is not None:
+            await self._stop_current(source, t)
+        elif self._snoozed:
+            _, alarm, _ = self._snoozed.pop()
+            log.info("取消貪睡 (id=%s, %s)", alarm.id, source)
+            bus.publish("ring", {"state": "stop", "id": alarm.id, "reason": source})
+
+    async def _on_stop_all(self, source, t):
+        if self.current is not None:
+            await self._stop_current(source, t)
+        if self._snoozed:
+            log.info("取消 %d 個貪睡 (%s)", len(self._snoozed), source)
+            for _, alarm, _ in self._snoozed:
+                bus.publish("ring", {"state": "stop", "id": alarm.id, "reason": source})
+            self._snoozed = []
+
+    async def _on_snooze(self, source, t):
+        if self.current is None:
+            return
+        alarm, n = self.current
+        if not config.SNOOZE_MINUTES or n >= config.SNOOZE_MAX_COUNT:
+            await self._stop_current(source, t)
+            return
+        log.info("貪睡 %d 分鐘 (%s)", config.SNOOZE_MINUTES, source)
+        self.stats["snoozes"] += 1
+        await self._silence(t)
+        self.current = None
+        self._snoozed.append((time.ticks_add(time.ticks_ms(), config.SNOOZE_MINUTES * 60000), alarm, n + 1))
+        bus.publish("ring", {"state": "snooze", "id": alarm.id, "minutes": config.SNOOZE_MINUTES,
+                             "source": source})
+
+    async def _button_loop(self):
+        """停止按鈕：響鈴中按下 -> 貪睡；貪睡中長按 -> 全部取消"""
+        while True:
+            ev = await self.btn.get_event()
+            if ev.event_type == ev.PRESSED and self.state == RINGING:
+                self.snooze("button", ev.timestamp)
+            elif ev.event_type == ev.LONG_PRESS and self.state != IDLE:
+                self.stop_all("button", ev.timestamp)
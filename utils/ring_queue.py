@@ -0,0 +1,104 @@
+"""
+utils/ring_queue.py - 固定長度的非同步環形佇列
+uasyncio 沒有 Queue；這裡以預先配置的 list 實作，put() 永不阻塞，
+佇列滿時依 overflow 策略處理：
+  drop_newest : 丟棄新進的項目
+  drop_oldest : 覆蓋最舊的項目
+  coalesce    : 以 key 找出佇列中同 key 的項目並以新項目取代 (保留原本的位置)，
+                找不到同 key 時丟棄新項目
+"""
+
+import uasyncio
+
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+
+
+class RingQueue:
+    def __init__(self, size, overflow=DROP_OLDEST):
+        if overflow not in (DROP_NEWEST, DROP_OLDEST, COALESCE):
+            raise ValueError(f"unknown overflow policy {overflow}")
+        self._items = [None] * size
+        self._keys = [None] * size
+        self._head = 0   # 最舊項目的位置
+        self._count = 0
+        self.overflow = overflow
+        self._event = uasyncio.Event()
+        self.peak = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return self._count
+
+    def put(self, item, key=None):
+        """
+        放入項目 (不阻塞)
+        返回: True 表示已排入 (含覆蓋或合併)，False 表示被丟棄
+        """
+        size = len(self._items)
+        if self._count == size:
+            if self.overflow == DROP_OLDEST:
+                self._items[self._head] = item
+                self._keys[self._head] = key
+                self._head = (self._head + 1) % size
+                self.dropped += 1
+                self._event.set()
+                return True
+            if self.overflow == COALESCE and self.replace(key, item):
+                return True
+            self.dropped += 1
+            return False
+
+        pos = (self._head + self._count) % size
+        self._items[pos] = item
+        self._keys[pos] = key
+        self._count += 1
+        if self._count > self.peak:
+            self.peak = self._count
+        self._event.set()
+        return True
+
+    def replace(self, key, item):
+        """
+        以 item 取代佇列中同 key 的項目 (保留原本的位置)
+        返回: 是否找到並取代
+        """
+        if key is None:
+            return False
+        size = len(self._items)
+        for n in range(self._count):
+            pos = (self._head + n) % size
+            if self._keys[pos] == key:
+                self._items[pos] = item
+                self.coalesced += 1
+                return True
+        return False
+
+    def get_nowait(self):
+        """取出最舊的項目，佇列為空時返回 None"""
+        if not self._count:
+            return None
+        item = self._items[self._head]
+        self._items[self._head] = None
+        self._keys[self._head] = None
+        self._head = (self._head + 1) % len(self._items)
+        self._count -= 1
+        return item
+
+    async def get(self, timeout=None):
+        """
+        等待下一個項目 (可由多個協程同時等待)
+        timeout: 秒，逾時返回 None
+        """
+        while not self._count:
+            self._event.clear()
+            if timeout is None:
+                await self._event.wait()
+            else:
+                try:
+                    await uasyncio.wait_for(self._event.wait(), timeout)
+                except uasyncio.TimeoutError:
+                    return None
+        return self.get_nowait()
@@ -0,0 +1,219 @@
+"""
+utils/songs.py - 鈴聲庫：預先編譯的旋律與 RTTTL 解析
+
+旋律編譯成單一 array('H')：[freq0, dur0, freq1, dur1, ...] (Hz、ms，freq 為 0 表示休止符)，
+播放時不再查表或建立 tuple，每個音符固定佔 4 bytes
+
+鈴聲以 config.SONGS 中的位置編號 (鬧鐘記錄只存這個小整數)：
+  "twinkle" 為內建樂譜，其他名稱從 SONG_DIR/<名稱>.txt 讀取 RTTTL，第一次使用時才解析並快取
+RTTTL 格式: "名稱:d=4,o=5,b=120:8c,8d,4e.,p,2g6"
+"""
+
+import gc
+import config
+from array import array
+from utils.log import get_logger
+
+log = get_logger("Songs")
+
+# 音階頻率表
+NOTE_FREQS = {
+    'C4': 262, 'D4': 294, 'E4': 330, 'F4': 349, 'G4': 392,
+    'A4': 440, 'B4': 494, 'C5': 523, 'Bb4':466, 'G3': 196,
+    'E5': 659, 'D#5': 622, 'D5': 587, 'Ab4': 415, 'REST': 0
+}
+
+# 小星星樂譜
+NOTES_TWINKLE = [
+    ('C4', 500), ('C4', 500), ('G4', 500), ('G4', 500),
+    ('A4', 500), ('A4', 500), ('G4', 1000),
+    ('F4', 500), ('F4', 500), ('E4', 500), ('E4', 500),
+    ('D4', 500), ('D4', 500), ('C4', 1000),
+]
+
+BUILTIN = {"twinkle": NOTES_TWINKLE}
+
+# 鬧鐘記錄中鈴聲編號的上限 (alarms.bin 以 4 bits 保存)
+MAX_SONGS = 16
+
+# RTTTL 音名 -> 半音 (C = 0)
+_SEMITONES = {"c": 0, "d": 2, "e": 4, "f": 5, "g": 7, "a": 9, "b": 11}
+
+
+class Melody:
+    """編譯後的旋律"""
+
+    __slots__ = ("name", "seq", "heap_bytes")
+
+    def __init__(self, name, seq, heap_bytes=0):
+        self.name = name
+        self.seq = seq                # array('H')：freq, dur 交錯
+        self.heap_bytes = heap_bytes  # 編譯後實際佔用的 heap (MicroPython 以 gc.mem_alloc 量測)
+
+    def __len__(self):
+        return len(self.seq) // 2
+
+    @property
+    def nbytes(self):
+        return len(self.seq) * self.seq.itemsize
+
+    def duration_ms(self):
+        seq = self.seq
+        return sum(seq[i] for i in range(1, len(seq), 2))
+
+    def info(self):
+        return {"name": self.name, "notes": len(self), "bytes": self.nbytes,
+                "heap_bytes": self.heap_bytes, "duration_ms": self.duration_ms()}
+
+
+def compile_notes(name, notes):
+    """[(音名, ms), ...] -> Melody (無法辨識的音名視為休止符)"""
+    seq = array("H")
+    for note, dur in notes:
+        seq.append(NOTE_FREQS.get(note, 0))
+        seq.append(dur)
+    return Melody(name, seq)
+
+
+def _note_freq(semitone, octave):
+    """以 A4 = 440 Hz 的十二平均律計算頻率"""
+    return int(440 * 2 ** ((semitone - 9) / 12 + octave - 4) + 0.5)
+
+
+def parse_rtttl(text):
+    """
+    解析 RTTTL 字串 -> Melody
+    格式錯誤時拋出 ValueError
+    """
+    try:
+        name, defaults, body = text.strip().split(":", 2)
+    except ValueError:
+        raise ValueError("RTTTL needs name:defaults:notes")
+    d, o, b = 4, 6, 63
+    for item in defaults.split(","):
+        k, _, v = item.strip().lower().partition("=")
+        if k == "d":
+            d = int(v)
+        elif k == "o":
+            o = int(v)
+        elif k == "b":
+            b = int(v)
+    if d <= 0 or b <= 0 or not 0 <= o <= 9:
+        raise ValueError(f"bad defaults d={d},o={o},b={b}")
+    whole = 240000 // b  # 全音符的毫秒數 (b 為每分鐘四分音符數)
+
+    seq = array("H")
+    for tok in body.split(","):
+        tok = tok.strip().lower()
+        if not tok:
+            continue
+        i = 0
+        n = len(tok)
+        while i < n and tok[i].isdigit():
+            i += 1
+        dur = int(tok[:i]) if i else d
+        if i >= n or dur <= 0:
+            raise ValueError(f"bad note {tok}")
+        letter = tok[i]
+        i += 1
+        if letter != "p" and letter not in _SEMITONES:
+            raise ValueError(f"bad note {tok}")
+        semitone = _SEMITONES.get(letter, 0)
+        if i < n and tok[i] == "#":
+            semitone += 1
+            i += 1
+        dotted = False
+        if i < n and tok[i] == ".":
+            dotted = True
+            i += 1
+        octave = o
+        if i < n and tok[i].isdigit():
+            octave = int(tok[i])
+            i += 1
+        if i < n and tok[i] == ".":
+            dotted = True
+        ms = whole // dur
+        if dotted:
+            ms += ms // 2
+        if ms > 0xFFFF:
+            raise ValueError(f"note too long {tok}")
+        seq.append(0 if letter == "p" else _note_freq(semitone, octave))
+        seq.append(ms)
+    if not seq:
+        raise ValueError("RTTTL has no notes")
+    return Melody(name.strip(), seq)
+
+
+def _mem_alloc():
+    try:
+        return gc.mem_alloc()
+    except AttributeError:
+        return 0
+
+
+class SongLibrary:
+    """config.SONGS 的鈴聲，第一次使用時才編譯並快取"""
+
+    def __init__(self, names=config.SONGS, song_dir=config.SONG_DIR):
+        if len(names) > MAX_SONGS:
+            raise ValueError(f"at most {MAX_SONGS} songs")
+        self.names = names
+        self.song_dir = song_dir
+        self._cache = {}
+
+    def index_of(self, song):
+        """鈴聲名稱或編號 -> 編號；無法辨識時拋出 ValueError"""
+        if isinstance(song, int) and not isinstance(song, bool):
+            if 0 <= song < len(self.names):
+                return song
+        elif song in self.names:
+            return self.names.index(song)
+        raise ValueError(f"unknown song {song}")
+
+    def name_of(self, index):
+        return self.names[index] if 0 <= index < len(self.names) else self.names[0]
+
+    def _load(self, name):
+        notes = BUILTIN.get(name)
+        if notes is not None:
+            return compile_notes(name, notes)
+        with open(f"{self.song_dir}/{name}.txt") as f:
+            return parse_rtttl(f.read())
+
+    def get(self, index=0):
+        """返回編譯好的 Melody；讀取或解析失敗時改用第一首"""
+        melody = self._cache.get(index)
+        if melody is not None:
+            return melody
+        name = self.name_of(index)
+        gc.collect()
+        before = _mem_alloc()
+        try:
+            melody = self._load(name)
+        except (OSError, ValueError) as e:
+            log.error("無法載入鈴聲 %s: %s", name, e)
+            return self.get(0) if index else compile_notes(name, NOTES_TWINKLE)
+        gc.collect()  # 不把解析時的暫存字串算進去
+        melody.heap_bytes = max(_mem_alloc() - before, 0)
+        self._cache[index] = melody
+        log.info("已載入鈴聲 %s (%d 個音符, %d bytes)", name, len(melody), melody.nbytes)
+        return melody
+
+    def preload(self):
+        """開機時編譯所有鈴聲，響鈴時不必再讀檔解析"""
+        for i in range(len(self.names)):
+            self.get(i)
+
+    def info(self):
+        """/api/songs：每首鈴聲的音符數與記憶體用量 (會載入所有鈴聲)"""
+        out = []
+        for i, name in enumerate(self.names):
+            d = self.get(i).info()
+            d["id"] = i
+            d["name"] = name
+            out.append(d)
+        return out
+
+
+# 全系統共用的鈴聲庫
+library = SongLibrary()